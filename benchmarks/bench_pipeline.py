@@ -0,0 +1,224 @@
+"""
+処理パイプライン全体のベンチマーク。
+合成録音（benchmarks/synth.py）を録音の長さ × サンプリング周波数の組み合わせで作り、
+nakigoe.py と同じ段階（読み込み・ハイパス・区間抽出・MFCC・KMeans・UMAP）ごとの
+時間と samples/s・frames/s を計測して JSON に保存する。保存した 2 つの結果を比べられる。
+
+    python benchmarks/bench_pipeline.py --durations 30 300 --srs 22050 48000
+    python benchmarks/bench_pipeline.py --srs 96000 192000 --analysis-sr 48000
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+import librosa
+import numpy as np
+import sklearn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synth import write_recording  # noqa: E402
+from birdcall.pipeline import BirdcallPipeline  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# 計測する段階（nakigoe.py の処理順）
+STAGES = ("audio", "filtered", "segments", "frames", "labels", "embedding")
+
+
+def git_revision():
+    """このリポジトリの現在のコミット（取得できなければ None）"""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(RESULTS_DIR),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_case(path, duration, sr, embed=True, streaming=False, extract_workers=1, analysis_sr=None):
+    """1 つの録音を処理し、段階ごとの計測結果を返す（samples/s は元の周波数のサンプル数で数える）"""
+    pipeline = BirdcallPipeline(
+        streaming_min_duration=0 if streaming else float("inf"),
+        extract_workers=extract_workers,
+        analysis_sr=analysis_sr,
+    )
+    report = pipeline.new_report(path)
+    stages = pipeline.build_stages(path, report=report)
+    stages.get("labels")
+    if embed:
+        stages.get("embedding")
+
+    n_samples = int(duration * sr)
+    n_frames = len(stages.get("frames").starts)
+    results = {}
+    for record in report.stages:
+        wall = record["wall_sec"]
+        results[record["name"]] = {
+            "wall_sec": wall,
+            "cpu_sec": record["cpu_sec"],
+            "worker_cpu_sec": record["worker_cpu_sec"],
+            "peak_rss_mb": record["peak_rss_mb"],
+            "peak_rss_delta_mb": record["peak_rss_delta_mb"],
+            "samples_per_sec": n_samples / wall if wall > 0 else None,
+            "frames_per_sec": n_frames / wall if wall > 0 else None,
+        }
+    return {
+        "duration": duration,
+        "sr": sr,
+        "samples": n_samples,
+        "segments": len(stages.get("segments")),
+        "frames": n_frames,
+        "total_sec": sum(r["wall_sec"] for r in results.values()),
+        "stages": results,
+    }
+
+
+def run_grid(durations, srs, embed=True, streaming=False, warmup=True, seed=0, extract_workers=1, analysis_sr=None):
+    """durations × srs の全組み合わせを計測する"""
+    cases = []
+    with tempfile.TemporaryDirectory(prefix="birdcall_bench_") as tmp:
+        if warmup:
+            # import と numba の JIT コンパイルを計測に含めないよう、短い録音で一度動かす
+            path = os.path.join(tmp, "warmup.wav")
+            write_recording(path, 5.0, srs[0], seed=seed)
+            run_case(path, 5.0, srs[0], embed=embed, streaming=streaming, analysis_sr=analysis_sr)
+
+        for sr in srs:
+            for duration in durations:
+                path = os.path.join(tmp, f"synth_{int(duration)}s_{sr}.wav")
+                write_recording(path, duration, sr, seed=seed)
+                case = run_case(
+                    path,
+                    duration,
+                    sr,
+                    embed=embed,
+                    streaming=streaming,
+                    extract_workers=extract_workers,
+                    analysis_sr=analysis_sr,
+                )
+                print_case(case)
+                cases.append(case)
+                os.remove(path)
+    return cases
+
+
+def print_case(case):
+    print(
+        f"\n{case['duration']:.0f} 秒 / {case['sr']} Hz: 区間 {case['segments']} / フレーム {case['frames']}"
+        f" / 合計 {case['total_sec']:.2f} 秒"
+    )
+    for name in STAGES:
+        r = case["stages"].get(name)
+        if r is None:
+            continue
+        samples = r["samples_per_sec"] or 0.0
+        frames = r["frames_per_sec"] or 0.0
+        print(f"  {name:<10} {r['wall_sec']:8.3f} 秒  {samples:14.0f} samples/s  {frames:10.1f} frames/s")
+
+
+def compare(old_path, new_path, threshold):
+    """2 つの結果を段階ごとに比べ、threshold 倍より遅くなった段階があれば 1 を返す"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    old_cases = {(c["duration"], c["sr"]): c for c in old["cases"]}
+
+    print(f"旧: {old.get('label')} ({old.get('revision')})  新: {new.get('label')} ({new.get('revision')})")
+    print("録音           段階              旧(秒)     新(秒)    比（新/旧）")
+    regressions = 0
+    for case in new["cases"]:
+        base = old_cases.get((case["duration"], case["sr"]))
+        if base is None:
+            continue
+        name_col = f"{case['duration']:.0f}s/{case['sr']}Hz"
+        for name in STAGES + ("total",):
+            if name == "total":
+                before, after = base["total_sec"], case["total_sec"]
+            elif name in case["stages"] and name in base["stages"]:
+                before, after = base["stages"][name]["wall_sec"], case["stages"][name]["wall_sec"]
+            else:
+                continue
+            ratio = after / before if before > 0 else float("inf")
+            mark = "  ← 遅くなった" if ratio > threshold and after - before > 0.05 else ""
+            regressions += bool(mark)
+            print(f"{name_col:<14} {name:<12} {before:10.3f} {after:10.3f}  {ratio:10.2f}{mark}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--durations", type=float, nargs="+", default=[30, 120, 600], help="録音の長さ（秒）")
+    parser.add_argument("--srs", type=int, nargs="+", default=[22050, 44100, 48000], help="サンプリング周波数")
+    parser.add_argument("--no-umap", action="store_true", help="UMAP を計測しない")
+    parser.add_argument("--streaming", action="store_true", help="ストリーミング処理で計測する")
+    parser.add_argument("--no-warmup", action="store_true", help="JIT コンパイルの準備運転をしない")
+    parser.add_argument(
+        "--extract-workers", type=int, default=1, help="特徴量抽出のプロセス数（0 なら CPU 数）"
+    )
+    parser.add_argument(
+        "--analysis-sr", type=int, default=None, help="解析のサンプリング周波数（これより高い録音は間引いて計測する）"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="合成録音の乱数の種")
+    parser.add_argument("--label", default=None, help="結果の名前（既定: コミット名か日時）")
+    parser.add_argument("-o", "--output", default=None, help="結果の JSON（既定: benchmarks/results/<label>.json）")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="保存した 2 つの結果を比べる")
+    parser.add_argument("--threshold", type=float, default=1.1, help="--compare で遅くなったとみなす比")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    revision = git_revision()
+    label = args.label or revision or datetime.now().strftime("%Y%m%d_%H%M%S")
+    cases = run_grid(
+        args.durations,
+        args.srs,
+        embed=not args.no_umap,
+        streaming=args.streaming,
+        warmup=not args.no_warmup,
+        seed=args.seed,
+        extract_workers=args.extract_workers or None,
+        analysis_sr=args.analysis_sr,
+    )
+
+    result = {
+        "label": label,
+        "revision": revision,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {"numpy": np.__version__, "librosa": librosa.__version__, "sklearn": sklearn.__version__},
+        "options": {
+            "umap": not args.no_umap,
+            "streaming": args.streaming,
+            "seed": args.seed,
+            "extract_workers": args.extract_workers,
+            "analysis_sr": args.analysis_sr,
+        },
+        "cases": cases,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{label}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+ベンチマーク用の合成録音。
+低い周波数の雑音（風・遠くの車など）と無音の区間の上に、3 kHz 以上の
+周波数変調チャープ（鳴き声）をランダムに置く。同じ seed なら同じ信号になる。
+
+    python benchmarks/synth.py synth.wav --duration 600 --sr 48000
+"""
+
+import argparse
+
+import numpy as np
+import scipy.signal as signal
+import soundfile as sf
+
+
+def low_noise(n, sr, rng, cutoff=800.0, level=0.02):
+    """cutoff Hz 以下の雑音"""
+    b, a = signal.butter(2, min(cutoff / (sr / 2), 0.99), btype="low")
+    noise = signal.lfilter(b, a, rng.standard_normal(n))
+    return level * noise / (np.std(noise) + 1e-12)
+
+
+def chirp(duration, sr, rng, f_min=3500.0):
+    """1 回分の鳴き声（上昇・下降・揺れのいずれかの周波数変調と倍音）"""
+    n = max(int(duration * sr), 2)
+    t = np.arange(n) / sr
+    f_max = min(9000.0, 0.45 * sr)
+    f0 = rng.uniform(f_min, max(f_min, f_max - 1500.0))
+    kind = rng.integers(3)
+    if kind == 0:
+        freq = f0 + rng.uniform(500, 1500) * t / duration
+    elif kind == 1:
+        freq = f0 + rng.uniform(500, 1500) * (1 - t / duration)
+    else:
+        freq = f0 + rng.uniform(200, 800) * np.sin(2 * np.pi * rng.uniform(5, 30) * t)
+    phase = 2 * np.pi * np.cumsum(freq) / sr
+    tone = np.sin(phase)
+    if 2 * freq.max() < 0.45 * sr:
+        tone += 0.3 * np.sin(2 * phase)
+    return tone * np.hanning(n)
+
+
+def synth_recording(duration, sr, seed=0, calls_per_sec=1.5, silence_ratio=0.2):
+    """
+    合成録音 (y, calls) を返す。y は float32、calls は鳴き声の (開始, 終了) サンプルのリスト。
+    録音の silence_ratio 程度は雑音もない無音にする。
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    y = low_noise(n, sr, rng)
+
+    # 無音（録音機の休止など）
+    for _ in range(int(duration * silence_ratio / 5)):
+        start = int(rng.uniform(0, max(n - 5 * sr, 1)))
+        y[start : start + 5 * sr] = 0.0
+
+    calls = []
+    for _ in range(rng.poisson(calls_per_sec * duration)):
+        length = rng.uniform(0.1, 0.8)
+        start = int(rng.uniform(0, max(n - length * sr, 1)))
+        call = rng.uniform(0.1, 0.5) * chirp(length, sr, rng)
+        end = min(start + len(call), n)
+        y[start:end] += call[: end - start]
+        calls.append((start, end))
+
+    calls.sort()
+    return (y / max(1.0, np.max(np.abs(y)))).astype(np.float32), calls
+
+
+def write_recording(path, duration, sr, seed=0, **kwargs):
+    """合成録音を 16 bit WAV に書き、鳴き声の区間を返す"""
+    y, calls = synth_recording(duration, sr, seed=seed, **kwargs)
+    sf.write(path, y, sr, subtype="PCM_16")
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="書き出す WAV ファイル")
+    parser.add_argument("--duration", type=float, default=60.0, help="長さ（秒）")
+    parser.add_argument("--sr", type=int, default=48000, help="サンプリング周波数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    parser.add_argument("--calls-per-sec", type=float, default=1.5, help="1 秒あたりの鳴き声の数")
+    args = parser.parse_args()
+
+    calls = write_recording(args.path, args.duration, args.sr, seed=args.seed, calls_per_sec=args.calls_per_sec)
+    print(f"{args.path}: {args.duration:.1f} 秒 / {args.sr} Hz / 鳴き声 {len(calls)} 回")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""鳥の鳴き声分析の処理部品（GUI から独立して使えるもの）"""
+
+import importlib
+
+# 公開する名前と定義しているモジュール。scipy などの読み込みで GUI の起動を
+# 待たせないよう、モジュールは名前を初めて参照したときに読み込む
+_EXPORTS = {
+    "FrameFeatures": ".features",
+    "MfccExtractor": ".features",
+    "frame_starts": ".features",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
@@ -0,0 +1,192 @@
+"""
+コマンドラインからの一括処理（画面なし）。
+
+    python -m birdcall recordings/ -o results --workers 8
+    python -m birdcall "data/2024-05-*/*.wav" --cutoff 3000 -k 4
+    python -m birdcall recordings_192k/ --analysis-sr 48000
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from .cache import FeatureCache
+from .corpus import cluster_corpus
+from .metrics import PROFILERS
+from .pipeline import BirdcallPipeline, find_wav_files, run_batch
+from .stream import ACTIVITY_MODES
+from .store import FeatureStore
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m birdcall",
+        description="WAV ファイルから鳴き声を抽出し、MFCC・KMeans・UMAP の結果を書き出します。",
+    )
+    parser.add_argument("inputs", nargs="+", help="WAV ファイル・ディレクトリ・glob パターン")
+    parser.add_argument("-o", "--output", default=None, help="出力先（既定: 各 WAV と同じフォルダの cluster_segments）")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU 数）")
+    parser.add_argument("--cutoff", type=int, default=3000, help="ハイパスフィルタ周波数 (Hz)")
+    parser.add_argument(
+        "--analysis-sr",
+        type=int,
+        default=None,
+        help="解析のサンプリング周波数 (Hz)。これより高い周波数の録音は読み込み時に間引く（既定: 元のまま）",
+    )
+    parser.add_argument("--top-db", type=int, default=45, help="鳴き声区間抽出の閾値 (dB)")
+    parser.add_argument(
+        "--activity",
+        choices=ACTIVITY_MODES,
+        default="adaptive",
+        help="区間抽出の基準（adaptive: 近くの音量と背景雑音、global: 録音全体の最大値）",
+    )
+    parser.add_argument("--frame-length", type=float, default=0.25, help="フレーム長（秒）")
+    parser.add_argument("--hop-length", type=float, default=0.25, help="ホップ長（秒）")
+    parser.add_argument("--n-mfcc", type=int, default=20, help="MFCC 係数数")
+    parser.add_argument("-k", "--clusters", type=int, default=4, help="KMeans のクラスタ数")
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=1,
+        help="1 ファイルの特徴量抽出に使うプロセス数（0 なら CPU 数。--workers 1 と組み合わせる）",
+    )
+    parser.add_argument(
+        "--corpus",
+        action="store_true",
+        help="全ファイルをまとめて MiniBatchKMeans で分類する（UMAP・図は省略）",
+    )
+    parser.add_argument("--batch-size", type=int, default=4096, help="--corpus のミニバッチのフレーム数")
+    parser.add_argument("--no-umap", action="store_true", help="UMAP 埋め込みを省略する")
+    parser.add_argument(
+        "--umap-model",
+        default=None,
+        help="UMAP マップのファイル（あればそのマップに配置し、なければ学習して保存する）",
+    )
+    parser.add_argument("--no-plots", action="store_true", help="図を保存しない")
+    parser.add_argument(
+        "--profile",
+        choices=PROFILERS,
+        default=None,
+        help="実行レポートに加えて cProfile（.prof）か tracemalloc（.txt）の結果も書き出す",
+    )
+    parser.add_argument("--cache-dir", default=None, help="特徴量キャッシュのフォルダ（既定: ~/.cache/birdcall_umap）")
+    parser.add_argument("--cache-size", type=float, default=4.0, help="特徴量キャッシュの上限サイズ (GB)")
+    parser.add_argument(
+        "--signal-cache-size", type=float, default=16.0, help="フィルタ済み信号のキャッシュの上限サイズ (GB)"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="特徴量キャッシュを使わない")
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="処理したフレームを追加する特徴量ストアのフォルダ（録音・日時で絞り込んで読める）",
+    )
+    return parser
+
+
+def ingest_outputs(store, pipeline, summary):
+    """run_file の出力（features.npz）を特徴量ストアに追加する"""
+    with np.load(os.path.join(summary["output_dir"], "features.npz")) as data:
+        sr = int(data["sr"])
+        store.ingest(
+            summary["path"],
+            data["mfcc_array"],
+            data["frame_starts"],
+            data["segment_ids"],
+            data["labels"],
+            sr,
+            pipeline.signal_length(summary["path"]),
+            params=pipeline.feature_params(summary["streaming"]),
+        )
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    paths = find_wav_files(args.inputs)
+    if not paths:
+        print("WAV ファイルが見つかりません", file=sys.stderr)
+        return 1
+
+    cache = None
+    if not args.no_cache:
+        cache = FeatureCache(
+            args.cache_dir,
+            max_bytes=int(args.cache_size * 1024 ** 3),
+            max_signal_bytes=int(args.signal_cache_size * 1024 ** 3),
+        )
+
+    try:
+        pipeline = BirdcallPipeline(
+            cutoff=args.cutoff,
+            top_db=args.top_db,
+            activity=args.activity,
+            analysis_sr=args.analysis_sr,
+            frame_length_sec=args.frame_length,
+            hop_length_sec=args.hop_length,
+            n_mfcc=args.n_mfcc,
+            n_clusters=args.clusters,
+            cache=cache,
+            umap_model=args.umap_model,
+            extract_workers=args.extract_workers or None,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"{len(paths)} 個のファイルを処理します")
+
+    # ストアへの追加は並列のワーカーではなく、このプロセスだけで行う（--corpus では追加しない）
+    store = FeatureStore(args.store) if args.store and not args.corpus else None
+
+    def report(summary):
+        name = os.path.basename(summary["path"])
+        if "error" in summary:
+            print(f"[失敗] {name}: {summary['error']}", file=sys.stderr)
+        else:
+            print(
+                f"[完了] {name}: 区間 {summary['segments']} / フレーム {summary['frames']}"
+                f" → {summary['output_dir']}"
+            )
+            if store is not None:
+                try:
+                    ingest_outputs(store, pipeline, summary)
+                except (OSError, ValueError) as e:
+                    print(f"[失敗] {name}: 特徴量ストアに追加できません: {e}", file=sys.stderr)
+
+    if args.corpus:
+        try:
+            summaries, corpus_dir = cluster_corpus(
+                pipeline,
+                paths,
+                output_root=args.output,
+                workers=args.workers,
+                batch_size=args.batch_size,
+                on_done=report,
+            )
+        except ValueError as e:
+            print(f"分類できませんでした: {e}", file=sys.stderr)
+            return 1
+        failed = len(paths) - len(summaries)
+        print(f"\n合計 {len(summaries)} / {len(paths)} ファイルをまとめて分類しました → {corpus_dir}")
+        return 1 if failed else 0
+
+    summaries = run_batch(
+        pipeline,
+        paths,
+        output_root=args.output,
+        workers=args.workers,
+        embed=not args.no_umap,
+        save_plots=not args.no_plots,
+        on_done=report,
+        profile=args.profile,
+    )
+
+    failed = sum(1 for s in summaries if "error" in s)
+    print(f"\n合計 {len(summaries) - failed} / {len(summaries)} ファイルを処理しました")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+特徴量のディスクキャッシュ。
+
+キーは音声ファイルの内容のハッシュと抽出パラメーター
+（cutoff, top_db, frame_length, hop_length, n_mfcc など）から作る。
+同じファイル・同じパラメーターで再実行したときは読み込み・フィルタ・区間分割・
+MFCC を省略してクラスタリングから始められる。
+
+- 特徴量: <key>.npz（mfcc_array, frame_starts, segment_ids, segments など）
+- フィルタ済み信号: <key>.f32（float32 の生データ。np.memmap で開く）
+
+特徴量は合計 max_bytes、フィルタ済み信号は合計 max_signal_bytes を超えたら、
+それぞれ最後に使ってから時間が経ったもの（LRU）から削除する。上限を分けているのは、
+長時間録音の大きな信号を書いたときに同じ録音の特徴量が押し出されないようにするため。
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+
+# キャッシュ形式を変えたら上げる（古いエントリは自然に使われなくなる）
+CACHE_VERSION = 1
+
+# 種類ごとの拡張子
+FEATURES_SUFFIX = ".npz"
+SIGNAL_SUFFIX = ".f32"
+
+# キャッシュから読み出した特徴量
+CacheEntry = namedtuple("CacheEntry", ["sr", "n_samples", "segments", "frames"])
+
+
+def default_cache_dir():
+    """既定のキャッシュフォルダ（環境変数 BIRDCALL_CACHE_DIR で変更可）"""
+    return os.environ.get(
+        "BIRDCALL_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "birdcall_umap"),
+    )
+
+
+def file_digest(path, chunk_size=1 << 22):
+    """ファイル内容の SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """特徴量とフィルタ済み信号のディスクキャッシュ（サイズ上限付き LRU）"""
+
+    def __init__(self, cache_dir=None, max_bytes=4 * 1024 ** 3, max_signal_bytes=16 * 1024 ** 3):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_signal_bytes = max_signal_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # 内容ハッシュの再計算を避けるため (サイズ, 更新時刻) ごとに覚えておく
+        self._digest_index_path = os.path.join(self.cache_dir, "digests.json")
+
+    # ===== キー =====
+    def content_digest(self, path):
+        """ファイル内容のハッシュ（サイズと更新時刻が同じなら前回の値を使う）"""
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        abspath = os.path.abspath(path)
+
+        known = self._read_digest_index().get(abspath)
+        if known is not None and known[:2] == stamp:
+            return known[2]
+
+        digest = file_digest(path)
+        index = self._read_digest_index()
+        index[abspath] = stamp + [digest]
+        self._write_digest_index(index)
+        return digest
+
+    def key(self, path, params):
+        """内容ハッシュ + パラメーター（dict）からキーを作る"""
+        payload = json.dumps(
+            {"version": CACHE_VERSION, "content": self.content_digest(path), "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _read_digest_index(self):
+        try:
+            with open(self._digest_index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_digest_index(self, index):
+        # 複数プロセスから同時に書かれても壊れないよう、一時ファイルから置き換える
+        tmp_path = f"{self._digest_index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._digest_index_path)
+
+    # ===== 特徴量 =====
+    def features_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{FEATURES_SUFFIX}")
+
+    def load_features(self, key):
+        """キャッシュがあれば CacheEntry、なければ None"""
+        path = self.features_path(key)
+        if not os.path.exists(path):
+            return None
+        # features は scipy を読み込むので、GUI の起動時には読み込まない
+        from .features import FrameFeatures
+
+        try:
+            with np.load(path) as data:
+                frames = FrameFeatures(
+                    data["mfcc_array"],
+                    data["frame_starts"],
+                    data["segment_ids"],
+                )
+                segments = [(int(s), int(e)) for s, e in data["segments"]]
+                entry = CacheEntry(int(data["sr"]), int(data["n_samples"]), segments, frames)
+        except (OSError, ValueError, KeyError):
+            # 壊れたエントリは消して作り直す
+            self._remove(path)
+            return None
+        self._touch(path)
+        return entry
+
+    def save_features(self, key, sr, n_samples, segments, frames):
+        """特徴量を保存する（書き込み途中のファイルが読まれないよう置き換えで保存）"""
+        path = self.features_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                mfcc_array=frames.features,
+                frame_starts=frames.starts,
+                segment_ids=frames.segment_ids,
+                segments=np.asarray(segments, dtype=np.int64).reshape(-1, 2),
+                sr=sr,
+                n_samples=n_samples,
+            )
+        os.replace(tmp_path, path)
+        self.evict(keep=(path,), suffixes=(FEATURES_SUFFIX,))
+
+    # ===== フィルタ済み信号 =====
+    def signal_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{SIGNAL_SUFFIX}")
+
+    def load_signal(self, key):
+        """フィルタ済み信号を読み取り専用の memmap で返す（なければ None）"""
+        path = self.signal_path(key)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        self._touch(path)
+        return np.memmap(path, dtype=np.float32, mode="r")
+
+    def save_signal(self, key, y):
+        """フィルタ済み信号を float32 で保存する"""
+        path = self.signal_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        np.asarray(y, dtype=np.float32).tofile(tmp_path)
+        os.replace(tmp_path, path)
+        self.evict(keep=(path,), suffixes=(SIGNAL_SUFFIX,))
+
+    # ===== 容量管理 =====
+    def entries(self, suffixes=(FEATURES_SUFFIX, SIGNAL_SUFFIX)):
+        """(最終使用時刻, サイズ, パス) を古い順に返す（suffixes の拡張子のものだけ）"""
+        items = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(suffixes):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            items.append((stat.st_mtime, stat.st_size, path))
+        items.sort()
+        return items
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=(), suffixes=(FEATURES_SUFFIX, SIGNAL_SUFFIX)):
+        """
+        suffixes の種類（特徴量・信号）ごとに、合計サイズが上限を超えていれば古いものから削除する。
+        保存したときはその種類だけを削除する（大きな信号を書いても特徴量は消さない）
+        """
+        limits = {FEATURES_SUFFIX: self.max_bytes, SIGNAL_SUFFIX: self.max_signal_bytes}
+        for suffix in suffixes:
+            max_bytes = limits[suffix]
+            items = self.entries((suffix,))
+            total = sum(size for _, size, _ in items)
+            for _, size, path in items:
+                if total <= max_bytes:
+                    break
+                if path in keep:
+                    continue
+                if self._remove(path):
+                    total -= size
+
+    def clear(self):
+        """すべてのエントリを削除する"""
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    def _touch(self, path):
+        """最終使用時刻を更新する（LRU 用）"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            # Windows では memmap で開いているファイルは消せない
+            return False
@@ -0,0 +1,192 @@
+"""
+複数ファイル（数か月分の録音など）をまとめてクラスタリングする。
+
+全ファイルの特徴量を一つの配列に載せて KMeans にかける代わりに、
+1. ファイルごとに特徴量を作って一時フォルダの .npy に書き出し、
+   MiniBatchKMeans.partial_fit に一定サイズのバッチで順に渡す（保持するのは重心だけ）
+2. 2 回目のパスで .npy を memmap で読み、チャンクごとに predict してラベルを書き出す
+という 2 パスで処理する。ファイル数が増えてもメモリ使用量はほぼ一定になる。
+"""
+
+import os
+import shutil
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from .pipeline import default_output_dir, write_labels_csv
+
+
+class CorpusClusterer:
+    """特徴量を少しずつ受け取り、MiniBatchKMeans の重心だけを更新する"""
+
+    def __init__(self, n_clusters=4, batch_size=4096, random_state=0):
+        self.n_clusters = n_clusters
+        self.batch_size = max(batch_size, n_clusters)
+        self.model = MiniBatchKMeans(
+            n_clusters=n_clusters, batch_size=self.batch_size, random_state=random_state, n_init=3
+        )
+        self.n_seen = 0
+        # batch_size に満たない端数（ファイルの境目をまたいでためる）
+        self._pending = []
+        self._n_pending = 0
+
+    def partial_fit(self, features):
+        """特徴量 (N, D)（memmap でもよい）を batch_size ずつ学習に使う"""
+        for i in range(0, len(features), self.batch_size):
+            chunk = np.asarray(features[i : i + self.batch_size], dtype=np.float64)
+            self._pending.append(chunk)
+            self._n_pending += len(chunk)
+            if self._n_pending >= self.batch_size:
+                self._fit_pending()
+
+    def _fit_pending(self):
+        batch = np.concatenate(self._pending)
+        self._pending = []
+        self._n_pending = 0
+        self.model.partial_fit(batch)
+        self.n_seen += len(batch)
+
+    def finish(self):
+        """残りの端数を学習に使う"""
+        if self.n_seen == 0 and self._n_pending < self.n_clusters:
+            raise ValueError(
+                f"フレーム数 ({self._n_pending}) がクラスタ数 ({self.n_clusters}) より少ないため分類できません"
+            )
+        if self._n_pending:
+            self._fit_pending()
+
+    @property
+    def centroids(self):
+        return self.model.cluster_centers_
+
+    def predict(self, features):
+        """特徴量 (N, D)（memmap でもよい）のクラスタ番号を batch_size ずつ求める"""
+        labels = np.empty(len(features), dtype=np.int32)
+        for i in range(0, len(features), self.batch_size):
+            labels[i : i + self.batch_size] = self.model.predict(
+                np.asarray(features[i : i + self.batch_size], dtype=np.float64)
+            )
+        return labels
+
+
+def _extract_one(pipeline, path, work_path):
+    """1 ファイルの特徴量を work_path（.npy）とフレーム情報（.npz）に書き出す（プロセスプールのワーカー）"""
+    try:
+        stages = pipeline.build_stages(path)
+        filtered = stages.get("filtered")
+        segments = stages.get("segments")
+        frames = stages.get("frames")
+        np.save(work_path + ".npy", frames.features)
+        np.savez(work_path + ".npz", starts=frames.starts, segment_ids=frames.segment_ids, sr=filtered.sr)
+        return {"path": path, "work_path": work_path, "segments": len(segments), "frames": len(frames.starts)}
+    except Exception as e:
+        return {"path": path, "error": f"{e}\n{traceback.format_exc()}"}
+
+
+def cluster_corpus(
+    pipeline,
+    paths,
+    output_root=None,
+    workers=None,
+    batch_size=4096,
+    work_dir=None,
+    on_done=None,
+):
+    """
+    paths の全ファイルを pipeline.n_clusters 個のクラスタにまとめて分類する。
+    特徴量の抽出はプロセスプールで並列に行い、学習はファイルの順番どおりに進める。
+    各ファイルの labels.csv は default_output_dir() に、重心とクラスタごとのフレーム数は
+    出力先の corpus フォルダに書き出す。on_done(summary) は 1 ファイル書き終えるごとに呼ばれる。
+    """
+    clusterer = CorpusClusterer(pipeline.n_clusters, batch_size=batch_size, random_state=pipeline.random_state)
+    owns_work_dir = work_dir is None
+    if owns_work_dir:
+        work_dir = tempfile.mkdtemp(prefix="birdcall_corpus_")
+    os.makedirs(work_dir, exist_ok=True)
+    work_paths = [os.path.join(work_dir, f"{i:06d}") for i in range(len(paths))]
+
+    try:
+        # ===== 1 回目: 抽出しながら partial_fit =====
+        extracted = []
+        if workers == 1 or len(paths) <= 1:
+            results = (_extract_one(pipeline, path, w) for path, w in zip(paths, work_paths))
+            for result in results:
+                _fit_extracted(clusterer, result, extracted, on_done)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # map は結果を paths の順に返すので、学習の順番は並列数によらない
+                results = executor.map(_extract_one, [pipeline] * len(paths), paths, work_paths)
+                for result in results:
+                    _fit_extracted(clusterer, result, extracted, on_done)
+        clusterer.finish()
+
+        # ===== 2 回目: ラベル付け =====
+        counts = np.zeros(pipeline.n_clusters, dtype=np.int64)
+        summaries = []
+        for result in extracted:
+            features = np.load(result["work_path"] + ".npy", mmap_mode="r")
+            labels = clusterer.predict(features)
+            counts += np.bincount(labels, minlength=pipeline.n_clusters)
+
+            frame_info = np.load(result["work_path"] + ".npz")
+            output_dir = default_output_dir(result["path"], output_root)
+            os.makedirs(output_dir, exist_ok=True)
+            write_labels_csv(
+                os.path.join(output_dir, "labels.csv"),
+                frame_info["starts"] / frame_info["sr"],
+                frame_info["segment_ids"],
+                labels,
+            )
+            del features
+
+            summary = {
+                "path": result["path"],
+                "output_dir": output_dir,
+                "segments": result["segments"],
+                "frames": result["frames"],
+            }
+            summaries.append(summary)
+            if on_done is not None:
+                on_done(summary)
+
+        corpus_dir = corpus_output_dir(paths, output_root)
+        save_corpus_summary(corpus_dir, clusterer.centroids, counts, [s["path"] for s in summaries])
+    finally:
+        if owns_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return summaries, corpus_dir
+
+
+def _fit_extracted(clusterer, result, extracted, on_done):
+    """抽出結果を 1 ファイル分学習に使う（失敗したファイルはここで報告する）"""
+    if "error" in result:
+        if on_done is not None:
+            on_done(result)
+        return
+    clusterer.partial_fit(np.load(result["work_path"] + ".npy", mmap_mode="r"))
+    extracted.append(result)
+
+
+def corpus_output_dir(paths, output_root=None):
+    """コーパス全体の出力先（既定は最初の WAV と同じフォルダの cluster_segments/corpus）"""
+    if output_root is None:
+        output_root = os.path.join(os.path.dirname(os.path.abspath(paths[0])), "cluster_segments")
+    return os.path.join(output_root, "corpus")
+
+
+def save_corpus_summary(corpus_dir, centroids, counts, paths):
+    """重心・クラスタごとのフレーム数・対象ファイルの一覧を書き出す"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    np.save(os.path.join(corpus_dir, "centroids.npy"), centroids)
+    with open(os.path.join(corpus_dir, "cluster_counts.csv"), "w", encoding="utf-8") as f:
+        f.write("cluster,frames\n")
+        for c, n in enumerate(counts):
+            f.write(f"{c},{int(n)}\n")
+    with open(os.path.join(corpus_dir, "files.txt"), "w", encoding="utf-8") as f:
+        for path in paths:
+            f.write(os.path.abspath(path) + "\n")
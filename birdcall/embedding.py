@@ -0,0 +1,70 @@
+"""
+保存できる UMAP マップ。
+
+UMAP の学習はフレーム数が多いと最も時間がかかり、録音ごとに学習し直すと
+座標も録音どうしで比べられない。学習済みの UMAP（近傍探索のインデックスを含む）を
+ファイルに保存しておけば、新しい録音や新しく残したフレームは transform で
+同じマップ上に配置できる。
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+
+class UmapModel:
+    """学習済みの UMAP と、学習に使った特徴量の設定"""
+
+    def __init__(self, umap, params, n_features):
+        self.umap = umap
+        # 特徴量の設定（ハイパス・フレーム長など）。違う設定の特徴量は同じマップに置けない
+        self.params = dict(params)
+        self.n_features = n_features
+
+    @classmethod
+    def fit(cls, features, params, random_state=0):
+        """特徴量で UMAP を学習する（学習に使ったフレームの座標は embedding に入る）"""
+        # umap は読み込みだけで数秒かかる（numba のコンパイル）ので、使うときに読み込む
+        from umap import UMAP
+
+        umap = UMAP(n_components=2, random_state=random_state)
+        umap.fit(features)
+        return cls(umap, params, features.shape[1])
+
+    @property
+    def embedding(self):
+        """学習に使ったフレームの座標"""
+        return self.umap.embedding_
+
+    def compatible(self, params, n_features):
+        """同じ設定・次元の特徴量か"""
+        return self.params == dict(params) and self.n_features == n_features
+
+    def transform(self, features):
+        """学習し直さずに、新しいフレームを保存済みのマップに配置する"""
+        if len(features) == 0:
+            return np.empty((0, 2))
+        return self.umap.transform(features)
+
+    def save(self, path):
+        """ファイルに保存する（書き込み途中のファイルを読まないよう置き換えで保存）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"umap": self.umap, "params": self.params, "n_features": self.n_features},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """保存したマップを読み込む（なければ None）"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        return cls(data["umap"], data["params"], data["n_features"])
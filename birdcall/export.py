@@ -0,0 +1,126 @@
+"""
+フレームの一括書き出し。
+
+フレームごとに小さな WAV を書く方法（従来どおりのファイル名）と、残したフレームを
+つなげた 1 つの音声ファイルに、各フレームの位置とクラスタ番号の索引（.npy）を
+添える方法（コンテナ）がある。索引は np.load(mmap_mode="r") でそのまま読める。
+どちらも進捗の通知と途中での中止に対応し、GUI からは別スレッドで実行する。
+"""
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import soundfile as sf
+
+
+# コンテナの索引（1 行が 1 フレーム。offset・length はコンテナ内のサンプル位置）
+INDEX_DTYPE = np.dtype([
+    ("frame", "<i8"),
+    ("label", "<i4"),
+    ("source_start", "<i8"),
+    ("offset", "<i8"),
+    ("length", "<i8"),
+])
+
+# WAV（RIFF）のデータ部の上限。超える場合は RF64 で書く
+WAV_MAX_BYTES = 0xFFFFFFFF - 1024
+
+
+def index_path(container_path):
+    """コンテナの索引ファイルのパス"""
+    return os.path.splitext(container_path)[0] + "_index.npy"
+
+
+class FrameExporter:
+    """フレームを書き出す（on_progress(済み, 全体) で進捗を通知し、cancel で中止できる）"""
+
+    def __init__(self, y, sr, frame_length, workers=4, on_progress=None, cancel=None):
+        self.y = y
+        self.sr = sr
+        self.frame_length = frame_length
+        self.workers = workers
+        self.on_progress = on_progress
+        self.cancel = cancel if cancel is not None else threading.Event()
+
+    def bounds(self, starts):
+        """フレームの (開始, 終了) サンプル位置（終了は信号の長さで切る）"""
+        starts = np.asarray(starts, dtype=np.int64)
+        return starts, np.minimum(starts + self.frame_length, len(self.y))
+
+    def _progress(self, done, total):
+        if self.on_progress is not None:
+            self.on_progress(done, total)
+
+    def write_files(self, save_dir, frame_ids, starts, labels):
+        """
+        フレームごとに frame_{番号}_{クラスタ}.wav を書く。
+        書き込みはスレッドプールで並列に行い、未完了の書き込みは workers の数倍までに抑える。
+        書き出したファイル数を返す（中止した場合はそこまでの数）。
+        """
+        starts, ends = self.bounds(starts)
+        total = len(starts)
+        done = 0
+        pending = set()
+        max_pending = self.workers * 4
+
+        def write(j):
+            path = os.path.join(save_dir, f"frame_{frame_ids[j]}_{labels[j]}.wav")
+            sf.write(path, self.y[starts[j] : ends[j]], self.sr)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for j in range(total):
+                if self.cancel.is_set():
+                    break
+                pending.add(executor.submit(write, j))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    done += _count(finished)
+                    self._progress(done, total)
+
+            finished, _ = wait(pending)
+            done += _count(finished)
+        self._progress(done, total)
+        return done
+
+    def write_container(self, path, frame_ids, starts, labels, block_frames=256):
+        """
+        残したフレームを順につなげて path（WAV、大きい場合は RF64）に書き、索引を
+        index_path(path) に保存する。書き出したフレーム数を返す。
+        """
+        starts, ends = self.bounds(starts)
+        total = len(starts)
+        lengths = ends - starts
+
+        index = np.zeros(total, dtype=INDEX_DTYPE)
+        index["frame"] = frame_ids
+        index["label"] = labels
+        index["source_start"] = starts
+        index["length"] = lengths
+        index["offset"] = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if total else []
+
+        # sf.write の既定と同じ 16 bit PCM
+        n_bytes = int(lengths.sum()) * 2
+        file_format = "RF64" if n_bytes > WAV_MAX_BYTES else "WAV"
+
+        done = 0
+        with sf.SoundFile(path, "w", samplerate=self.sr, channels=1, subtype="PCM_16", format=file_format) as f:
+            for j in range(0, total, block_frames):
+                if self.cancel.is_set():
+                    break
+                block = slice(j, min(j + block_frames, total))
+                f.write(np.concatenate([self.y[s:e] for s, e in zip(starts[block], ends[block])]))
+                done = block.stop
+                self._progress(done, total)
+
+        # 中止した場合も、書いた分だけの索引を残す
+        np.save(index_path(path), index[:done])
+        return done
+
+
+def _count(futures):
+    """完了した書き込みの数（失敗があれば例外をそのまま送る）"""
+    for future in futures:
+        future.result()
+    return len(futures)
@@ -0,0 +1,133 @@
+"""
+フレームの状態の表。
+
+GUI で確認するフレームごとの情報（開始サンプル・区間番号・クラスタ番号・残すフラグ・
+UMAP の座標）を、フレーム数の長さの NumPy 配列の列として持つ。
+除外したフレームの数はクラスタごとに数えておき、除外・取り消しのたびに
+変わった行の分だけ更新するので、画面の更新のたびに全フレームを数え直さない。
+「クラスタ 2 をすべて除外」「03:10〜03:40 を除外」のようなまとめての操作は
+マスク・スライス 1 つで済み、100 万フレームでもすぐに終わる。
+"""
+
+import re
+
+import numpy as np
+
+
+class FrameTable:
+    """フレームの列（starts・segment_ids・labels・keep・points）と除外数"""
+
+    def __init__(self, starts, segment_ids, labels, sr, keep=None, points=None):
+        # 開始サンプルは時間順（区間の順・区間内のホップ順）に並んでいる
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.segment_ids = np.asarray(segment_ids, dtype=np.int32)
+        self.sr = sr
+        n = len(self.starts)
+        self.keep = np.ones(n, dtype=bool) if keep is None else np.asarray(keep, dtype=bool)
+        # UMAP の座標（計算前のフレーム・除外したフレームは nan）
+        if points is None:
+            points = np.full((n, 2), np.nan, dtype=np.float32)
+        self.points = np.asarray(points, dtype=np.float32)
+        self.set_labels(labels)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def times(self):
+        """各フレームの開始時刻（秒）"""
+        return self.starts / self.sr
+
+    def time(self, i):
+        """フレーム i の開始時刻（秒）"""
+        return self.starts[i] / self.sr
+
+    # ===== クラスタ =====
+    def set_labels(self, labels):
+        """クラスタ番号を差し替え、クラスタごとのフレーム数・除外数を数え直す"""
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.clusters = np.unique(self.labels)
+        n_clusters = int(self.labels.max()) + 1 if len(self.labels) else 0
+        self._total = np.bincount(self.labels, minlength=n_clusters)
+        self._excluded = np.bincount(self.labels[~self.keep], minlength=n_clusters)
+
+    def cluster_counts(self, cluster):
+        """クラスタの (残すフレーム数, フレーム数)"""
+        if cluster >= len(self._total):
+            return 0, 0
+        return int(self._total[cluster] - self._excluded[cluster]), int(self._total[cluster])
+
+    # ===== 残すフラグ =====
+    @property
+    def n_excluded(self):
+        return int(self._excluded.sum())
+
+    @property
+    def n_kept(self):
+        return len(self) - self.n_excluded
+
+    def set_keep(self, rows, keep):
+        """
+        rows（番号・番号の配列・マスク・スライス）のフレームの残すフラグを keep にし、
+        フラグが変わったフレームの数を返す
+        """
+        if not isinstance(rows, slice) and np.ndim(rows) and np.asarray(rows).dtype != bool:
+            # 同じ番号が重なっていても 1 回だけ数える
+            rows = np.unique(rows)
+        changed = np.atleast_1d(self.keep[rows] != keep)
+        labels = np.atleast_1d(self.labels[rows])[changed]
+        self.keep[rows] = keep
+        counts = np.bincount(labels, minlength=len(self._excluded))
+        self._excluded += -counts if keep else counts
+        return len(labels)
+
+    def exclude(self, rows):
+        return self.set_keep(rows, False)
+
+    def include(self, rows):
+        return self.set_keep(rows, True)
+
+    def exclude_cluster(self, cluster):
+        """クラスタのフレームをすべて除外する"""
+        return self.exclude(self.labels == cluster)
+
+    def time_rows(self, start, end):
+        """開始時刻が [start, end) 秒のフレームのスライス"""
+        first, last = np.searchsorted(self.starts, [start * self.sr, end * self.sr])
+        return slice(int(first), int(last))
+
+    def exclude_time(self, start, end):
+        """開始時刻が [start, end) 秒のフレームを除外する"""
+        return self.exclude(self.time_rows(start, end))
+
+    def kept_rows(self):
+        """残すフレームの番号"""
+        return np.flatnonzero(self.keep)
+
+    def rows(self, first=0, cluster=None):
+        """first 以降のフレームの番号（cluster を指定すればそのクラスタだけ）"""
+        if cluster is None:
+            return np.arange(first, len(self))
+        return np.flatnonzero(self.labels[first:] == cluster) + first
+
+
+def parse_time(text):
+    """「190」「03:10」「1:03:10」のような時刻を秒にする"""
+    seconds = 0.0
+    for part in text.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_time_range(text):
+    """「03:10-03:40」「190〜220」のような時間の範囲を (開始, 終了) 秒にする"""
+    parts = [p for p in re.split(r"\s*[-~〜]\s*", text.strip()) if p]
+    if len(parts) != 2:
+        raise ValueError(f"時間の範囲は「03:10-03:40」のように指定してください: {text}")
+    try:
+        start, end = parse_time(parts[0]), parse_time(parts[1])
+    except ValueError:
+        raise ValueError(f"時刻を読み取れません: {text}") from None
+    if end <= start:
+        raise ValueError(f"終了が開始より前です: {text}")
+    return start, end
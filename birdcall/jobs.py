@@ -0,0 +1,144 @@
+"""
+GUI 用のジョブ実行（1 つのワーカースレッドとキュー）。
+
+ジョブ関数は job（Job）を受け取り、job.stage() で段階の開始を、
+job.progress(済み, 全体) でチャンクごとの進み具合を知らせる。progress() と
+check() は中止が要求されていれば JobCancelled を送出するので、処理はチャンクの
+区切りで止まる。進捗と結果の通知は post(func) で GUI のスレッドに渡す
+（tkinter なら post = lambda func: root.after(0, func)）。
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+
+# 進捗の通知内容（fraction はその段階の進み具合 0〜1、eta は段階の残り秒数の見込み）
+Progress = namedtuple("Progress", ["stage", "fraction", "elapsed", "eta"])
+
+# 進捗を GUI に送る最短の間隔（秒）
+PROGRESS_INTERVAL = 0.1
+
+
+class JobCancelled(Exception):
+    """ジョブが中止された"""
+
+
+class Job:
+    """実行中のジョブ。ジョブ関数に渡され、進捗の通知と中止の確認に使う"""
+
+    def __init__(self, func, post, on_progress=None, on_done=None, on_error=None, on_cancel=None):
+        self.func = func
+        self.post = post
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.cancel_event = threading.Event()
+        self.stage_name = None
+        self._stage_start = None
+        self._last_post = 0.0
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """中止を要求する（次のチャンクの区切りで止まる）"""
+        self.cancel_event.set()
+
+    def check(self):
+        """中止が要求されていれば JobCancelled を送出する"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def stage(self, name):
+        """段階の開始を知らせる"""
+        self.check()
+        self.stage_name = name
+        self._stage_start = time.monotonic()
+        self._post_progress(0.0, force=True)
+
+    def progress(self, done, total):
+        """段階内の進み具合を知らせる（チャンクの区切りごとに呼ぶ）"""
+        self.check()
+        if total:
+            self._post_progress(min(1.0, done / total))
+
+    def _post_progress(self, fraction, force=False):
+        now = time.monotonic()
+        if self.on_progress is None or (not force and now - self._last_post < PROGRESS_INTERVAL):
+            return
+        self._last_post = now
+        elapsed = now - self._stage_start
+        eta = elapsed * (1.0 - fraction) / fraction if fraction > 0 else None
+        update = Progress(self.stage_name, fraction, elapsed, eta)
+        self.post(lambda: self.on_progress(update))
+
+    def run(self):
+        """ワーカースレッドで実行し、結果・例外・中止を post で通知する"""
+        try:
+            self.check()
+            result = self.func(self)
+        except JobCancelled:
+            if self.on_cancel is not None:
+                self.post(self.on_cancel)
+        except Exception as e:
+            if self.on_error is not None:
+                error = e
+                self.post(lambda: self.on_error(error))
+        else:
+            if self.on_done is not None:
+                self.post(lambda: self.on_done(result))
+
+
+class JobScheduler:
+    """ジョブを 1 つずつ順に実行する"""
+
+    def __init__(self, post):
+        self.post = post
+        self.current = None
+        self._queue = queue.Queue()
+        # キューで待っているジョブ（中止の要求用）
+        self._pending = []
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, func, on_progress=None, on_done=None, on_error=None, on_cancel=None):
+        """func(job) をキューに入れ、Job を返す"""
+        job = Job(func, self.post, on_progress, on_done, on_error, on_cancel)
+        with self._lock:
+            self._pending.append(job)
+        self._queue.put(job)
+        return job
+
+    def cancel(self):
+        """実行中とキューで待っているジョブをすべて中止する（待っているものは on_cancel だけが呼ばれる）"""
+        with self._lock:
+            jobs = list(self._pending)
+            if self.current is not None:
+                jobs.append(self.current)
+        for job in jobs:
+            job.cancel()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._pending.remove(job)
+                self.current = job
+            try:
+                job.run()
+            finally:
+                with self._lock:
+                    self.current = None
+
+
+def format_progress(progress):
+    """進捗の表示文字列（例: 特徴量 45%（残り約 12 秒））"""
+    text = f"{progress.stage} {progress.fraction * 100:.0f}%"
+    if progress.eta is not None and progress.fraction < 1.0:
+        text += f"（残り約 {progress.eta:.0f} 秒）"
+    return text
@@ -0,0 +1,134 @@
+"""
+クラスタ数 k の自動選択。
+
+候補の k ごとに KMeans を別プロセスで並列に学習し、シルエット係数と
+Calinski–Harabasz 指標で評価する。評価は全フレームではなく上限つきの
+ランダムな部分標本で行うので（シルエット係数は O(N^2)）、フレーム数が多くても軽い。
+"""
+
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import calinski_harabasz_score, silhouette_score
+
+
+KScore = namedtuple("KScore", ["k", "inertia", "silhouette", "calinski_harabasz"])
+
+DEFAULT_K_VALUES = range(2, 11)
+
+# ワーカープロセスの状態（_init_worker で設定）
+_worker = {}
+
+
+def _init_worker(features, sample_index, random_state):
+    # 特徴量は k ごとではなくプロセスごとに 1 回だけ送る
+    _worker["args"] = (features, sample_index, random_state)
+    # KMeans の OpenMP・BLAS のスレッドはプロセスの数だけで足りる（コア数 × スレッド数にしない）
+    try:
+        from threadpoolctl import threadpool_limits
+
+        _worker["limits"] = threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def _score_k_worker(k):
+    features, sample_index, random_state = _worker["args"]
+    return score_k(features, k, sample_index, random_state)
+
+
+def score_k(features, k, sample_index, random_state=0):
+    """k 個のクラスタで学習し、部分標本 sample_index で評価する"""
+    kmeans = KMeans(n_clusters=k, random_state=random_state)
+    labels = kmeans.fit_predict(features)
+
+    sample = features[sample_index]
+    sample_labels = labels[sample_index]
+    if len(np.unique(sample_labels)) < 2:
+        # 部分標本が 1 クラスタに偏ると評価できない
+        return KScore(k, float(kmeans.inertia_), float("nan"), float("nan"))
+    return KScore(
+        k,
+        float(kmeans.inertia_),
+        float(silhouette_score(sample, sample_labels)),
+        float(calinski_harabasz_score(sample, sample_labels)),
+    )
+
+
+def sweep_k(
+    features,
+    k_values=DEFAULT_K_VALUES,
+    workers=None,
+    sample_size=5000,
+    random_state=0,
+    on_done=None,
+):
+    """
+    k_values の各 k を並列に評価し、k の順に並べた KScore のリストを返す。
+    評価にはすべての k で同じ部分標本（最大 sample_size フレーム）を使う。
+    on_done(score) は k が 1 つ終わるごとに呼ばれる。on_done が例外（中止など）を投げると、
+    まだ始まっていない k は捨て、学習中の k が終わるのを待ってから例外を返す。
+    workers はプロセス数（None なら CPU 数。k の候補の数より多くは起動しない）。
+    """
+    features = np.asarray(features)
+    k_values = [k for k in k_values if 2 <= k < len(features)]
+    if not k_values:
+        raise ValueError(f"フレーム数 ({len(features)}) が少なすぎるため k を選べません")
+
+    rng = np.random.default_rng(random_state)
+    if len(features) > sample_size:
+        sample_index = np.sort(rng.choice(len(features), size=sample_size, replace=False))
+    else:
+        sample_index = np.arange(len(features))
+
+    workers = min(workers or os.cpu_count() or 1, len(k_values))
+    scores = []
+    if workers == 1:
+        for k in k_values:
+            scores.append(score_k(features, k, sample_index, random_state))
+            if on_done is not None:
+                on_done(scores[-1])
+    else:
+        # GUI のスレッドや numba・OpenMP のスレッドが動いているプロセスを fork すると
+        # 子プロセスが止まることがあるので、spawn で新しいプロセスを起動する
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(features, sample_index, random_state),
+        )
+        try:
+            futures = [executor.submit(_score_k_worker, k) for k in k_values]
+            for future in as_completed(futures):
+                scores.append(future.result())
+                if on_done is not None:
+                    on_done(scores[-1])
+        except BaseException:
+            # 中止・失敗したら、まだ始まっていない k は捨てる
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+
+    return sorted(scores, key=lambda s: s.k)
+
+
+def suggest_k(scores):
+    """シルエット係数が最も大きい k（同じなら Calinski–Harabasz が大きい方）"""
+    valid = [s for s in scores if not np.isnan(s.silhouette)]
+    if not valid:
+        return None
+    return max(valid, key=lambda s: (round(s.silhouette, 4), s.calinski_harabasz)).k
+
+
+def format_scores(scores, suggested=None):
+    """評価結果の表（コンソール表示用）"""
+    lines = ["  k   シルエット   Calinski-Harabasz   慣性"]
+    for s in scores:
+        mark = "  ← 推奨" if s.k == suggested else ""
+        lines.append(f"{s.k:3d}   {s.silhouette:10.4f}   {s.calinski_harabasz:17.1f}   {s.inertia:.1f}{mark}")
+    return "\n".join(lines)
@@ -0,0 +1,268 @@
+"""
+処理段階ごとの計測（実行時間・CPU 時間・ピークメモリ・件数）と実行レポート。
+
+段階グラフの context["report"] に RunReport を置くと、StageGraph.get() が
+計算した段階ごとに measure() で計測する。段階は入れ子に呼ばれる（frames の中で
+segments を計算するなど）ので、時間は内側の段階の分を差し引いた値を記録する。
+結果は save() で JSON に書き出す。profile="cprofile" / "tracemalloc" を指定すると、
+関数ごとの内訳（.prof）やメモリを確保した行の上位（.txt）も一緒に書き出す。
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+PROFILERS = ("cprofile", "tracemalloc")
+
+
+def current_rss():
+    """このプロセスの今の RSS（バイト）。取得できなければ None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def reset_peak_rss():
+    """
+    ピーク RSS を今の RSS に戻す（Linux 4.0 以降）。戻せれば True。
+    戻した後の peak_rss() は、戻してからのピークになる
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss():
+    """このプロセスのピーク RSS（バイト）。取得できなければ None"""
+    try:
+        # ru_maxrss と違い reset_peak_rss() で戻せる
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux は KB、macOS はバイト
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss)
+
+
+def children_cpu():
+    """
+    終了して回収した子プロセス（プロセスプールのワーカーなど）の CPU 時間の合計（秒）。
+    取得できなければ（Windows）None
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _mb(n_bytes):
+    return None if n_bytes is None else round(n_bytes / 1024 ** 2, 1)
+
+
+class RunReport:
+    """
+    段階ごとの計測結果を集める。counters は {段階名: 値 → {件数名: 件数}} で、
+    段階の値からサンプル数・区間数・フレーム数などを数えるのに使う。
+
+    段階の cpu_sec はこのプロセスの CPU 時間で、同時に動いているほかのスレッド（GUI・
+    読み込みの準備）の分も含む。worker_cpu_sec は段階の間に終了した子プロセス
+    （特徴量抽出や k の選択のプロセスプール）の CPU 時間で、cpu_sec には含まれない。
+
+    段階の peak_rss_mb はその段階の間（内側の段階を含む）のピーク RSS、
+    peak_rss_delta_mb はそれと段階の開始時の RSS との差。ピークを段階ごとに
+    戻せない環境（Linux 以外）では、段階の間にプロセスのピークが更新されなければ
+    開始時と終了時の RSS の大きい方で代える（実際のピークより小さいことがある）。
+    """
+
+    def __init__(self, counters=None, profile=None):
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"profile は {', '.join(PROFILERS)} のいずれかです: {profile}")
+        self.counters = counters or {}
+        self.profile = profile
+        self.stages = []
+        self.info = {}
+        self._stack = []
+        self._profiler = None
+        self._rss_resettable = reset_peak_rss()
+        # ピークを段階ごとに戻すので、全体のピークは別に持つ
+        self._max_rss = peak_rss()
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._started_children = children_cpu()
+        if profile == "cprofile":
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+        elif profile == "tracemalloc":
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextmanager
+    def measure(self, name):
+        """
+        with の中の処理を段階 name として計測する。as で受け取る dict の
+        "counts" に件数を、"value" に段階の値を入れると counters で数える。
+        """
+        record = {"name": name, "counts": {}}
+        frame = {"child_wall": 0.0, "child_cpu": 0.0, "child_workers": 0.0, "child_traced": 0, "child_rss": 0}
+        outermost = not self._stack
+        if not outermost:
+            # 内側の段階がピークを測り直す前に、ここまでのピークを外側の段階に残す
+            parent = self._stack[-1]
+            parent["child_traced"] = max(parent["child_traced"], self._traced_peak())
+            parent["child_rss"] = max(parent["child_rss"], self._rss_peak())
+        self._stack.append(frame)
+        if outermost and self._profiler is not None:
+            # cProfile は呼んだスレッドしか計測しないので、一番外側の段階ごとに有効にする
+            self._profiler.enable()
+        self._reset_traced_peak()
+        rss_start = current_rss()
+        rss_peak_start = self._rss_peak()
+        if self._rss_resettable:
+            reset_peak_rss()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        workers = children_cpu()
+        try:
+            yield record
+        except BaseException as e:
+            # 中止（jobs.JobCancelled）や失敗も、そこまでの時間を残す
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if workers is not None:
+                workers = children_cpu() - workers
+            traced = max(self._traced_peak(), frame["child_traced"])
+            rss = max(self._rss_peak(), frame["child_rss"])
+            if not self._rss_resettable and rss <= rss_peak_start:
+                # ピークを更新しなかった段階は、ピークからは段階の間の値がわからない
+                rss = max(rss_start or 0, current_rss() or 0)
+            if outermost and self._profiler is not None:
+                self._profiler.disable()
+            self._stack.pop()
+            if self._stack:
+                parent = self._stack[-1]
+                parent["child_wall"] += wall
+                parent["child_cpu"] += cpu
+                parent["child_workers"] += workers or 0.0
+                parent["child_traced"] = max(parent["child_traced"], traced)
+                parent["child_rss"] = max(parent["child_rss"], rss)
+
+            value = record.pop("value", None)
+            counter = self.counters.get(name)
+            if counter is not None and value is not None:
+                record["counts"].update(counter(value))
+            record["wall_sec"] = round(wall - frame["child_wall"], 4)
+            record["cpu_sec"] = round(cpu - frame["child_cpu"], 4)
+            record["worker_cpu_sec"] = None if workers is None else round(workers - frame["child_workers"], 4)
+            record["peak_rss_mb"] = _mb(rss or None)
+            record["peak_rss_delta_mb"] = (
+                _mb(max(rss - rss_start, 0)) if rss and rss_start is not None else None
+            )
+            if self.profile == "tracemalloc":
+                record["traced_peak_mb"] = _mb(traced)
+            self.stages.append(record)
+
+    def _rss_peak(self):
+        """最後に戻してからのピーク RSS（バイト）。全体のピークも更新する"""
+        peak = peak_rss() or 0
+        self._max_rss = max(self._max_rss or 0, peak)
+        return peak
+
+    def _reset_traced_peak(self):
+        if self.profile != "tracemalloc":
+            return
+        import tracemalloc
+
+        # reset_peak は Python 3.9 以降
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+
+    def _traced_peak(self):
+        if self.profile != "tracemalloc":
+            return 0
+        import tracemalloc
+
+        return tracemalloc.get_traced_memory()[1]
+
+    def to_dict(self):
+        """JSON に書き出す内容"""
+        self._rss_peak()
+        return {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **self.info,
+            "stages": self.stages,
+            "total": {
+                "wall_sec": round(time.perf_counter() - self._started, 4),
+                "cpu_sec": round(time.process_time() - self._started_cpu, 4),
+                "worker_cpu_sec": (
+                    None if self._started_children is None else round(children_cpu() - self._started_children, 4)
+                ),
+                "stage_wall_sec": round(sum(s["wall_sec"] for s in self.stages), 4),
+                "peak_rss_mb": _mb(self._max_rss or None),
+            },
+        }
+
+    def save(self, path):
+        """レポートを path（JSON）に書き、プロファイルがあれば同じ場所に書き出す"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+        stem = os.path.splitext(path)[0]
+        if self._profiler is not None:
+            self._profiler.dump_stats(stem + ".prof")
+        elif self.profile == "tracemalloc":
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            with open(stem + "_tracemalloc.txt", "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:30]:
+                    f.write(f"{stat}\n")
+
+    def format(self):
+        """段階ごとの計測結果の表（コンソール表示用）"""
+        lines = ["段階            実時間(秒)  CPU(秒)  子CPU(秒)  ピークRSS(MB)  増分(MB)  件数"]
+        for s in self.stages:
+            counts = ", ".join(f"{k}={v}" for k, v in s["counts"].items())
+            lines.append(
+                f"{s['name']:<14}  {s['wall_sec']:10.3f}  {s['cpu_sec']:7.3f}  {s['worker_cpu_sec'] or 0:9.3f}"
+                f"  {s['peak_rss_mb'] or 0:13.1f}"
+                f"  {s['peak_rss_delta_mb'] or 0:8.1f}  {counts}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,135 @@
+"""
+複数のプロセスでの特徴量抽出。
+
+MfccExtractor.extract はバッチ単位の行列計算でも 1 コアしか使わない。ここでは
+フレームの並びを、直列処理と同じバッチの区切りで揃えた作業単位に分けてプロセスプールに配り、
+結果を作業単位の順（＝時間順）につなげる。各バッチの計算は直列処理とまったく同じなので、
+結果も直列処理と一致する。
+
+フィルタ済み信号はプロセスごとにコピーせず、ファイルを memmap で共有する
+（信号が既に memmap ならそのファイルを、そうでなければ一時ファイルに書いて使う）。
+各プロセスは必要なフレームだけをページキャッシュから読む。
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .features import FrameFeatures, frame_starts
+from .stream import write_signal
+
+# これより少ないフレーム数なら直列で計算する（プロセスの起動の方が長くかかる）
+PARALLEL_MIN_FRAMES = 20000
+
+# 1 プロセスあたりの作業単位の数（単位ごとの計算時間のばらつきをならす）
+UNITS_PER_WORKER = 4
+
+# ワーカープロセスの状態（_init_worker で設定）
+_worker = {}
+
+
+def signal_file(y):
+    """
+    y が 1 次元の memmap なら (ファイル名, オフセット) を返す（そうでなければ None）。
+    部分配列の memmap は offset が元のままなので、開き直して中身を確かめる
+    """
+    if not isinstance(y, np.memmap) or y.filename is None or y.ndim != 1 or len(y) == 0:
+        return None
+    if not y.flags.c_contiguous:
+        return None
+    try:
+        check = np.memmap(y.filename, dtype=y.dtype, mode="r", offset=y.offset, shape=y.shape)
+    except (OSError, ValueError):
+        return None
+    edges = [0, len(y) // 2, len(y) - 1]
+    if not np.array_equal(check[edges], y[edges]):
+        return None
+    return y.filename, y.offset
+
+
+def work_units(n_frames, batch, workers):
+    """フレーム番号の範囲 (開始, 終了) の並び。境界は batch の倍数に揃える"""
+    n_units = max(1, workers * UNITS_PER_WORKER)
+    size = -(-n_frames // n_units)
+    size = max(batch, -(-size // batch) * batch)
+    return [(start, min(start + size, n_frames)) for start in range(0, n_frames, size)]
+
+
+def _init_worker(path, offset, length, dtype, extractor):
+    # 行列計算のスレッドはプロセスの数だけで足りる（コア数 × スレッド数にしない）
+    try:
+        from threadpoolctl import threadpool_limits
+
+        _worker["limits"] = threadpool_limits(1)
+    except ImportError:
+        pass
+    _worker["y"] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(length,))
+    _worker["extractor"] = extractor
+
+
+def _extract_unit(starts, segment_ids, frame_length):
+    return _worker["extractor"].extract_at(_worker["y"], starts, segment_ids, frame_length)
+
+
+def extract_parallel(extractor, y, segments, frame_length, hop_length, workers=None, on_progress=None):
+    """
+    extractor.extract と同じ結果を、workers 個（None なら CPU 数）のプロセスで計算する。
+    on_progress(済みフレーム数, 全フレーム数) は作業単位が終わるごとに呼ばれる。
+    """
+    workers = workers or os.cpu_count() or 1
+    starts, segment_ids = frame_starts(segments, frame_length, hop_length)
+    if workers == 1 or len(starts) < PARALLEL_MIN_FRAMES:
+        return extractor.extract_at(y, starts, segment_ids, frame_length, on_progress=on_progress)
+
+    units = work_units(len(starts), extractor.batch_size(frame_length), workers)
+    shared = signal_file(y)
+    tmp_dir = None
+    try:
+        if shared is None:
+            tmp_dir = tempfile.mkdtemp(prefix="birdcall_signal_")
+            path = os.path.join(tmp_dir, "filtered.f32")
+            shared = (write_signal(path, [np.asarray(y, dtype=np.float32)]).filename, 0)
+            dtype = np.float32
+        else:
+            dtype = y.dtype
+
+        # GUI のスレッドや numba のスレッドが動いているプロセスを fork しないよう spawn で起動する
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(
+            max_workers=min(workers, len(units)),
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(shared[0], shared[1], len(y), dtype, extractor),
+        )
+        try:
+            futures = {
+                executor.submit(_extract_unit, starts[a:b], segment_ids[a:b], frame_length): i
+                for i, (a, b) in enumerate(units)
+            }
+            results = [None] * len(units)
+            done = 0
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += units[i][1] - units[i][0]
+                if on_progress is not None:
+                    on_progress(done, len(starts))
+        except BaseException:
+            # 中止・失敗したら、まだ始まっていない作業単位は捨てる
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # 作業単位の順（時間順）につなげる
+    return FrameFeatures(
+        np.concatenate([r.features for r in results]),
+        np.concatenate([r.starts for r in results]),
+        np.concatenate([r.segment_ids for r in results]),
+    )
@@ -0,0 +1,797 @@
+"""
+読み込み → ハイパス → 区間分割 → フレーム分割 → MFCC → KMeans → UMAP の処理パイプライン。
+
+GUI のスライダーに依存しないので、スクリプトやコマンドライン
+（python -m birdcall）から画面なしで実行できる。複数ファイルは
+run_batch() でプロセスプールに分散して処理する。
+"""
+
+import csv
+import glob
+import os
+import tempfile
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import librosa
+import numpy as np
+import scipy.signal as signal
+import soundfile as sf
+from sklearn.cluster import KMeans
+
+from . import plots
+from .cache import SIGNAL_SUFFIX, file_digest
+from .embedding import UmapModel
+from .features import MfccExtractor
+from .metrics import RunReport
+from .parallel import extract_parallel
+from .resample import analysis_rate, check_analysis_rate, resample
+from .segments import split_activity, split_signal
+from .spectrogram import PyramidBuilder, build_pyramid, open_pyramid
+from .stages import StageGraph
+from .stream import ACTIVITY_MODES, ScanResult, StreamingFrontEnd, iter_filtered, signal_info, write_signal
+
+
+# 段階 "filtered" の値（y は ndarray または memmap）
+FilteredSignal = namedtuple("FilteredSignal", ["y", "sr"])
+
+# process() の結果
+PipelineResult = namedtuple(
+    "PipelineResult",
+    ["path", "y", "sr", "segments", "frames", "labels", "streaming"],
+)
+
+# 実行レポートに書く段階ごとの件数（段階の値 → {件数名: 件数}）
+STAGE_COUNTERS = {
+    "audio": lambda value: {"samples": len(value[0])},
+    "filtered": lambda value: {"samples": len(value.y)} if value.y is not None else {},
+    "spectrogram": lambda value: {"samples": value.n_samples},
+    "segments": lambda value: {"segments": len(value)},
+    "frames": lambda value: {"frames": len(value.starts)},
+    "labels": lambda value: {"frames": len(value)},
+    "embedding": lambda value: {"frames": len(value)},
+}
+
+# 実行レポートのファイル名（出力フォルダに書く）
+REPORT_NAME = "run_report.json"
+
+
+class BirdcallPipeline:
+    """パラメーターを保持し、各段階の処理を提供する"""
+
+    def __init__(
+        self,
+        cutoff=3000,
+        top_db=45,
+        frame_length_sec=0.25,
+        hop_length_sec=0.25,
+        n_mfcc=20,
+        n_clusters=4,
+        min_duration=0.1,
+        random_state=0,
+        streaming_min_duration=30 * 60,
+        cache=None,
+        umap_model=None,
+        memmap_signal=False,
+        extract_workers=1,
+        activity="adaptive",
+        analysis_sr=None,
+    ):
+        if activity not in ACTIVITY_MODES:
+            raise ValueError(f"activity は {', '.join(ACTIVITY_MODES)} のいずれかです: {activity}")
+        check_analysis_rate(analysis_sr, cutoff)
+        self.cutoff = cutoff
+        self.top_db = top_db
+        self.frame_length_sec = frame_length_sec
+        self.hop_length_sec = hop_length_sec
+        self.n_mfcc = n_mfcc
+        self.n_clusters = n_clusters
+        self.min_duration = min_duration
+        self.random_state = random_state
+        # この長さ（秒）以上の録音はストリーミング処理にする
+        self.streaming_min_duration = streaming_min_duration
+        # FeatureCache（None ならキャッシュしない）
+        self.cache = cache
+        # 保存する UMAP マップのパス（None なら毎回学習し直す）
+        self.umap_model = umap_model
+        # 短い録音でもフィルタ済み信号をファイル（キャッシュか spill_path）に書き、
+        # memmap で持つ。再生・書き出しはページキャッシュから読む
+        self.memmap_signal = memmap_signal
+        # 特徴量抽出のプロセス数（None なら CPU 数）。フレームが少ない録音は直列で計算する。
+        # 結果は直列と同じなのでキャッシュのキーには含めない
+        self.extract_workers = extract_workers
+        # 区間検出の方法（adaptive: 近くの大きな音を基準にブロックごとに確定、
+        # global: librosa.effects.split と同じく録音全体の最大値が基準）
+        self.activity = activity
+        # 解析のサンプリング周波数。録音の周波数がこれより高ければ読み込み時にポリフェーズで間引き、
+        # フィルタ以降（フレームのサンプル数・再生・書き出しを含む）はこの周波数で扱う。None なら元のまま
+        self.analysis_sr = analysis_sr
+
+    def frame_samples(self, sr):
+        """(frame_length, hop_length) をサンプル数で返す"""
+        return int(sr * self.frame_length_sec), int(sr * self.hop_length_sec)
+
+    def signal_rate(self, path):
+        """録音 path を解析する周波数"""
+        return analysis_rate(librosa.get_samplerate(path), self.analysis_sr)
+
+    def signal_length(self, path):
+        """録音 path の解析周波数でのサンプル数"""
+        return signal_info(path, self.analysis_sr)[1]
+
+    def should_stream(self, path):
+        """録音が長い場合はストリーミング処理を使う（soundfile で読めない形式は従来処理）"""
+        try:
+            info = sf.info(path)
+        except Exception:
+            return False
+        return info.frames / info.samplerate >= self.streaming_min_duration
+
+    # ===== 各段階 =====
+    def load(self, path):
+        """音声を読み込む（元の周波数が解析周波数より高ければ間引く）"""
+        y, sr = librosa.load(path, sr=None)
+        rate = analysis_rate(sr, self.analysis_sr)
+        return resample(y, sr, rate), rate
+
+    def highpass(self, y, sr):
+        """高周波だけを残すハイパスフィルタ（ゼロ位相）。結果は float32"""
+        b, a = signal.butter(4, self.cutoff / (sr / 2), btype="high")
+        # filtfilt は内部で float64 に広げるので、結果だけ元の精度に戻す
+        return signal.filtfilt(b, a, y).astype(np.float32)
+
+    def split(self, y, sr):
+        """鳴き声のある区間 (start, end) のリスト（min_duration 秒以上のみ）"""
+        if self.activity == "adaptive":
+            return split_activity(y, sr, self.top_db, self.min_duration)
+        intervals = librosa.effects.split(y, top_db=self.top_db)
+        return [
+            (int(start), int(end))
+            for start, end in intervals
+            if (end - start) / sr >= self.min_duration
+        ]
+
+    def prepare(self, path, spill_path=None):
+        """
+        読み込み・ハイパス・区間分割までを行い (y, sr, segments, streaming) を返す。
+        長時間録音ではストリーミング処理になり、spill_path を指定すると y は
+        フィルタ済み信号の memmap、省略すると None になる。
+        """
+        if self.should_stream(path):
+            frontend = self.frontend()
+            scan = frontend.scan(path, spill_path=spill_path)
+            return scan.filtered, scan.sr, scan.segments, True
+
+        y_original, sr = self.load(path)
+        y = self.highpass(y_original, sr)
+        return y, sr, self.split(y, sr), False
+
+    def frontend(self):
+        """同じパラメーターのストリーミング前処理"""
+        return StreamingFrontEnd(
+            cutoff=self.cutoff,
+            top_db=self.top_db,
+            frame_length_sec=self.frame_length_sec,
+            hop_length_sec=self.hop_length_sec,
+            n_mfcc=self.n_mfcc,
+            min_duration=self.min_duration,
+            activity=self.activity,
+            analysis_sr=self.analysis_sr,
+        )
+
+    def extract(self, y, sr, segments, on_progress=None):
+        """区間をフレーム分割して MFCC 特徴量を計算する"""
+        frame_length, hop_length = self.frame_samples(sr)
+        extractor = MfccExtractor(sr, n_mfcc=self.n_mfcc)
+        if self.extract_workers != 1:
+            return extract_parallel(
+                extractor, y, segments, frame_length, hop_length, self.extract_workers, on_progress=on_progress
+            )
+        return extractor.extract(y, segments, frame_length, hop_length, on_progress=on_progress)
+
+    def spectrogram(self, path, y, sr, out_dir, on_progress=None, digest=None):
+        """
+        フィルタ済み信号のスペクトログラムピラミッドを out_dir に作る。
+        y が None（信号を保存していないストリーミング処理）ならファイルを読み直す。
+        digest（録音の内容ハッシュ）はマニフェストに書く。
+        """
+        if y is not None:
+            return build_pyramid(y, sr, out_dir, on_progress=on_progress, digest=digest)
+        sr, blocks = iter_filtered(path, self.cutoff, target_sr=self.analysis_sr)
+        n_samples = self.signal_length(path)
+        builder = PyramidBuilder(out_dir, sr, n_samples, digest=digest)
+        position = 0
+        for block in blocks:
+            builder.update(block)
+            position += len(block)
+            if on_progress is not None:
+                on_progress(position, n_samples)
+        return builder.finish()
+
+    def cluster(self, features):
+        """KMeans でクラスタ番号を付ける"""
+        kmeans = KMeans(n_clusters=self.n_clusters, random_state=self.random_state)
+        return kmeans.fit_predict(features)
+
+    def embed(self, features):
+        """
+        UMAP で 2 次元に埋め込む。umap_model を指定すると、保存済みのマップがあれば
+        transform で配置し、なければ学習してそのパスに保存する。
+        """
+        if self.umap_model is None:
+            # umap は読み込みだけで数秒かかるので、使うときに読み込む（embedding.py と同じ）
+            from umap import UMAP
+
+            umap = UMAP(n_components=2, random_state=self.random_state)
+            return umap.fit_transform(features)
+
+        params = self.embedding_params()
+        model = UmapModel.load(self.umap_model)
+        if model is not None:
+            if model.compatible(params, features.shape[1]):
+                return model.transform(features)
+            # 保存済みのマップは上書きせず、この回だけ学習する
+            print(f"UMAP マップの特徴量の設定が異なるため学習し直します: {self.umap_model}")
+            return UmapModel.fit(features, params, self.random_state).embedding
+
+        model = UmapModel.fit(features, params, self.random_state)
+        model.save(self.umap_model)
+        print(f"UMAP マップを保存しました: {self.umap_model}")
+        return model.embedding
+
+    # ===== 段階グラフ =====
+    def stage_params(self, path):
+        """段階グラフに渡すパラメーター"""
+        return {
+            "path": os.path.abspath(path),
+            "streaming": self.should_stream(path),
+            "analysis_sr": self.analysis_sr,
+            "cutoff": self.cutoff,
+            "top_db": self.top_db,
+            "min_duration": self.min_duration,
+            "activity": self.activity,
+            "frame_length_sec": self.frame_length_sec,
+            "hop_length_sec": self.hop_length_sec,
+            "n_mfcc": self.n_mfcc,
+            "n_clusters": self.n_clusters,
+            "random_state": self.random_state,
+            "umap_model": self.umap_model,
+            "keep": None,
+        }
+
+    def build_stages(self, path, spill_path=None, report=None):
+        """
+        1 ファイル分の段階グラフを作る。
+        audio → filtered → segments → frames → labels / embedding の順に依存し
+        （spectrogram は filtered だけに依存）、
+        パラメーターを変えて get() すると影響を受ける段階だけが再計算される。
+        report（RunReport）を渡すと計算した段階ごとに計測する。
+        """
+        graph = StageGraph(self.stage_params(path))
+        graph.context["cache"] = self.cache
+        graph.context["spill_path"] = spill_path
+        graph.context["memmap_signal"] = self.memmap_signal
+        # 結果を変えない設定はパラメーターではなく context で段階に渡す
+        graph.context["extract_workers"] = self.extract_workers
+        # フィルタ済み信号の標本が要るか（GUI の再生・表示）。要らなければ、特徴量がキャッシュに
+        # あるとき信号がキャッシュから消えていても録音を読み直さない（y は None になる）
+        graph.context["need_signal"] = False
+        graph.context["report"] = report
+        # ディスクキャッシュから読めた段階の名前
+        graph.context["cache_hits"] = set()
+
+        graph.add("audio", _stage_audio, params=("path", "analysis_sr"))
+        graph.add(
+            "filtered", _stage_filtered, deps=("audio",), params=("path", "streaming", "analysis_sr", "cutoff")
+        )
+        graph.add("spectrogram", _stage_spectrogram, deps=("filtered",))
+        graph.add("segments", _stage_segments, deps=("filtered",), params=("top_db", "min_duration", "activity"))
+        graph.add(
+            "frames",
+            _stage_frames,
+            deps=("filtered", "segments"),
+            params=("frame_length_sec", "hop_length_sec", "n_mfcc"),
+        )
+        graph.add("labels", _stage_labels, deps=("frames",), params=("n_clusters", "random_state"))
+        graph.add("embedding", _stage_embedding, deps=("frames",), params=("keep", "random_state", "umap_model"))
+        return graph
+
+    def apply_params(self, graph):
+        """このパイプラインのパラメーターを既存の段階グラフに反映する"""
+        params = self.stage_params(graph.params["path"])
+        params["keep"] = graph.params.get("keep")
+        graph.context["cache"] = self.cache
+        graph.context["memmap_signal"] = self.memmap_signal
+        graph.context["extract_workers"] = self.extract_workers
+        graph.set(**params)
+
+    @classmethod
+    def from_params(cls, params, cache=None, memmap_signal=False, extract_workers=1):
+        """段階グラフのパラメーターから同じ設定のパイプラインを作る（結果を変えない設定は引数で渡す）"""
+        return cls(
+            cutoff=params["cutoff"],
+            top_db=params["top_db"],
+            frame_length_sec=params["frame_length_sec"],
+            hop_length_sec=params["hop_length_sec"],
+            n_mfcc=params["n_mfcc"],
+            n_clusters=params["n_clusters"],
+            min_duration=params["min_duration"],
+            activity=params.get("activity", "adaptive"),
+            analysis_sr=params.get("analysis_sr"),
+            random_state=params["random_state"],
+            cache=cache,
+            umap_model=params.get("umap_model"),
+            memmap_signal=memmap_signal,
+            extract_workers=extract_workers,
+        )
+
+    # ===== キャッシュ =====
+    def feature_params(self, streaming):
+        """特徴量キャッシュのキーに使うパラメーター"""
+        return {
+            "cutoff": self.cutoff,
+            "top_db": self.top_db,
+            "frame_length": self.frame_length_sec,
+            "hop_length": self.hop_length_sec,
+            "n_mfcc": self.n_mfcc,
+            "min_duration": self.min_duration,
+            "activity": self.activity,
+            "analysis_sr": self.analysis_sr,
+            "streaming": streaming,
+        }
+
+    def scan_params(self):
+        """ストリーミング走査で求めた区間が使い回せるかの判定に使う値"""
+        return (self.analysis_sr, self.cutoff, self.top_db, self.min_duration, self.activity)
+
+    def frame_params(self):
+        """ストリーミング走査と同時に計算した特徴量が使い回せるかの判定に使う値"""
+        return self.scan_params() + (self.frame_length_sec, self.hop_length_sec, self.n_mfcc)
+
+    def embedding_params(self):
+        """保存した UMAP マップに同じ座標系で配置できるかの判定に使うパラメーター"""
+        return {
+            "analysis_sr": self.analysis_sr,
+            "cutoff": self.cutoff,
+            "frame_length": self.frame_length_sec,
+            "hop_length": self.hop_length_sec,
+            "n_mfcc": self.n_mfcc,
+        }
+
+    def signal_params(self, streaming):
+        """フィルタ済み信号のキャッシュのキーに使うパラメーター"""
+        return {"analysis_sr": self.analysis_sr, "cutoff": self.cutoff, "streaming": streaming}
+
+    # ===== 計測 =====
+    def new_report(self, path, profile=None):
+        """1 ファイル分の実行レポート（profile は None / "cprofile" / "tracemalloc"）"""
+        report = RunReport(STAGE_COUNTERS, profile=profile)
+        params = self.stage_params(path)
+        params.pop("keep")
+        report.info["path"] = params.pop("path")
+        report.info["params"] = params
+        return report
+
+    def process(self, path, spill_path=None, stages=None, report=None):
+        """1 ファイルをクラスタリングまで処理する（stages を渡すと変わった段階だけ再計算）"""
+        if stages is None:
+            stages = self.build_stages(path, spill_path=spill_path, report=report)
+        else:
+            self.apply_params(stages)
+            if report is not None:
+                stages.context["report"] = report
+
+        filtered = stages.get("filtered")
+        segments = stages.get("segments")
+        frames = stages.get("frames")
+        labels = stages.get("labels")
+        if report is not None:
+            report.info["cache_hits"] = sorted(stages.context["cache_hits"])
+        return PipelineResult(
+            path,
+            filtered.y,
+            filtered.sr,
+            segments,
+            frames,
+            labels,
+            stages.params["streaming"],
+        )
+
+    # ===== 出力 =====
+    def save_outputs(self, result, output_dir, points=None, save_plots=True):
+        """特徴量・ラベル・図を output_dir に書き出す（ウィンドウは開かない）"""
+        os.makedirs(output_dir, exist_ok=True)
+        frame_times = result.frames.starts / result.sr
+
+        np.savez(
+            os.path.join(output_dir, "features.npz"),
+            mfcc_array=result.frames.features,
+            frame_times=frame_times,
+            frame_starts=result.frames.starts,
+            segment_ids=result.frames.segment_ids,
+            segments=np.asarray(result.segments, dtype=np.int64).reshape(-1, 2),
+            labels=result.labels,
+            points=points if points is not None else np.empty((0, 2)),
+            sr=result.sr,
+        )
+
+        write_labels_csv(
+            os.path.join(output_dir, "labels.csv"), frame_times, result.frames.segment_ids, result.labels
+        )
+
+        if not save_plots:
+            return
+
+        pyramid = self.spectrogram(result.path, result.y, result.sr, os.path.join(output_dir, "spectrogram_pyramid"))
+        fig = plots.new_figure((12, 4))
+        plots.draw_pyramid_spectrogram(fig, pyramid)
+        plots.save_figure(fig, os.path.join(output_dir, "spectrogram_full_audio.png"))
+
+        if points is not None:
+            fig = plots.new_figure((8, 6))
+            plots.draw_umap(fig, points, result.labels)
+            plots.save_figure(fig, os.path.join(output_dir, "cluster_visualization_umap.png"))
+
+    def run_file(self, path, output_dir, embed=True, save_plots=True, profile=None):
+        """
+        1 ファイルを処理して書き出し、概要の dict を返す。
+        段階ごとの計測結果は output_dir の run_report.json に書く。
+        """
+        report = self.new_report(path, profile=profile)
+        result = self.process(path, report=report)
+        points = None
+        if embed and len(result.labels) > 1:
+            with report.measure("embedding") as record:
+                points = self.embed(result.frames.features)
+                record["value"] = points
+        with report.measure("save_outputs"):
+            self.save_outputs(result, output_dir, points=points, save_plots=save_plots)
+        report.save(os.path.join(output_dir, REPORT_NAME))
+        return {
+            "path": path,
+            "output_dir": output_dir,
+            "segments": len(result.segments),
+            "frames": len(result.labels),
+            "streaming": result.streaming,
+        }
+
+
+def find_wav_files(inputs):
+    """ファイル・ディレクトリ・glob パターンの並びから WAV ファイルの一覧を作る"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = [
+                os.path.join(item, name)
+                for name in os.listdir(item)
+                if name.lower().endswith(".wav")
+            ]
+        elif os.path.isfile(item):
+            matches = [item]
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.extend(sorted(matches))
+
+    # 重複を除いて順序を保つ
+    seen = set()
+    unique = []
+    for path in paths:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def write_labels_csv(path, frame_times, segment_ids, labels):
+    """フレームごとの時刻・区間番号・クラスタ番号を CSV に書く"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame", "time_sec", "segment", "cluster"])
+        for i, (t, seg, label) in enumerate(zip(frame_times, segment_ids, labels)):
+            writer.writerow([i, f"{t:.4f}", int(seg), int(label)])
+
+
+def default_output_dir(path, output_root=None):
+    """ファイルごとの出力先（既定は WAV と同じフォルダの cluster_segments/<名前>）"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if output_root is None:
+        output_root = os.path.join(os.path.dirname(os.path.abspath(path)), "cluster_segments")
+    return os.path.join(output_root, stem)
+
+
+def _run_one(pipeline, path, output_dir, embed, save_plots, profile=None):
+    """プロセスプールのワーカー（例外は文字列にして返す）"""
+    try:
+        return pipeline.run_file(path, output_dir, embed=embed, save_plots=save_plots, profile=profile)
+    except Exception as e:
+        return {"path": path, "output_dir": output_dir, "error": f"{e}\n{traceback.format_exc()}"}
+
+
+def run_batch(
+    pipeline,
+    paths,
+    output_root=None,
+    workers=None,
+    embed=True,
+    save_plots=True,
+    on_done=None,
+    profile=None,
+):
+    """
+    複数ファイルをプロセスプールで並列に処理する。
+    on_done(summary) は 1 ファイル終わるごとに呼ばれる。結果は paths の順で返す。
+    """
+    jobs = [(path, default_output_dir(path, output_root)) for path in paths]
+    summaries = [None] * len(jobs)
+
+    if workers == 1 or len(jobs) <= 1:
+        for i, (path, output_dir) in enumerate(jobs):
+            summaries[i] = _run_one(pipeline, path, output_dir, embed, save_plots, profile)
+            if on_done is not None:
+                on_done(summaries[i])
+        return summaries
+
+    # UMAP マップをこれから作る場合は、最初のファイルだけ先に処理してマップを保存し、
+    # 残りのファイルはすべて同じマップに配置する
+    first = 0
+    if embed and pipeline.umap_model is not None and not os.path.exists(pipeline.umap_model):
+        first = 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def submit(indices):
+            return {
+                executor.submit(_run_one, pipeline, jobs[i][0], jobs[i][1], embed, save_plots, profile): i
+                for i in indices
+            }
+
+        for indices in (range(first), range(first, len(jobs))):
+            futures = submit(indices)
+            for future in as_completed(futures):
+                i = futures[future]
+                summaries[i] = future.result()
+                if on_done is not None:
+                    on_done(summaries[i])
+    return summaries
+
+
+# ===== 段階の処理 =====
+# 段階グラフは GUI のスライダー操作をまたいで使い回すので、各段階は
+# その時点の graph.params からパイプラインを作り直して処理する。
+def _stage_pipeline(graph):
+    return BirdcallPipeline.from_params(
+        graph.params,
+        cache=graph.context.get("cache"),
+        memmap_signal=graph.context.get("memmap_signal", False),
+        extract_workers=graph.context.get("extract_workers", 1),
+    )
+
+
+def _stage_progress(graph, name):
+    """
+    context["job"]（jobs.Job）があれば段階の開始を知らせ、チャンクごとの進捗の
+    通知先 job.progress を返す（なければ None）。中止はチャンクの区切りで効く。
+    """
+    job = graph.context.get("job")
+    if job is None:
+        return None
+    job.stage(name)
+    return job.progress
+
+
+def _cache_keys(graph, pipeline):
+    """(特徴量キー, 信号キー)。キャッシュがなければ (None, None)"""
+    cache = graph.context.get("cache")
+    if cache is None:
+        return None, None
+    streaming = graph.params["streaming"]
+    path = graph.params["path"]
+    return (
+        cache.key(path, pipeline.feature_params(streaming)),
+        cache.key(path, pipeline.signal_params(streaming)),
+    )
+
+
+def _cached_entry(graph, pipeline):
+    """現在のパラメーターの特徴量がディスクキャッシュにあれば返す"""
+    feature_key, _ = _cache_keys(graph, pipeline)
+    if feature_key is None:
+        return None
+    memo = graph.context.get("entry")
+    if memo is not None and memo[0] == feature_key:
+        return memo[1]
+    entry = graph.context["cache"].load_features(feature_key)
+    graph.context["entry"] = (feature_key, entry)
+    return entry
+
+
+def _stage_audio(graph):
+    """読み込み（ストリーミング時はメモリに載せないので None）"""
+    if graph.params["streaming"]:
+        return None
+    _stage_progress(graph, "読み込み")
+    return _stage_pipeline(graph).load(graph.params["path"])
+
+
+def _stage_filtered(graph):
+    """ハイパスフィルタ済み信号（キャッシュにあれば memmap で読む）"""
+    pipeline = _stage_pipeline(graph)
+    path = graph.params["path"]
+    cache = graph.context.get("cache")
+    _, signal_key = _cache_keys(graph, pipeline)
+
+    if cache is not None:
+        y = cache.load_signal(signal_key)
+        if y is not None:
+            graph.context["cache_hits"].add("filtered")
+            return FilteredSignal(y, pipeline.signal_rate(path))
+        entry = _cached_entry(graph, pipeline)
+        if entry is not None and not graph.context.get("need_signal"):
+            # 区間・特徴量はキャッシュから読むので、信号のために録音を読み直さない
+            graph.context["cache_hits"].add("filtered")
+            return FilteredSignal(None, entry.sr)
+
+    if graph.params["streaming"]:
+        frontend = pipeline.frontend()
+        # adaptive の区間検出なら、同じ 1 パスで特徴量まで計算しておき frames 段階で使い回す
+        # （実行レポートではこの段階の時間に含まれる）
+        single_pass = pipeline.activity == "adaptive" and _cached_entry(graph, pipeline) is None
+        on_progress = _stage_progress(graph, "ハイパスフィルタ・特徴量" if single_pass else "ハイパスフィルタ")
+
+        def scan_file(spill_path):
+            if not single_pass:
+                return frontend.scan(path, spill_path=spill_path, on_progress=on_progress)
+            scan, frames = frontend.run(path, spill_path=spill_path, on_progress=on_progress)
+            graph.context["scan_frames"] = (pipeline.frame_params(), frames)
+            return scan
+
+        if cache is None:
+            scan = scan_file(graph.context.get("spill_path"))
+            filtered = scan.filtered
+        else:
+            # 途中で中止されても書きかけの信号がキャッシュに残らないよう、一時ファイルに書いてから置き換える
+            signal_path = cache.signal_path(signal_key)
+            tmp_path = f"{signal_path}.{os.getpid()}.tmp"
+            try:
+                scan = scan_file(tmp_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            scan = scan._replace(filtered=None)
+            os.replace(tmp_path, signal_path)
+            cache.evict(keep=(signal_path,), suffixes=(SIGNAL_SUFFIX,))
+            filtered = cache.load_signal(signal_key)
+        # 同じ走査で求めた区間は、top_db などが変わるまで segments 段階で使い回す
+        graph.context["scan_segments"] = (pipeline.scan_params(), scan.segments)
+        return FilteredSignal(filtered, scan.sr)
+
+    y_original, sr = graph.get("audio")
+    _stage_progress(graph, "ハイパスフィルタ")
+    y = pipeline.highpass(y_original, sr)
+    if cache is not None:
+        cache.save_signal(signal_key, y)
+
+    if graph.context.get("memmap_signal"):
+        spill_path = graph.context.get("spill_path")
+        if cache is not None:
+            y = cache.load_signal(signal_key)
+        elif spill_path is not None:
+            y = write_signal(spill_path, [y])
+        # 読み込んだ元の信号も手放す（カットオフを変えたときは読み込みからやり直す）
+        graph.invalidate("audio")
+    return FilteredSignal(y, sr)
+
+
+def _content_digest(graph):
+    """録音の内容ハッシュ（キャッシュがあればその記録を使い、なければ一度だけ計算する）"""
+    path = graph.params["path"]
+    memo = graph.context.get("digest")
+    if memo is not None and memo[0] == path:
+        return memo[1]
+    cache = graph.context.get("cache")
+    digest = cache.content_digest(path) if cache is not None else file_digest(path)
+    graph.context["digest"] = (path, digest)
+    return digest
+
+
+def _stage_spectrogram(graph):
+    """
+    スペクトログラムピラミッド。context["pyramid_dir"] の下に録音の内容・解析周波数・
+    カットオフ周波数ごとに作り、同じ録音のものが既にあれば読み直さずに使う
+    （pyramid_dir がなければ一時フォルダに作る）。pyramid_dir はフォルダ内の録音で共有される
+    """
+    filtered = graph.get("filtered")
+    pyramid_dir = graph.context.get("pyramid_dir")
+    digest = None
+    if pyramid_dir is None:
+        out_dir = tempfile.mkdtemp(prefix="birdcall_pyramid_")
+    else:
+        digest = _content_digest(graph)
+        analysis_sr = graph.params["analysis_sr"] or "native"
+        out_dir = os.path.join(pyramid_dir, f"{digest[:16]}_sr_{analysis_sr}_cutoff_{graph.params['cutoff']}")
+        if filtered.y is not None:
+            n_samples = len(filtered.y)
+        else:
+            n_samples = _stage_pipeline(graph).signal_length(graph.params["path"])
+        pyramid = open_pyramid(out_dir)
+        if pyramid is not None and (pyramid.digest, pyramid.sr, pyramid.n_samples) == (
+            digest,
+            filtered.sr,
+            n_samples,
+        ):
+            return pyramid
+    on_progress = _stage_progress(graph, "スペクトログラム")
+    return _stage_pipeline(graph).spectrogram(
+        graph.params["path"], filtered.y, filtered.sr, out_dir, on_progress=on_progress, digest=digest
+    )
+
+
+def _stage_segments(graph):
+    """鳴き声区間"""
+    pipeline = _stage_pipeline(graph)
+    entry = _cached_entry(graph, pipeline)
+    if entry is not None:
+        graph.context["cache_hits"].add("segments")
+        return entry.segments
+
+    filtered = graph.get("filtered")
+    memo = graph.context.get("scan_segments")
+    if memo is not None and memo[0] == pipeline.scan_params():
+        return memo[1]
+    on_progress = _stage_progress(graph, "区間抽出")
+    if filtered.y is None:
+        # 信号を保存していないストリーミング処理: ブロック単位で読み直す
+        return pipeline.frontend().scan(graph.params["path"], on_progress=on_progress).segments
+    if graph.params["streaming"]:
+        split = split_activity if pipeline.activity == "adaptive" else split_signal
+        return split(filtered.y, filtered.sr, pipeline.top_db, pipeline.min_duration, on_progress=on_progress)
+    return pipeline.split(filtered.y, filtered.sr)
+
+
+def _stage_frames(graph):
+    """フレームの MFCC 特徴量"""
+    pipeline = _stage_pipeline(graph)
+    entry = _cached_entry(graph, pipeline)
+    if entry is not None:
+        graph.context["cache_hits"].add("frames")
+        return entry.frames
+
+    filtered = graph.get("filtered")
+    segments = graph.get("segments")
+    memo = graph.context.get("scan_frames")
+    on_progress = _stage_progress(graph, "特徴量")
+    if memo is not None and memo[0] == pipeline.frame_params():
+        # ストリーミング走査と同じパスで計算済み
+        frames = memo[1]
+    elif filtered.y is None:
+        scan = ScanResult(filtered.sr, None, segments, None)
+        frames = pipeline.frontend().features(graph.params["path"], scan, on_progress=on_progress)
+    else:
+        frames = pipeline.extract(filtered.y, filtered.sr, segments, on_progress=on_progress)
+
+    feature_key, _ = _cache_keys(graph, pipeline)
+    if feature_key is not None:
+        n_samples = len(filtered.y) if filtered.y is not None else pipeline.signal_length(graph.params["path"])
+        graph.context["cache"].save_features(feature_key, filtered.sr, n_samples, segments, frames)
+    return frames
+
+
+def _stage_labels(graph):
+    """KMeans のクラスタ番号"""
+    features = graph.get("frames").features
+    _stage_progress(graph, "クラスタリング")
+    return _stage_pipeline(graph).cluster(features)
+
+
+def _stage_embedding(graph):
+    """UMAP 埋め込み（params["keep"] は残すフレームのマスクを np.packbits したもの）"""
+    features = graph.get("frames").features
+    keep = graph.params.get("keep")
+    if keep is not None:
+        mask = np.unpackbits(np.frombuffer(keep, dtype=np.uint8), count=len(features)).astype(bool)
+        features = features[mask]
+    _stage_progress(graph, "UMAP")
+    return _stage_pipeline(graph).embed(features)
@@ -0,0 +1,216 @@
+"""
+途切れない連続再生。
+
+sd.play / sd.wait をフレームごとに呼ぶと、そのたびに出力デバイスを開き直すので
+フレームの間に無音が入り、全再生も実時間よりあまり速くならない。ここでは
+開いたままの OutputStream のコールバックにリングバッファから音を渡し、
+別スレッドが次のフレームを先読みしてリングバッファに書き足す。
+再生中のフレームが変わると on_frame(番号) で通知する（ストリームは止めない）。
+"""
+
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+
+
+# フレームのつなぎ目のクリック音を防ぐフェード（秒）
+FADE_SECONDS = 0.003
+
+
+class RingBuffer:
+    """1 チャンネルのリングバッファ（書き込みは満杯なら待ち、読み出しは待たない）"""
+
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        # 書いた・読んだサンプル数の累計（位置は % capacity）
+        self.written = 0
+        self.read_count = 0
+        self._cond = threading.Condition()
+
+    def write(self, samples, is_cancelled):
+        """samples を書き終えるまで待つ（is_cancelled() が真になったら False を返す）"""
+        samples = np.asarray(samples, dtype=np.float32)
+        pos = 0
+        while pos < len(samples):
+            with self._cond:
+                while self.written - self.read_count >= self.capacity:
+                    if is_cancelled():
+                        return False
+                    self._cond.wait(0.05)
+                if is_cancelled():
+                    return False
+                free = self.capacity - (self.written - self.read_count)
+                n = min(free, len(samples) - pos)
+                self._copy_in(samples[pos : pos + n])
+                self.written += n
+            pos += n
+        return True
+
+    def _copy_in(self, samples):
+        start = self.written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._data[start : start + first] = samples[:first]
+        self._data[: len(samples) - first] = samples[first:]
+
+    def read(self, out):
+        """out を埋める（足りない分は 0）。読めたサンプル数を返す"""
+        with self._cond:
+            n = min(len(out), self.written - self.read_count)
+            start = self.read_count % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self._data[start : start + first]
+            out[first:n] = self._data[: n - first]
+            out[n:] = 0
+            self.read_count += n
+            self._cond.notify_all()
+        return n
+
+    def clear(self):
+        """未再生の内容を捨てる"""
+        with self._cond:
+            self.read_count = self.written
+            self._cond.notify_all()
+
+
+def change_speed(audio, speed):
+    """speed 倍速にする（線形補間で間引くので音程も上がる）"""
+    if speed == 1.0 or len(audio) < 2:
+        return audio
+    n = max(1, int(round(len(audio) / speed)))
+    return np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio).astype(np.float32)
+
+
+def apply_fade(audio, sr):
+    """両端に短いフェードをかける"""
+    n = min(int(sr * FADE_SECONDS), len(audio) // 2)
+    if n == 0:
+        return audio
+    audio = np.array(audio, dtype=np.float32)
+    ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+    audio[:n] *= ramp
+    audio[-n:] *= ramp[::-1]
+    return audio
+
+
+class PlaybackEngine:
+    """開いたままの出力ストリームでフレームの並びを連続再生する"""
+
+    def __init__(self, buffer_seconds=2.0, blocksize=1024, stream_factory=None):
+        self.buffer_seconds = buffer_seconds
+        self.blocksize = blocksize
+        # stream_factory(sr, callback, blocksize) が OutputStream を返す（省略時は sounddevice）
+        self.stream_factory = stream_factory or _sounddevice_stream
+        self.sr = None
+        self._stream = None
+        self._ring = None
+        # (リングバッファ上の開始位置, セッション, フレーム番号) の並び。番号 None は終わりの印
+        self._markers = deque()
+        self._markers_lock = threading.Lock()
+        self._session = 0
+        self._active = False
+        self._events = queue.Queue()
+        self._dispatcher = None
+        self._callbacks = {}
+
+    @property
+    def active(self):
+        """再生中（先読みを含めて未再生のフレームがある）か"""
+        return self._active
+
+    def _ensure_stream(self, sr):
+        """サンプリング周波数が変わったときだけストリームを開き直す"""
+        if self._stream is not None and self.sr == sr:
+            return
+        self.close()
+        self.sr = sr
+        self._ring = RingBuffer(int(sr * self.buffer_seconds))
+        self._stream = self.stream_factory(sr, self._callback, self.blocksize)
+        self._stream.start()
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def play(self, y, sr, frames, speed=1.0, on_frame=None, on_end=None):
+        """
+        frames（(番号, 開始サンプル, 終了サンプル) の並び）をつなげて再生する。
+        再生中のものは止めて差し替える。フレームが鳴り始めると on_frame(番号)、
+        最後まで鳴り終えると on_end() が別スレッドから呼ばれる。
+        """
+        self.stop()
+        self._ensure_stream(sr)
+
+        self._session += 1
+        session = self._session
+        self._callbacks = {"on_frame": on_frame, "on_end": on_end, "session": session}
+        self._active = True
+
+        def is_cancelled():
+            return session != self._session
+
+        def feed():
+            for index, start, end in frames:
+                if is_cancelled():
+                    return
+                audio = apply_fade(change_speed(np.asarray(y[start:end], dtype=np.float32), speed), sr)
+                with self._markers_lock:
+                    self._markers.append((self._ring.written, session, index))
+                if not self._ring.write(audio, is_cancelled):
+                    return
+            with self._markers_lock:
+                self._markers.append((self._ring.written, session, None))
+
+        threading.Thread(target=feed, daemon=True).start()
+
+    def stop(self):
+        """再生を止める（ストリームは開いたまま）"""
+        self._session += 1
+        self._active = False
+        with self._markers_lock:
+            self._markers.clear()
+        if self._ring is not None:
+            self._ring.clear()
+
+    def close(self):
+        """ストリームを閉じる"""
+        self.stop()
+        if self._stream is not None:
+            try:
+                self._stream.stop()
+                self._stream.close()
+            finally:
+                self._stream = None
+
+    def _callback(self, outdata, frames, time, status):
+        """オーディオスレッド: リングバッファから読み、鳴り始めたフレームを通知に回す"""
+        self._ring.read(outdata[:, 0])
+        if outdata.shape[1] > 1:
+            outdata[:, 1:] = outdata[:, :1]
+        position = self._ring.read_count
+        with self._markers_lock:
+            while self._markers and self._markers[0][0] <= position:
+                _, session, index = self._markers.popleft()
+                self._events.put((session, index))
+
+    def _dispatch(self):
+        """通知用スレッド: オーディオスレッドの外でコールバックを呼ぶ"""
+        while True:
+            session, index = self._events.get()
+            callbacks = self._callbacks
+            if session != callbacks.get("session"):
+                continue
+            if index is None:
+                self._active = False
+                if callbacks["on_end"] is not None:
+                    callbacks["on_end"]()
+            elif callbacks["on_frame"] is not None:
+                callbacks["on_frame"](index)
+
+
+def _sounddevice_stream(sr, callback, blocksize):
+    # PortAudio のない環境（コマンドライン処理など）でも birdcall を読み込めるようにここで import する
+    import sounddevice as sd
+
+    return sd.OutputStream(samplerate=sr, channels=1, dtype="float32", blocksize=blocksize, callback=callback)
@@ -0,0 +1,161 @@
+"""
+図の描画。
+
+どの関数も matplotlib の Axes に描くだけなので、GUI では pyplot の図に、
+ヘッドレス実行ではウィンドウを開かない Figure に同じ内容を描ける。
+UMAP 埋め込みは、点が多いときは散布図ではなくマス目に数えた密度の画像で描く
+（描く量が点の数によらず一定）。
+"""
+
+import librosa
+import librosa.display
+import matplotlib
+import numpy as np
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from scipy.spatial import cKDTree
+
+# これより点が多い埋め込みは密度の画像で描く
+SCATTER_MAX_POINTS = 20000
+
+# 密度の画像の 1 辺のマスの数
+DENSITY_BINS = 512
+
+
+def new_figure(figsize):
+    """画面を使わない Figure を作る（pyplot の状態に触れない）"""
+    return Figure(figsize=figsize)
+
+
+def draw_spectrogram(ax, y, sr, n_fft=2048, hop_length=512, title=None):
+    """y のスペクトログラム（dB）を描き、カラーバー用の画像を返す"""
+    D = librosa.amplitude_to_db(
+        np.abs(librosa.stft(np.asarray(y), n_fft=n_fft, hop_length=hop_length)), ref=np.max
+    )
+    img = librosa.display.specshow(D, sr=sr, x_axis="time", y_axis="hz", ax=ax)
+    if title:
+        ax.set_title(title)
+    return img
+
+
+def draw_pyramid_spectrogram(fig, pyramid, t0=0.0, t1=None, max_columns=2000, stat="max"):
+    """
+    スペクトログラムピラミッドから全体（または t0〜t1 秒）を描き (Axes, 画像) を返す。
+    録音の長さによらず、描く列数は max_columns 程度に収まる。
+    """
+    ax = fig.add_subplot(1, 1, 1)
+    data, extent = pyramid.window(t0, t1, max_columns=max_columns, stat=stat)
+    img = ax.imshow(data, origin="lower", aspect="auto", extent=extent, cmap="magma", interpolation="nearest")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Hz")
+    ax.set_title("Spectrogram (Full Audio)")
+    fig.colorbar(img, ax=ax, format="%+2.0f dB")
+    fig.tight_layout()
+    return ax, img
+
+
+def follow_zoom(ax, img, pyramid, max_columns=2000, stat="max"):
+    """拡大・移動のたびに、表示範囲に合ったレベルの列だけを読み直して描き替える"""
+    busy = [False]
+
+    def on_xlim(ax):
+        if busy[0]:
+            return
+        busy[0] = True
+        try:
+            t0, t1 = ax.get_xlim()
+            data, extent = pyramid.window(max(t0, 0.0), min(t1, pyramid.duration), max_columns=max_columns, stat=stat)
+            img.set_data(data)
+            img.set_extent(extent)
+            ax.set_xlim(t0, t1)
+        finally:
+            busy[0] = False
+
+    ax.callbacks.connect("xlim_changed", on_xlim)
+
+
+def density_raster(points, labels, bins=DENSITY_BINS, cmap="tab10"):
+    """
+    埋め込みを bins × bins のマスに数え、RGBA 画像（行が y）と extent を返す。
+    マスの色はそこにある点のクラスタ色を点数で重み付けして混ぜたもの、濃さは点数の対数。
+    クラスタ色は散布図（c=labels, cmap）と同じ対応にする。
+    """
+    points = np.asarray(points, dtype=np.float64)
+    labels = np.asarray(labels)
+    lo = points.min(axis=0)
+    span = points.max(axis=0) - lo
+    span[span == 0] = 1.0
+    ix, iy = (np.minimum((points - lo) / span * bins, bins - 1).astype(np.int64)).T
+
+    # クラスタごとのマスの点数 (クラスタ, y, x)
+    values, codes = np.unique(labels, return_inverse=True)
+    counts = np.bincount(
+        (codes.ravel() * bins + iy) * bins + ix, minlength=len(values) * bins * bins
+    ).reshape(len(values), bins, bins)
+
+    colors = matplotlib.colormaps[cmap](Normalize(values.min(), values.max())(values))[:, :3]
+    total = counts.sum(axis=0)
+    image = np.zeros((bins, bins, 4))
+    filled = total > 0
+    image[..., :3] = np.einsum("kyx,kc->yxc", counts, colors) / np.maximum(total, 1)[..., None]
+    image[filled, 3] = 0.25 + 0.75 * np.log1p(total[filled]) / np.log1p(total.max())
+    extent = (lo[0], lo[0] + span[0], lo[1], lo[1] + span[1])
+    return image, extent
+
+
+def draw_umap(fig, points, labels, max_points=SCATTER_MAX_POINTS):
+    """UMAP 埋め込みをクラスタ色で描き Axes を返す（max_points より多ければ密度の画像）"""
+    ax = fig.add_subplot(1, 1, 1)
+    if len(points) > max_points:
+        image, extent = density_raster(points, labels)
+        ax.imshow(image, origin="lower", aspect="auto", extent=extent, interpolation="nearest")
+    else:
+        ax.scatter(points[:, 0], points[:, 1], c=labels, cmap="tab10")
+    ax.set_title("Bird Call Clustering (UMAP)")
+    ax.set_xlabel("UMAP Dimension 1")
+    ax.set_ylabel("UMAP Dimension 2")
+    return ax
+
+
+def pick_nearest(ax, points, on_pick, max_pixels=10):
+    """
+    ax をクリックすると、最も近い点の番号で on_pick(i) を呼ぶ。点は KD 木で探すので、
+    点の数によらず 1 回の検索はすぐ終わる。拡大・移動ツールの使用中のクリックと、
+    どの点からも max_pixels 画素より離れたクリックは無視する。
+    """
+    points = np.asarray(points, dtype=np.float64)
+    # x と y の範囲が大きく違っても画面上の近さで探せるよう、範囲を揃えてから木を作る
+    lo = points.min(axis=0)
+    span = points.max(axis=0) - lo
+    span[span == 0] = 1.0
+    tree = cKDTree((points - lo) / span)
+
+    def on_click(event):
+        if event.inaxes is not ax or event.button != 1 or event.xdata is None:
+            return
+        toolbar = ax.figure.canvas.toolbar
+        if toolbar is not None and toolbar.mode:
+            return
+        # 拡大表示や縦横の縮尺が違う表示では、木の距離と画面上の距離が一致しない。
+        # max_pixels 画素の円を含む球の中の点を候補にして、画面上で最も近い点を選ぶ
+        click = np.array([event.xdata, event.ydata])
+        origin, right, up = ax.transData.transform([click, click + [1.0, 0.0], click + [0.0, 1.0]])
+        pixels_per_unit = np.array([np.hypot(*(right - origin)), np.hypot(*(up - origin))]) * span
+        radius = max_pixels / max(pixels_per_unit.min(), 1e-12)
+        candidates = tree.query_ball_point((click - lo) / span, radius)
+        if not candidates:
+            return
+        candidates = np.asarray(candidates)
+        screen = ax.transData.transform(points[candidates])
+        distance = np.hypot(screen[:, 0] - event.x, screen[:, 1] - event.y)
+        best = int(np.argmin(distance))
+        if distance[best] <= max_pixels:
+            on_pick(int(candidates[best]))
+
+    ax.figure.canvas.mpl_connect("button_press_event", on_click)
+    return tree
+
+
+def save_figure(fig, path):
+    """従来と同じ解像度で保存する"""
+    fig.savefig(path, dpi=150, bbox_inches="tight")
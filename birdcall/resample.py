@@ -0,0 +1,213 @@
+"""
+解析用のサンプリング周波数への間引き。
+
+192 kHz・96 kHz の録音は、鳥の鳴き声に必要な帯域の何倍ものサンプルを持つので、
+フィルタ・区間検出・MFCC・再生の前に解析用の周波数（48 kHz など）へ下げる。
+間引きは scipy.signal.resample_poly と同じポリフェーズ FIR（Kaiser 窓）で行い、
+StreamingResampler はブロックごとに入力しても resample_poly と同じ出力を返す。
+元の周波数より高い解析周波数を指定した場合は、上げずに元のまま扱う。
+
+OriginalRateSignal は、解析周波数の信号の代わりに元の録音を元の周波数で
+（ハイパスをかけて）必要な範囲だけ読むもので、元の周波数での書き出しに使う。
+"""
+
+from math import gcd
+
+import numpy as np
+import scipy.signal as signal
+import soundfile as sf
+
+
+# 解析周波数はハイパスのカットオフの 4 倍以上にする（ナイキスト周波数がカットオフの 2 倍以上）。
+# 間引きのフィルタは新しいナイキスト周波数の手前から減衰するので、残す帯域に余裕を持たせる
+MIN_RATE_PER_CUTOFF = 4
+
+
+def check_analysis_rate(target_sr, cutoff):
+    """解析周波数がカットオフに対して低すぎれば ValueError"""
+    if target_sr is not None and target_sr < MIN_RATE_PER_CUTOFF * cutoff:
+        raise ValueError(
+            f"解析のサンプリング周波数 {target_sr} Hz は、ハイパスフィルタ {cutoff} Hz の "
+            f"{MIN_RATE_PER_CUTOFF} 倍以上にしてください"
+        )
+
+
+def analysis_rate(sr, target_sr=None):
+    """録音の周波数 sr を解析するときの周波数（target_sr が None か sr 以上なら sr のまま）"""
+    if target_sr is None or target_sr >= sr:
+        return sr
+    return int(target_sr)
+
+
+def resample_ratio(sr, target_sr):
+    """(up, down)。sr を up 倍して down で間引くと target_sr になる"""
+    g = gcd(int(sr), int(target_sr))
+    return int(target_sr) // g, int(sr) // g
+
+
+def resampled_length(n_samples, sr, target_sr):
+    """n_samples を target_sr にしたときのサンプル数（resample_poly と同じ）"""
+    if target_sr == sr:
+        return n_samples
+    up, down = resample_ratio(sr, target_sr)
+    return -(-n_samples * up // down)
+
+
+def polyphase_filter(up, down):
+    """resample_poly の既定と同じローパス FIR（カットオフは新旧で低い方のナイキスト周波数）"""
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * up
+
+
+def resample(y, sr, target_sr):
+    """信号全体を target_sr にする（float32）"""
+    if target_sr == sr:
+        return y
+    up, down = resample_ratio(sr, target_sr)
+    return signal.resample_poly(y, up, down).astype(np.float32)
+
+
+class StreamingResampler:
+    """
+    ブロック単位のポリフェーズ間引き。process() に入力ブロックを渡すと、確定した出力を
+    float32 で返す（フィルタの半分の長さぶん遅れる）。最後に flush() を呼ぶ。
+    録音の前後は resample_poly と同じく 0 が続くものとして扱う。
+    """
+
+    def __init__(self, sr, target_sr):
+        self.up, self.down = resample_ratio(sr, target_sr)
+        self.h = polyphase_filter(self.up, self.down)
+        # 出力 n は、0 を挟んで up 倍にした列の n * down + delay 番目（ゼロ位相にするための遅れ）
+        self.delay = (len(self.h) - 1) // 2
+
+        # upfirdn の出力がちょうど出力 n に当たるよう、先頭に 0 を足して位相を合わせる。
+        # 以後はバッファの先頭を down の倍数ずつ捨てるので、位相はずれない
+        pad = next(p for p in range(self.down) if (p * self.up + self.delay) % self.down == 0)
+        self._buffer = np.zeros(pad)
+        # バッファの先頭の入力サンプル位置（先頭の 0 のぶん負になる）
+        self._start = -pad
+        self._n_in = 0
+        self._n_out = 0
+
+    def _emit(self, n_end):
+        """出力 [_n_out, n_end) を計算し、以降の出力に要らない入力を捨てる"""
+        if n_end <= self._n_out:
+            return np.zeros(0, dtype=np.float32)
+        filtered = signal.upfirdn(self.h, self._buffer, self.up, self.down)
+        offset = (self.delay - self._start * self.up) // self.down
+        out = filtered[self._n_out + offset : n_end + offset].astype(np.float32)
+        self._n_out = n_end
+
+        # 次の出力が使う最初の入力より前を、down の倍数単位で捨てる
+        first = (self._n_out * self.down + self.delay - (len(self.h) - 1)) // self.up
+        drop = (first - self._start) // self.down * self.down
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._start += drop
+        return out
+
+    def process(self, block):
+        """入力ブロックを受け取り、確定した出力を返す"""
+        block = np.asarray(block, dtype=np.float64)
+        self._buffer = np.concatenate([self._buffer, block])
+        self._n_in += len(block)
+        # 出力 n は、0 を挟んだ列の n * down + delay 番目までの入力が揃えば確定する
+        ready = -(-(self._n_in * self.up - self.delay) // self.down)
+        return self._emit(max(ready, 0))
+
+    def flush(self):
+        """残りの出力を返す（録音の後ろは 0 が続くものとする）"""
+        self._buffer = np.concatenate([self._buffer, np.zeros(len(self.h) // self.up + 2)])
+        return self._emit(-(-self._n_in * self.up // self.down))
+
+
+def iter_resampled(blocks, sr, target_sr):
+    """ブロックのイテレータを target_sr にしたブロックのイテレータにする"""
+    if target_sr == sr:
+        yield from blocks
+        return
+    resampler = StreamingResampler(sr, target_sr)
+    for block in blocks:
+        out = resampler.process(block)
+        if len(out):
+            yield out
+    out = resampler.flush()
+    if len(out):
+        yield out
+
+
+def read_clip(path, start, frames, sr, cutoff=None):
+    """
+    sr（解析周波数）での開始位置 start から frames サンプルを、元の録音から読んで sr にして返す。
+    特徴量ストアのほかの録音のフレームを再生するときに使う（モノラル・float32）。
+    cutoff を指定すると、解析と同じく sr にしてからハイパスをかける（前後を余分に読んで端の影響を除く）
+    """
+    if cutoff is None:
+        return _read_clip(path, start, frames, sr)
+
+    sos = signal.butter(4, cutoff / (sr / 2), btype="high", output="sos")
+    lo = max(start - _filter_margin(sos, sr), 0)
+    clip = _read_clip(path, lo, start - lo + frames + _filter_margin(sos, sr), sr)
+    if len(clip) > 3 * (2 * len(sos) + 1):
+        clip = signal.sosfiltfilt(sos, clip)
+    return clip[start - lo : start - lo + frames].astype(np.float32)
+
+
+def _filter_margin(sos, sr):
+    """ゼロ位相のフィルタが範囲の端でも全体にかけたときと同じになる長さ"""
+    # stream はこのモジュールを読み込むので、ここで読み込む
+    from .stream import settle_length
+
+    return max(1024, 2 * settle_length(sos, sr))
+
+
+def _read_clip(path, start, frames, sr):
+    native_sr = sf.info(path).samplerate
+    if native_sr == sr:
+        clip, _ = sf.read(path, start=start, frames=frames, dtype="float32", always_2d=True)
+        return clip.mean(axis=1)
+
+    # フィルタの長さぶん前後を余分に読んでから間引き、端の影響を除く。
+    # 読み始めを down の倍数にすると、間引いた出力が録音全体を間引いたときと同じ位置に並ぶ
+    up, down = resample_ratio(native_sr, sr)
+    margin = len(polyphase_filter(up, down)) // up + down
+    lo = max(start * down // up - margin, 0) // down * down
+    clip, _ = sf.read(
+        path, start=lo, frames=frames * down // up + 2 * margin + down, dtype="float32", always_2d=True
+    )
+    resampled = resample(clip.mean(axis=1), native_sr, sr)
+    skip = start - lo * up // down
+    return resampled[skip : skip + frames]
+
+
+class OriginalRateSignal:
+    """
+    元の録音を元のサンプリング周波数で、ハイパスをかけて読む（cutoff が None ならそのまま）。
+    FrameExporter に信号の代わりに渡すと、スライスした範囲だけをファイルから読む。
+    """
+
+    def __init__(self, path, cutoff=None, margin=None):
+        info = sf.info(path)
+        self.path = path
+        self.sr = info.samplerate
+        self.n_samples = info.frames
+        self.sos = None
+        if cutoff is not None:
+            self.sos = signal.butter(4, cutoff / (self.sr / 2), btype="high", output="sos")
+        if margin is None:
+            margin = _filter_margin(self.sos, self.sr) if self.sos is not None else 0
+        self.margin = margin
+
+    def __len__(self):
+        return self.n_samples
+
+    def __getitem__(self, index):
+        start, stop, _ = index.indices(self.n_samples)
+        lo = max(start - self.margin, 0)
+        hi = min(stop + self.margin, self.n_samples)
+        block, _ = sf.read(self.path, start=lo, stop=hi, dtype="float32", always_2d=True)
+        y = block.mean(axis=1)
+        if self.sos is not None and len(y) > 3 * (2 * len(self.sos) + 1):
+            y = signal.sosfiltfilt(self.sos, y)
+        return y[start - lo : stop - lo].astype(np.float32)
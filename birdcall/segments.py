@@ -0,0 +1,337 @@
+"""
+鳴き声区間（非無音区間）の検出。
+
+librosa.effects.split と同じ判定（フレーム RMS の dB が最大値から top_db 以内）を、
+ホップごとの二乗和から計算する。ホップ単位の二乗和はブロックごとに積み上げられるので、
+信号全体をメモリに載せなくても区間を求められる。
+
+ただし全体の最大値を基準にすると、ファイルのどこかに 1 回大きな音（ノイズ）があるだけで
+全体の区間が変わり、最大値がわかるまで区間が決まらない。ActivityDetector は基準を
+近くの大きな音に追従させ（参照レベル）、ブロックを受け取るたびに確定した区間を返す。
+"""
+
+import numpy as np
+
+
+# librosa.effects.split の既定値
+SPLIT_FRAME_LENGTH = 2048
+SPLIT_HOP_LENGTH = 512
+
+
+class HopEnergy:
+    """ブロックを順に受け取り、ホップごとの二乗和を積み上げる"""
+
+    def __init__(self, hop_length=SPLIT_HOP_LENGTH):
+        self.hop_length = hop_length
+        self.n_samples = 0
+        self._sums = []
+        self._tail = np.zeros(0)
+
+    def update(self, block):
+        """フィルタ済みブロックを追加する"""
+        block = np.asarray(block, dtype=np.float64)
+        self.n_samples += len(block)
+
+        data = np.concatenate([self._tail, block]) if len(self._tail) else block
+        n_full = len(data) // self.hop_length * self.hop_length
+        if n_full:
+            squares = data[:n_full].reshape(-1, self.hop_length) ** 2
+            self._sums.append(squares.sum(axis=1))
+        self._tail = data[n_full:]
+
+    def finish(self):
+        """ホップごとの二乗和 (ceil(n_samples / hop),) を返す"""
+        sums = list(self._sums)
+        if len(self._tail):
+            sums.append(np.array([np.sum(self._tail ** 2)]))
+        if not sums:
+            return np.zeros(0)
+        return np.concatenate(sums)
+
+
+def frame_power(hop_sums, n_samples, frame_length=SPLIT_FRAME_LENGTH, hop_length=SPLIT_HOP_LENGTH):
+    """
+    ホップ二乗和から librosa.feature.rms(center=True) の二乗（平均パワー）を作る。
+    フレーム t は元信号の [t*hop - frame_length/2, t*hop + frame_length/2) に相当する。
+    """
+    if frame_length % hop_length or (frame_length // 2) % hop_length:
+        raise ValueError("frame_length と frame_length/2 は hop_length の倍数である必要があります")
+
+    n_frames = 1 + n_samples // hop_length
+    width = frame_length // hop_length
+    lead = (frame_length // 2) // hop_length
+
+    # 両端をゼロ詰めしてから width 個ずつの移動和をとる
+    padded = np.zeros(n_frames + width - 1)
+    n = min(len(hop_sums), n_frames + width - 1 - lead)
+    padded[lead : lead + n] = hop_sums[:n]
+    cumsum = np.concatenate([[0.0], np.cumsum(padded)])
+    sums = cumsum[width:] - cumsum[:-width]
+    return sums[:n_frames] / frame_length
+
+
+def nonsilent_intervals(power, n_samples, top_db, hop_length=SPLIT_HOP_LENGTH, ref_power=None):
+    """
+    フレームパワーから非無音区間 (m, 2) を返す（librosa.effects.split と同じ形式）。
+    ref_power を省略すると全体の最大値を基準にする。
+    """
+    if len(power) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    if ref_power is None:
+        ref_power = np.max(power)
+    db = 10.0 * np.log10(np.maximum(1e-10, power)) - 10.0 * np.log10(max(1e-10, ref_power))
+    non_silent = db > -top_db
+
+    edges = [np.flatnonzero(np.diff(non_silent.astype(int))) + 1]
+    if non_silent[0]:
+        edges.insert(0, np.array([0]))
+    if non_silent[-1]:
+        edges.append(np.array([len(non_silent)]))
+
+    edges = np.minimum(np.concatenate(edges).astype(np.int64) * hop_length, n_samples)
+    return edges.reshape(-1, 2)
+
+
+def filter_short(intervals, sr, min_duration=0.1):
+    """min_duration 秒未満の区間を除いた (start, end) のリストを返す"""
+    return [
+        (int(start), int(end))
+        for start, end in intervals
+        if (end - start) / sr >= min_duration
+    ]
+
+
+class ActivityDetector:
+    """
+    ブロックを順に受け取り、鳴き声区間を確定したものから返すストリーミングの区間検出。
+
+    フレーム RMS（librosa.effects.split と同じ 2048 / 512）の dB を、次の 2 つから決める
+    しきい値と比べる。
+    - 参照レベル: 大きな音で即座に上がり、release_db（dB/秒）ずつ下がる。
+      参照から top_db 以内を鳴き声とみなすので、大きな音の影響はその前後だけに限られる
+    - 雑音レベル: noise_window 秒ごとのフレームの下位 noise_percentile % の値。
+      これより下がれば即座に下がり、上がるのは noise_rise_db（dB/秒）ずつ。
+      鳴き声のない時間が続いて参照が下がっても、雑音より min_snr_db 以上大きい音だけを拾う
+    しきい値より hysteresis_db / 2 上を超えたら区間を始め、hysteresis_db / 2 下を下回るまで続ける。
+    min_duration 秒未満の区間は捨てる。判定は noise_window 秒ぶんのフレームがそろうごとに行う。
+    """
+
+    def __init__(
+        self,
+        sr,
+        top_db=45,
+        min_duration=0.1,
+        hysteresis_db=6.0,
+        release_db=2.0,
+        noise_window=1.0,
+        noise_percentile=20,
+        noise_rise_db=1.0,
+        min_snr_db=10.0,
+        frame_length=SPLIT_FRAME_LENGTH,
+        hop_length=SPLIT_HOP_LENGTH,
+    ):
+        if frame_length % hop_length or (frame_length // 2) % hop_length:
+            raise ValueError("frame_length と frame_length/2 は hop_length の倍数である必要があります")
+        self.sr = sr
+        self.top_db = top_db
+        self.min_duration = min_duration
+        self.hysteresis_db = hysteresis_db
+        self.noise_percentile = noise_percentile
+        self.min_snr_db = min_snr_db
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        # フレームあたりの参照レベルの下がり幅、雑音レベルを求めるフレーム数とその間の上がり幅
+        self._release = release_db * hop_length / sr
+        self._group = max(1, int(round(noise_window * sr / hop_length)))
+        self._rise = noise_rise_db * self._group * hop_length / sr
+
+        self.n_samples = 0
+        self._width = frame_length // hop_length
+        self._tail = np.zeros(0)
+        # フレームパワーの計算を待っているホップ二乗和（先頭は center=True のゼロ詰め）
+        self._sums = np.zeros((frame_length // 2) // hop_length)
+        # 雑音レベルの区切りがそろうのを待っているフレームの dB
+        self._levels = np.zeros(0)
+        # 判定済みのフレーム数
+        self._n_frames = 0
+        self._ref = -np.inf
+        self._noise = np.inf
+        # 続いている区間の開始フレーム（なければ None）と、しきい値を超えたか
+        self._run_start = None
+        self._run_on = False
+
+    @property
+    def open_run(self):
+        """続いている区間の (開始サンプル, 判定済みの終わりのサンプル)。なければ None"""
+        if self._run_start is None:
+            return None
+        return self._run_start * self.hop_length, self.decided
+
+    @property
+    def decided(self):
+        """判定済みのサンプル数（これより前から新しい区間が始まることはない）"""
+        return min(self._n_frames * self.hop_length, self.n_samples)
+
+    def update(self, block):
+        """フィルタ済みブロックを追加し、確定した区間 (start, end) のリストを返す"""
+        block = np.asarray(block, dtype=np.float64)
+        self.n_samples += len(block)
+        data = np.concatenate([self._tail, block]) if len(self._tail) else block
+        n_full = len(data) // self.hop_length * self.hop_length
+        if n_full:
+            squares = data[:n_full].reshape(-1, self.hop_length) ** 2
+            self._sums = np.concatenate([self._sums, squares.sum(axis=1)])
+        self._tail = data[n_full:]
+
+        n_ready = len(self._sums) - self._width + 1
+        if n_ready <= 0:
+            return []
+        power = self._moving_power(self._sums, n_ready)
+        self._sums = self._sums[n_ready:]
+        return self._push(power)
+
+    def finish(self):
+        """残りのフレーム（末尾のゼロ詰めを含む）を判定し、最後の区間を返す"""
+        sums = self._sums
+        if len(self._tail):
+            sums = np.concatenate([sums, [np.sum(self._tail ** 2)]])
+            self._tail = np.zeros(0)
+        n_left = 1 + self.n_samples // self.hop_length - self._n_frames - len(self._levels)
+        power = np.zeros(0)
+        if n_left > 0:
+            padded = np.zeros(max(len(sums), n_left + self._width - 1))
+            padded[: len(sums)] = sums
+            power = self._moving_power(padded, n_left)
+        self._sums = np.zeros(0)
+        intervals = self._push(power, final=True)
+
+        if self._run_start is not None:
+            if self._run_on:
+                intervals.extend(self._accept(self._run_start, self._n_frames))
+            self._run_start = None
+            self._run_on = False
+        return intervals
+
+    def _moving_power(self, sums, n):
+        cumsum = np.concatenate([[0.0], np.cumsum(sums[: n + self._width - 1])])
+        return (cumsum[self._width :] - cumsum[: -self._width])[:n] / self.frame_length
+
+    def _push(self, power, final=False):
+        """フレームパワーを追加し、雑音レベルの区切りがそろったフレームを判定する"""
+        levels = np.concatenate([self._levels, 10.0 * np.log10(np.maximum(1e-10, power))])
+        n = len(levels) if final else len(levels) // self._group * self._group
+        self._levels = levels[n:]
+        if n == 0:
+            return []
+        return self._detect(levels[:n])
+
+    def _detect(self, level):
+        """フレームの dB の続きを判定し、閉じた区間を返す"""
+        k = np.arange(len(level))
+
+        # ref[t] = max(level[t], ref[t-1] - release) を累積最大でまとめて計算する
+        ref = np.maximum(np.maximum.accumulate(level + self._release * k), self._ref - self._release)
+        ref -= self._release * k
+
+        # 区切りごとの下位パーセンタイル（無音=デジタルのゼロは除く）に、同じく累積最小で追従する
+        n_groups = -(-len(level) // self._group)
+        groups = np.full(n_groups * self._group, np.nan)
+        groups[: len(level)] = np.where(level > -99.0, level, np.nan)
+        groups = groups.reshape(n_groups, self._group)
+        quiet = np.full(n_groups, np.inf)
+        has_sound = ~np.all(np.isnan(groups), axis=1)
+        if has_sound.any():
+            quiet[has_sound] = np.nanpercentile(groups[has_sound], self.noise_percentile, axis=1)
+        g = np.arange(n_groups)
+        noise = np.minimum(np.minimum.accumulate(quiet - self._rise * g), self._noise + self._rise)
+        noise += self._rise * g
+        self._ref, self._noise = ref[-1], noise[-1]
+        noise = np.repeat(noise, self._group)[: len(level)]
+
+        # しきい値の上下に hysteresis_db の半分ずつ（超えたら開始、下回ったら終了）
+        threshold = np.maximum(ref - self.top_db, noise + self.min_snr_db)
+        above = level > threshold - self.hysteresis_db / 2
+        on_count = np.concatenate([[0], np.cumsum(level > threshold + self.hysteresis_db / 2)])
+
+        # しきい値（低い方）を超えている連続フレームの区切り
+        carried = self._run_start is not None
+        edges = np.diff(np.concatenate([[int(carried)], above.astype(np.int8), [0]]))
+        starts = list(np.flatnonzero(edges == 1))
+        ends = list(np.flatnonzero(edges == -1))
+        if carried:
+            starts.insert(0, None)
+
+        base = self._n_frames
+        self._n_frames += len(level)
+        intervals = []
+        for start, end in zip(starts, ends):
+            first = 0 if start is None else start
+            run_on = on_count[end] - on_count[first] > 0
+            run_start = base + first
+            if start is None:
+                run_on = run_on or self._run_on
+                run_start = self._run_start
+            if end == len(level):
+                # 判定したフレームの終わりまで続いている区間は次に持ち越す
+                self._run_start, self._run_on = run_start, run_on
+                return intervals
+            if run_on:
+                intervals.extend(self._accept(run_start, base + end))
+        self._run_start = None
+        self._run_on = False
+        return intervals
+
+    def _accept(self, start_frame, end_frame):
+        start = min(start_frame * self.hop_length, self.n_samples)
+        end = min(end_frame * self.hop_length, self.n_samples)
+        if (end - start) / self.sr < self.min_duration:
+            return []
+        return [(int(start), int(end))]
+
+
+def detect_activity(blocks, sr, top_db, min_duration=0.1, on_interval=None, **kwargs):
+    """
+    ブロックのイテレータから ActivityDetector で区間 (start, end) のリストを求める。
+    on_interval(start, end) は区間が確定するたびに呼ばれる。kwargs は ActivityDetector へ
+    """
+    detector = ActivityDetector(sr, top_db=top_db, min_duration=min_duration, **kwargs)
+    intervals = []
+
+    def emit(found):
+        for interval in found:
+            intervals.append(interval)
+            if on_interval is not None:
+                on_interval(*interval)
+
+    for block in blocks:
+        emit(detector.update(block))
+    emit(detector.finish())
+    return intervals
+
+
+def split_activity(y, sr, top_db, min_duration=0.1, block_size=1 << 20, on_progress=None):
+    """フィルタ済み信号（memmap でもよい）をブロックごとに ActivityDetector にかけて区間を求める"""
+
+    def blocks():
+        for i in range(0, len(y), block_size):
+            yield y[i : i + block_size]
+            if on_progress is not None:
+                on_progress(min(i + block_size, len(y)), len(y))
+
+    return detect_activity(blocks(), sr, top_db, min_duration)
+
+
+def split_signal(y, sr, top_db, min_duration=0.1, block_size=1 << 20, on_progress=None):
+    """
+    フィルタ済み信号（memmap でもよい）をブロックごとに読んで区間を求める。
+    librosa.effects.split と同じ区間になり、信号全体を一度にメモリへ載せない。
+    """
+    energy = HopEnergy()
+    for i in range(0, len(y), block_size):
+        energy.update(y[i : i + block_size])
+        if on_progress is not None:
+            on_progress(min(i + block_size, len(y)), len(y))
+    power = frame_power(energy.finish(), energy.n_samples)
+    intervals = nonsilent_intervals(power, energy.n_samples, top_db)
+    return filter_short(intervals, sr, min_duration)
@@ -0,0 +1,194 @@
+"""
+確認作業のセッションの保存と復元。
+
+フィルタ済み信号・区間・フレームの列（開始サンプル・区間番号・クラスタ番号・残すフラグ・
+UMAP の座標）・特徴量を、それぞれ生のバイナリファイルとして 1 つのフォルダに書き、
+パラメーターと確認位置を小さなマニフェストに書く。開くときは np.memmap で開くだけなので、
+録音のデコード・フィルタ・特徴量の計算をやり直さず、長い録音でもすぐに続きから確認できる
+（中身は使うときにページ単位で読まれる）。
+
+    xxx.session/
+      session.json      マニフェスト（版・録音のパス・パラメーター・確認位置・配列のフォルダと型と形）
+      data_<保存時刻>/
+        signal.f4       フィルタ済み信号
+        segments.i8     (区間数, 2)
+        starts.i8       フレームの列（segment_ids.i4, labels.i4, keep.b1, points.f4, features.f4 も同様）
+        playback.f4     別の WAV を再生ソースにしていた場合だけ
+
+保存は配列を新しい data_ フォルダに書いてから session.json を置き換えるので、途中で止まっても
+前のセッションはそのまま残る。開いているセッション（memmap）に保存し直しても、開いている
+ファイルは動かさない（Windows では memmap で開いているファイルやそのフォルダは移動・削除できない）。
+古い data_ フォルダは消せるときに消す。
+"""
+
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from .frametable import FrameTable
+
+SESSION_VERSION = 1
+
+MANIFEST_NAME = "session.json"
+
+# セッションに書く配列の名前
+ARRAY_NAMES = ("signal", "segments", "starts", "segment_ids", "labels", "keep", "points", "features", "playback")
+
+# 1 回に書く要素数の目安（大きな配列もこの単位で書き、進捗を知らせる）
+WRITE_CHUNK = 1 << 22
+
+# load_session() の結果。info は保存時に渡した辞書、playback は (信号, サンプリング周波数) か None
+Session = namedtuple("Session", ["info", "signal", "sr", "segments", "frames", "features", "playback"])
+
+
+def _file_name(name, dtype):
+    return f"{name}.{np.dtype(dtype).str[1:]}"
+
+
+def _write_array(path, values, dtype, on_chunk):
+    """配列を行の並びのまま生のバイナリで書く（memmap の信号も少しずつ読んで書く）"""
+    row_size = int(np.prod(values.shape[1:], dtype=np.int64)) if values.ndim > 1 else 1
+    rows = max(1, WRITE_CHUNK // max(row_size, 1))
+    with open(path, "wb") as f:
+        for start in range(0, len(values), rows):
+            chunk = np.ascontiguousarray(values[start:start + rows], dtype=dtype)
+            chunk.tofile(f)
+            on_chunk(chunk.size)
+
+
+def save_session(directory, signal, sr, segments, frames, features, info, playback=None, on_progress=None):
+    """
+    セッションを directory に保存する。frames は FrameTable、features は (フレーム数, 次元) の特徴量、
+    info は JSON にできる辞書（録音のパス・パラメーター・確認位置など）。
+    playback=(信号, サンプリング周波数) は、フィルタ済み信号とは別の WAV を再生ソースにしている場合に渡す。
+    on_progress(書いた要素数, 全要素数) は書き込みの区切りごとに呼ばれる。
+    """
+    arrays = {
+        "signal": (signal, np.float32),
+        "segments": (np.asarray(segments, dtype=np.int64).reshape(-1, 2), np.int64),
+        "starts": (frames.starts, np.int64),
+        "segment_ids": (frames.segment_ids, np.int32),
+        "labels": (frames.labels, np.int32),
+        "keep": (frames.keep, bool),
+        "points": (frames.points, np.float32),
+        "features": (features, np.float32),
+    }
+    if playback is not None:
+        arrays["playback"] = (playback[0], np.float32)
+    total = sum(int(np.prod(values.shape, dtype=np.int64)) for values, _ in arrays.values())
+    done = [0]
+
+    def on_chunk(n):
+        done[0] += n
+        if on_progress is not None:
+            on_progress(done[0], total)
+
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, exist_ok=True)
+    saved_at = datetime.now()
+    data_name = f"data_{saved_at:%Y%m%d%H%M%S%f}"
+    tmp_dir = os.path.join(directory, f"{data_name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        manifest = {
+            "version": SESSION_VERSION,
+            "saved_at": saved_at.isoformat(timespec="seconds"),
+            "data": data_name,
+            "sr": int(sr),
+            "playback_sr": None if playback is None else int(playback[1]),
+            "info": info,
+            "arrays": {},
+        }
+        for name, (values, dtype) in arrays.items():
+            file_name = _file_name(name, dtype)
+            _write_array(os.path.join(tmp_dir, file_name), values, dtype, on_chunk)
+            manifest["arrays"][name] = {
+                "file": file_name,
+                "dtype": np.dtype(dtype).str,
+                "shape": [int(n) for n in values.shape],
+            }
+        os.replace(tmp_dir, os.path.join(directory, data_name))
+
+        # マニフェストを置き換えた時点で新しいセッションになる
+        tmp_manifest = os.path.join(directory, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_manifest, os.path.join(directory, MANIFEST_NAME))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _remove_stale(directory, data_name)
+
+
+def _remove_stale(directory, data_name):
+    """
+    今の data_name 以外の配列（前の保存の data_ フォルダ、旧形式のフォルダ直下の配列）を消す。
+    開いたまま（memmap）のものは消せないので残し、次に保存したときに消す
+    """
+    for name in os.listdir(directory):
+        if name in (MANIFEST_NAME, data_name) or name.endswith(".tmp"):
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            if name.startswith("data_"):
+                shutil.rmtree(path, ignore_errors=True)
+        elif name.split(".")[0] in ARRAY_NAMES:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def is_session(directory):
+    """セッションのフォルダか"""
+    return os.path.isfile(os.path.join(directory, MANIFEST_NAME))
+
+
+def load_session(directory):
+    """
+    保存したセッションを開く。配列は memmap で開くだけで、読むのは使ったときになる
+    （残すフラグと UMAP の座標は書き換えるので copy-on-write で開く）
+    """
+    from .features import FrameFeatures
+
+    with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SESSION_VERSION:
+        raise ValueError(f"対応していないセッションの版です: {manifest.get('version')}")
+
+    # 旧形式（data がない）は配列がフォルダ直下にある
+    data_dir = os.path.join(directory, manifest.get("data", ""))
+
+    def open_array(name, mode="r"):
+        spec = manifest["arrays"].get(name)
+        if spec is None:
+            return None
+        shape = tuple(spec["shape"])
+        if int(np.prod(shape, dtype=np.int64)) == 0:
+            return np.zeros(shape, dtype=spec["dtype"])
+        return np.memmap(os.path.join(data_dir, spec["file"]), dtype=spec["dtype"], mode=mode, shape=shape)
+
+    sr = manifest["sr"]
+    frames = FrameTable(
+        open_array("starts"),
+        open_array("segment_ids"),
+        open_array("labels"),
+        sr,
+        keep=open_array("keep", mode="c"),
+        points=open_array("points", mode="c"),
+    )
+    playback = open_array("playback")
+    return Session(
+        manifest["info"],
+        open_array("signal"),
+        sr,
+        [tuple(bounds) for bounds in open_array("segments").tolist()],
+        frames,
+        FrameFeatures(open_array("features"), frames.starts, frames.segment_ids),
+        None if playback is None else (playback, manifest["playback_sr"]),
+    )
@@ -0,0 +1,130 @@
+"""
+似た鳴き声の検索（例示による検索）。
+
+確認中のフレームの特徴量（MFCC の平均・標準偏差）に近いフレームを、
+特徴量ストアや録音のフレームから探す。係数ごとに大きさが違う（0 次が大きい）ので、
+標準化してからユークリッド距離で比べる。フレームが多いときは pynndescent
+（UMAP が使う近似最近傍探索）のインデックスを作り、数十万フレームでも
+1 回の検索を数ミリ秒で返す。インデックスは作るのに時間がかかるので、
+UmapModel と同じようにファイルに保存して読み込める。
+"""
+
+import os
+import pickle
+from collections import namedtuple
+
+import numpy as np
+
+# これ以下のフレーム数なら、インデックスを作らずに全フレームとの距離を計算する（正確で十分速い）
+BRUTE_FORCE_FRAMES = 20000
+
+# query() の結果（rows は作成時のフレームの並びでの番号、近い順）
+Neighbors = namedtuple("Neighbors", ["rows", "distances"])
+
+
+class SimilarityIndex:
+    """
+    フレームの特徴量の近傍探索インデックス。meta には行ごとの情報
+    （ストアのファイル番号・開始サンプルなど）を同じ並びで持たせ、検索結果の
+    行番号から引く。paths はファイル番号 → 録音のパス。
+    """
+
+    def __init__(self, features, params=None, meta=None, paths=None, random_state=0):
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim != 2 or len(features) == 0:
+            raise ValueError("検索するフレームがありません")
+        # 特徴量の設定（ハイパス・フレーム長など）。違う設定の特徴量とは比べられない
+        self.params = dict(params or {})
+        self.meta = {name: np.asarray(values) for name, values in (meta or {}).items()}
+        self.paths = dict(paths or {})
+        self.n_features = features.shape[1]
+
+        self.mean = features.mean(axis=0)
+        self.scale = features.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        data = self._normalize(features)
+
+        self._data = None
+        self._nnd = None
+        if len(data) <= BRUTE_FORCE_FRAMES:
+            self._data = data
+        else:
+            from pynndescent import NNDescent
+
+            self._nnd = NNDescent(data, n_neighbors=30, random_state=random_state, low_memory=True)
+            # 検索用のグラフを先に作っておく（最初の検索が遅くならないように）
+            self._nnd.prepare()
+        self.n_frames = len(data)
+        # ストアから作ったときのストアの行数（ストアがその後に増えたかを調べる）
+        self.store_frames = None
+
+    @classmethod
+    def from_store(cls, store, params, random_state=0, **select):
+        """
+        特徴量ストアのうち、同じ特徴量の設定で追加した録音のフレームで作る。
+        select は FeatureStore.select() の絞り込み（paths・start・end・hours・keep_only）
+        """
+        frames = store.select(params=params, **select)
+        file_ids = np.unique(frames.file_ids)
+        paths = {int(i): store.files[i]["path"] for i in file_ids}
+        meta = {
+            "file_id": frames.file_ids,
+            "start": frames.starts,
+            "segment": frames.segment_ids,
+            "label": frames.labels,
+        }
+        index = cls(frames.features, params=params, meta=meta, paths=paths, random_state=random_state)
+        index.store_frames = store.n_frames
+        return index
+
+    def _normalize(self, features):
+        return ((np.asarray(features, dtype=np.float32) - self.mean) / self.scale).astype(np.float32)
+
+    def compatible(self, params, n_features):
+        """同じ設定・次元の特徴量か"""
+        return self.params == dict(params) and self.n_features == n_features
+
+    def query(self, feature, k=50, exclude=None):
+        """
+        feature（1 フレームの特徴量）に近い k 個のフレームを近い順に返す。
+        exclude に行番号の並びを渡すと、それを除いて k 個にする（検索したフレーム自身など）
+        """
+        exclude = set() if exclude is None else {int(row) for row in exclude}
+        n = min(k + len(exclude), self.n_frames)
+        query = self._normalize(np.reshape(feature, (1, -1)))
+
+        if self._nnd is not None:
+            rows, distances = self._nnd.query(query, k=n)
+            rows, distances = rows[0], distances[0]
+        else:
+            distances = np.sqrt(np.sum((self._data - query) ** 2, axis=1))
+            rows = np.argpartition(distances, n - 1)[:n] if n < self.n_frames else np.arange(self.n_frames)
+            rows = rows[np.argsort(distances[rows], kind="stable")]
+            distances = distances[rows]
+
+        keep = np.array([int(row) not in exclude for row in rows], dtype=bool)
+        return Neighbors(rows[keep][:k], distances[keep][:k])
+
+    def find_row(self, file_id, start):
+        """ストアのファイル番号・開始サンプルのフレームの行番号（なければ None）"""
+        if "file_id" not in self.meta:
+            return None
+        hits = np.flatnonzero((self.meta["file_id"] == file_id) & (self.meta["start"] == start))
+        return int(hits[0]) if len(hits) else None
+
+    def save(self, path):
+        """ファイルに保存する（書き込み途中のファイルを読まないよう置き換えで保存）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """保存したインデックスを読み込む（なければ None）"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,253 @@
+"""
+多解像度スペクトログラム（ピラミッド）。
+
+録音全体の STFT をそのまま specshow に渡すと、長時間録音では数 GB の配列になり
+描画にも数分かかる。ここではフィルタ済み信号をブロックごとに STFT し、
+時間方向に factor 列ずつ max / mean プーリングした粗いレベルを同じパスで作る。
+各レベルは (列, 周波数ビン) の float16 dB 配列として .npy に保存し、memmap で開く。
+全体表示は粗いレベルから一定時間で描け、拡大表示では必要な時間範囲の列だけを読む。
+"""
+
+import json
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from numpy.lib.stride_tricks import sliding_window_view
+import scipy.signal as signal
+
+
+MANIFEST_NAME = "manifest.json"
+
+# 振幅 dB の下限（librosa.amplitude_to_db の amin=1e-5 と同じ）
+AMIN_DB = -100.0
+
+
+def level_columns(n_columns, factor, min_columns):
+    """各レベルの列数（最下位レベルから、min_columns 以下になるまで）"""
+    columns = [n_columns]
+    while columns[-1] > min_columns:
+        columns.append(-(-columns[-1] // factor))
+    return columns
+
+
+class PyramidBuilder:
+    """ブロックを順に受け取りながらピラミッドを書き出す"""
+
+    def __init__(
+        self,
+        out_dir,
+        sr,
+        n_samples,
+        n_fft=2048,
+        hop_length=512,
+        freq_bins=256,
+        factor=2,
+        min_columns=1024,
+        batch_columns=512,
+        digest=None,
+    ):
+        if (n_fft // 2) % freq_bins:
+            raise ValueError("freq_bins は n_fft / 2 の約数である必要があります")
+
+        self.out_dir = out_dir
+        self.sr = sr
+        self.n_samples = n_samples
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.freq_bins = freq_bins
+        self.factor = factor
+        self.batch_columns = batch_columns
+        # 元の録音の内容ハッシュ（マニフェストに書き、使い回すときに同じ録音か確かめる）
+        self.digest = digest
+
+        os.makedirs(out_dir, exist_ok=True)
+        # 作り直す途中のものを読まないよう、マニフェストは最後に書く
+        manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        self.window = signal.get_window("hann", n_fft, fftbins=True)
+        self.columns = level_columns(1 + n_samples // hop_length, factor, min_columns)
+
+        self._levels = []
+        for level, n_cols in enumerate(self.columns):
+            self._levels.append({
+                "max": open_memmap(self._path(level, "max"), mode="w+", dtype=np.float16, shape=(n_cols, freq_bins)),
+                "mean": open_memmap(self._path(level, "mean"), mode="w+", dtype=np.float16, shape=(n_cols, freq_bins)),
+                "position": 0,
+                # 次のレベルへまだプーリングしていない列（平均パワー, 最大 dB）
+                "pending_power": np.zeros((0, freq_bins), dtype=np.float32),
+                "pending_max": np.zeros((0, freq_bins), dtype=np.float32),
+            })
+
+        # center=True と同じく先頭に n_fft/2 のゼロを入れる
+        self._carry = np.zeros(n_fft // 2, dtype=np.float32)
+        self._peak_db = AMIN_DB
+
+    def _path(self, level, stat):
+        return os.path.join(self.out_dir, f"level{level}_{stat}.npy")
+
+    def update(self, block):
+        """フィルタ済みブロックを追加する"""
+        buffer = np.concatenate([self._carry, np.asarray(block, dtype=np.float32)])
+        n_cols = (len(buffer) - self.n_fft) // self.hop_length + 1 if len(buffer) >= self.n_fft else 0
+        if n_cols > 0:
+            self._columns(buffer, n_cols)
+        self._carry = buffer[n_cols * self.hop_length :]
+
+    def _columns(self, buffer, n_cols):
+        """buffer の先頭から n_cols 列の STFT を計算して最下位レベルに書く"""
+        windows = sliding_window_view(buffer, self.n_fft)[:: self.hop_length]
+        group = (self.n_fft // 2) // self.freq_bins
+        for i in range(0, n_cols, self.batch_columns):
+            frames = windows[i : min(i + self.batch_columns, n_cols)]
+            spectrum = np.fft.rfft(frames * self.window, axis=-1)[:, : self.n_fft // 2]
+            power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+
+            # 周波数方向は group ビンずつ平均して表示用の解像度に落とす
+            power = power.reshape(len(frames), self.freq_bins, group).mean(axis=2)
+            self._push(0, power, _to_db(power))
+
+    def _push(self, level, power, max_db):
+        """レベル level に列を書き、factor 列ずつ次のレベルへ送る"""
+        state = self._levels[level]
+        start = state["position"]
+        state["mean"][start : start + len(power)] = _to_db(power)
+        state["max"][start : start + len(power)] = max_db
+        state["position"] = start + len(power)
+        if level == 0 and len(max_db):
+            self._peak_db = max(self._peak_db, float(max_db.max()))
+
+        if level + 1 >= len(self._levels):
+            return
+        power = np.concatenate([state["pending_power"], power])
+        max_db = np.concatenate([state["pending_max"], max_db])
+        n = len(power) // self.factor * self.factor
+        state["pending_power"] = power[n:]
+        state["pending_max"] = max_db[n:]
+        if n:
+            shape = (n // self.factor, self.factor, self.freq_bins)
+            self._push(
+                level + 1,
+                power[:n].reshape(shape).mean(axis=1),
+                max_db[:n].reshape(shape).max(axis=1),
+            )
+
+    def finish(self):
+        """残りの列を処理してマニフェストを書き、SpectrogramPyramid を返す"""
+        buffer = np.concatenate([self._carry, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        remaining = self.columns[0] - self._levels[0]["position"]
+        if remaining > 0:
+            self._columns(buffer, remaining)
+
+        # 端数の列をまとめて上のレベルへ送る
+        for level in range(len(self._levels) - 1):
+            state = self._levels[level]
+            if len(state["pending_power"]):
+                power, max_db = state["pending_power"], state["pending_max"]
+                state["pending_power"] = power[:0]
+                state["pending_max"] = max_db[:0]
+                self._push(level + 1, power.mean(axis=0, keepdims=True), max_db.max(axis=0, keepdims=True))
+
+        for state in self._levels:
+            state["max"].flush()
+            state["mean"].flush()
+
+        manifest = {
+            "sr": self.sr,
+            "n_samples": self.n_samples,
+            "n_fft": self.n_fft,
+            "hop_length": self.hop_length,
+            "freq_bins": self.freq_bins,
+            "factor": self.factor,
+            "columns": self.columns,
+            "peak_db": self._peak_db,
+            "digest": self.digest,
+        }
+        with open(os.path.join(self.out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        self._levels = []
+        return SpectrogramPyramid(self.out_dir)
+
+
+def _to_db(power):
+    """パワーから振幅 dB（librosa.amplitude_to_db と同じ基準、ref=1）"""
+    return 10.0 * np.log10(np.maximum(power, 10.0 ** (AMIN_DB / 10.0)))
+
+
+def build_pyramid(y, sr, out_dir, block_size=1 << 20, on_progress=None, **kwargs):
+    """フィルタ済み信号（ndarray / memmap）からブロック単位でピラミッドを作る"""
+    builder = PyramidBuilder(out_dir, sr, len(y), **kwargs)
+    for i in range(0, len(y), block_size):
+        builder.update(y[i : i + block_size])
+        if on_progress is not None:
+            on_progress(min(i + block_size, len(y)), len(y))
+    return builder.finish()
+
+
+def open_pyramid(out_dir):
+    """保存済みのピラミッドを開く（なければ None）"""
+    if not os.path.exists(os.path.join(out_dir, MANIFEST_NAME)):
+        return None
+    return SpectrogramPyramid(out_dir)
+
+
+class SpectrogramPyramid:
+    """保存したピラミッドを memmap で開き、必要な範囲だけを読む"""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.sr = manifest["sr"]
+        self.n_samples = manifest["n_samples"]
+        self.n_fft = manifest["n_fft"]
+        self.hop_length = manifest["hop_length"]
+        self.freq_bins = manifest["freq_bins"]
+        self.factor = manifest["factor"]
+        self.columns = manifest["columns"]
+        self.peak_db = manifest["peak_db"]
+        self.digest = manifest.get("digest")
+        self._arrays = {}
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sr
+
+    def level_hop(self, level):
+        """レベル level の 1 列あたりのサンプル数"""
+        return self.hop_length * self.factor ** level
+
+    def array(self, level, stat="max"):
+        """レベルの配列 (列, 周波数ビン) を memmap で返す"""
+        key = (level, stat)
+        if key not in self._arrays:
+            path = os.path.join(self.out_dir, f"level{level}_{stat}.npy")
+            self._arrays[key] = np.load(path, mmap_mode="r")
+        return self._arrays[key]
+
+    def choose_level(self, t0, t1, max_columns):
+        """時間範囲 [t0, t1) を max_columns 列以下で表せる最も細かいレベル"""
+        span = max(t1 - t0, 1e-9) * self.sr
+        for level in range(len(self.columns)):
+            if span / self.level_hop(level) <= max_columns:
+                return level
+        return len(self.columns) - 1
+
+    def window(self, t0=0.0, t1=None, max_columns=2000, stat="max", top_db=80.0):
+        """
+        時間範囲 [t0, t1) の dB 配列 (周波数ビン, 列) と表示範囲 (t0, t1, 0, sr/2) を返す。
+        値は全体の最大値を 0 dB とし、top_db より小さい値は切り詰める（amplitude_to_db と同じ）。
+        """
+        if t1 is None:
+            t1 = self.duration
+        level = self.choose_level(t0, t1, max_columns)
+        hop = self.level_hop(level)
+
+        first = max(0, int(np.floor(t0 * self.sr / hop)))
+        last = min(self.columns[level], int(np.ceil(t1 * self.sr / hop)) + 1)
+        data = np.asarray(self.array(level, stat)[first:last], dtype=np.float32).T - self.peak_db
+        if top_db is not None:
+            data = np.maximum(data, -top_db)
+        extent = (first * hop / self.sr, last * hop / self.sr, 0.0, self.sr / 2)
+        return data, extent
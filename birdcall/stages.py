@@ -0,0 +1,82 @@
+"""
+処理段階の依存グラフとメモ化。
+
+各段階は「依存する段階」と「使うパラメーター」を宣言する。段階の値は
+(パラメーターの値, 依存段階のキー) から作るキーと一緒に保存され、キーが
+変わらない限り再計算しない。たとえば top_db だけを変えた場合は区間分割から先
+だけが再計算され、読み込み・ハイパスフィルタは前回の結果をそのまま使う。
+"""
+
+
+class StageGraph:
+    """依存関係つきの処理段階をメモ化して実行する"""
+
+    def __init__(self, params=None):
+        self.params = dict(params or {})
+        # 段階の外で共有するもの（キャッシュなど）。キーには含めない
+        self.context = {}
+        # 直近に計算し直した段階の名前（計算した順）
+        self.computed = []
+        self._stages = {}
+        self._memo = {}
+
+    def add(self, name, func, deps=(), params=()):
+        """段階を登録する。func(graph) は graph.get() で依存段階の値を取り出す"""
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"未登録の段階に依存しています: {name} → {dep}")
+        self._stages[name] = (func, tuple(deps), tuple(params))
+        self._memo.pop(name, None)
+
+    def set(self, **params):
+        """パラメーターを更新する（値が変わった段階は次の get で再計算される）"""
+        self.params.update(params)
+
+    def key(self, name):
+        """段階のキー（パラメーターと依存段階のキーの組）"""
+        _, deps, params = self._stages[name]
+        return (
+            name,
+            tuple((p, self.params.get(p)) for p in params),
+            tuple(self.key(dep) for dep in deps),
+        )
+
+    def is_valid(self, name):
+        """メモ化された値がそのまま使えるか"""
+        memo = self._memo.get(name)
+        return memo is not None and memo[0] == self.key(name)
+
+    def get(self, name):
+        """段階の値を返す（必要なら依存段階ごと計算する）"""
+        key = self.key(name)
+        memo = self._memo.get(name)
+        if memo is not None and memo[0] == key:
+            return memo[1]
+
+        func = self._stages[name][0]
+        report = self.context.get("report")
+        if report is None:
+            value = func(self)
+        else:
+            # 計測（metrics.RunReport）
+            with report.measure(name) as record:
+                value = func(self)
+                record["value"] = value
+        self._memo[name] = (key, value)
+        self.computed.append(name)
+        return value
+
+    def seed(self, name, value):
+        """計算せずに、今のパラメーターでの値として登録する（保存したセッションから戻すときなど）"""
+        self._memo[name] = (self.key(name), value)
+
+    def peek(self, name):
+        """計算せずに、有効な値があれば返す（なければ None）"""
+        if self.is_valid(name):
+            return self._memo[name][1]
+        return None
+
+    def invalidate(self, *names):
+        """指定した段階（省略時はすべて）のメモを捨てる"""
+        for name in names or list(self._memo):
+            self._memo.pop(name, None)
@@ -0,0 +1,296 @@
+"""
+複数の録音の特徴量をまとめて保存する追記型のストア。
+
+フレームの列（特徴量・ファイル番号・開始サンプル・区間番号・クラスタ番号・残すフラグ）を
+シャードごとの生のバイナリファイルに追記し、np.memmap で必要な行だけを読む。
+1 つの録音の行は 1 つのシャードに連続して入るので、録音ごとの索引
+（録音開始時刻・長さ・シャード内の行範囲）から「5 月の明け方のフレーム」のような
+部分集合を、全体を読まずに取り出せる。
+
+    root/
+      store.json                  索引（録音の一覧とシャードの行数）。最後に書き換える
+      shard_000000/features.f4    (行数, 次元) float32
+      shard_000000/file_id.i4     int32（start.i8, segment.i4, label.i4, keep.u1 も同様）
+
+書き込みは 1 プロセスから行う前提。追記の途中で止まっても、store.json に記録した
+行数より後ろは次の追記の前に切り捨てるので、索引と列がずれることはない。
+"""
+
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+STORE_VERSION = 1
+
+# 列の名前と型（features は (行数, 次元) の 2 次元）
+COLUMNS = {
+    "features": np.float32,
+    "file_id": np.int32,
+    "start": np.int64,
+    "segment": np.int32,
+    "label": np.int32,
+    "keep": np.uint8,
+}
+
+# select() の結果（times は各フレームの開始時刻 datetime64[ms]）
+StoreFrames = namedtuple(
+    "StoreFrames",
+    ["features", "file_ids", "starts", "segment_ids", "labels", "keep", "times"],
+)
+
+# ファイル名の日時（AudioMoth の 20240512_043000.WAV、Song Meter の SITE_20240512_043000.wav など）
+_TIMESTAMP = re.compile(r"(\d{8})[_-]?(\d{6})")
+
+
+def default_store_dir():
+    """既定のストアのフォルダ（環境変数 BIRDCALL_STORE_DIR で変更可）"""
+    return os.environ.get(
+        "BIRDCALL_STORE_DIR",
+        os.path.join(os.path.expanduser("~"), ".local", "share", "birdcall_umap", "store"),
+    )
+
+
+def recording_time(path):
+    """録音の開始時刻（ファイル名の日時、なければファイルの更新時刻）"""
+    match = _TIMESTAMP.search(os.path.basename(path))
+    if match:
+        try:
+            return datetime.strptime(match.group(1) + match.group(2), "%Y%m%d%H%M%S")
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def _to_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class FeatureStore:
+    """シャード分割した列ファイルと録音の索引"""
+
+    def __init__(self, root=None, shard_frames=1 << 20):
+        self.root = root or default_store_dir()
+        # 1 シャードの行数の目安（1 つの録音はシャードをまたがない）
+        self.shard_frames = shard_frames
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest_path = os.path.join(self.root, "store.json")
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"version": STORE_VERSION, "n_features": None, "shards": [], "files": []}
+
+    @property
+    def files(self):
+        """録音の索引（id, path, recorded_at, duration, sr, n_samples, params, shard, row, frames）"""
+        return self.manifest["files"]
+
+    @property
+    def n_frames(self):
+        return sum(shard["frames"] for shard in self.manifest["shards"])
+
+    def _write_manifest(self):
+        tmp_path = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _column_path(self, shard, name):
+        return os.path.join(self.root, shard["name"], f"{name}.{np.dtype(COLUMNS[name]).str[1:]}")
+
+    def column(self, shard, name, mode="r"):
+        """シャードの列を memmap で開く（features は (行数, 次元)）"""
+        shape = (shard["frames"], self.manifest["n_features"]) if name == "features" else (shard["frames"],)
+        if shard["frames"] == 0:
+            return np.zeros(shape, dtype=COLUMNS[name])
+        return np.memmap(self._column_path(shard, name), dtype=COLUMNS[name], mode=mode, shape=shape)
+
+    # ===== 追加 =====
+    def find(self, path, params=None):
+        """同じ録音・同じパラメーターで追加済みの索引（なければ None）"""
+        path = os.path.abspath(path)
+        for entry in reversed(self.files):
+            if entry["path"] == path and entry["params"] == (params or {}):
+                return entry
+        return None
+
+    def ingest(
+        self,
+        path,
+        features,
+        starts,
+        segment_ids,
+        labels,
+        sr,
+        n_samples,
+        params=None,
+        keep=None,
+        recorded_at=None,
+    ):
+        """
+        1 つの録音のフレームを追加し、ファイル番号を返す。
+        同じ録音・同じパラメーターが追加済みなら、クラスタ番号と残すフラグだけを書き換える。
+        """
+        features = np.asarray(features, dtype=np.float32)
+        n = len(features)
+        keep = np.ones(n, dtype=np.uint8) if keep is None else np.asarray(keep, dtype=np.uint8)
+
+        existing = self.find(path, params)
+        if existing is not None and existing["frames"] == n:
+            self.update(existing["id"], labels=labels, keep=keep)
+            return existing["id"]
+
+        if self.manifest["n_features"] is None:
+            self.manifest["n_features"] = int(features.shape[1]) if features.ndim == 2 else 0
+        if n and features.shape[1] != self.manifest["n_features"]:
+            raise ValueError(
+                f"特徴量の次元 ({features.shape[1]}) がストアの次元 ({self.manifest['n_features']}) と異なります"
+            )
+
+        shard = self._writable_shard(n)
+        file_id = len(self.files)
+        columns = {
+            "features": features,
+            "file_id": np.full(n, file_id, dtype=np.int32),
+            "start": starts,
+            "segment": segment_ids,
+            "label": labels,
+            "keep": keep,
+        }
+        for name, values in columns.items():
+            column_path = self._column_path(shard, name)
+            row_bytes = np.dtype(COLUMNS[name]).itemsize * (self.manifest["n_features"] if name == "features" else 1)
+            with open(column_path, "ab") as f:
+                # 前回の追記が途中で止まっていれば、索引にない行を捨ててから書く
+                f.truncate(shard["frames"] * row_bytes)
+                np.ascontiguousarray(values, dtype=COLUMNS[name]).tofile(f)
+
+        recorded_at = recorded_at or recording_time(path)
+        self.files.append({
+            "id": file_id,
+            "path": os.path.abspath(path),
+            "recorded_at": recorded_at.isoformat(timespec="seconds"),
+            "duration": n_samples / sr,
+            "sr": int(sr),
+            "n_samples": int(n_samples),
+            "params": params or {},
+            "shard": shard["index"],
+            "row": shard["frames"],
+            "frames": n,
+        })
+        shard["frames"] += n
+        self._write_manifest()
+        return file_id
+
+    def _writable_shard(self, n):
+        """n 行を追記するシャード（いっぱいなら新しく作る）"""
+        shards = self.manifest["shards"]
+        if not shards or (shards[-1]["frames"] > 0 and shards[-1]["frames"] + n > self.shard_frames):
+            index = len(shards)
+            shards.append({"index": index, "name": f"shard_{index:06d}", "frames": 0})
+            os.makedirs(os.path.join(self.root, shards[-1]["name"]), exist_ok=True)
+        return shards[-1]
+
+    def update(self, file_id, labels=None, keep=None):
+        """追加済みの録音のクラスタ番号・残すフラグを書き換える（行はそのまま）"""
+        entry = self.files[file_id]
+        shard = self.manifest["shards"][entry["shard"]]
+        rows = slice(entry["row"], entry["row"] + entry["frames"])
+        for name, values in (("label", labels), ("keep", keep)):
+            if values is None:
+                continue
+            column = self.column(shard, name, mode="r+")
+            column[rows] = np.asarray(values, dtype=COLUMNS[name])
+            column.flush()
+            del column
+
+    # ===== 読み出し =====
+    def find_files(self, paths=None, start=None, end=None, params=None):
+        """
+        録音の索引を絞り込む。paths（録音のパスの並び）と、録音時間が
+        [start, end) と重なるもの（datetime か ISO 形式の文字列）。
+        同じ録音を別のパラメーターで追加した場合は最後のものだけを使う
+        （params を指定すると、そのパラメーターで追加したものだけ）。
+        """
+        start, end = _to_datetime(start), _to_datetime(end)
+        wanted = None if paths is None else {os.path.abspath(p) for p in paths}
+        latest = {}
+        for entry in self.files:
+            if params is None or entry["params"] == params:
+                latest[entry["path"]] = entry
+
+        selected = []
+        for entry in latest.values():
+            if wanted is not None and entry["path"] not in wanted:
+                continue
+            begin = datetime.fromisoformat(entry["recorded_at"])
+            finish = begin + timedelta(seconds=entry["duration"])
+            if (start is not None and finish <= start) or (end is not None and begin >= end):
+                continue
+            selected.append(entry)
+        selected.sort(key=lambda e: (e["recorded_at"], e["id"]))
+        return selected
+
+    def select(self, paths=None, start=None, end=None, hours=None, keep_only=False, params=None):
+        """
+        条件に合うフレームを StoreFrames で返す。録音の索引で絞ってから該当する行だけを読む。
+        hours=(4, 7) のように指定すると、その時刻（録音の現地時刻、時）のフレームだけにする
+        （(22, 2) のように日付をまたいでもよい）。keep_only なら除外したフレームを含めない。
+        params を指定すると、その特徴量の設定で追加した録音だけにする。
+        """
+        start, end = _to_datetime(start), _to_datetime(end)
+        parts = {name: [] for name in ("features", "file_id", "start", "segment", "label", "keep", "times")}
+        for entry in self.find_files(paths, start, end, params=params):
+            shard = self.manifest["shards"][entry["shard"]]
+            rows = slice(entry["row"], entry["row"] + entry["frames"])
+            starts = np.asarray(self.column(shard, "start")[rows])
+
+            # フレームの開始時刻
+            begin = np.datetime64(datetime.fromisoformat(entry["recorded_at"]), "ms")
+            times = begin + (starts * 1000 // entry["sr"]).astype("timedelta64[ms]")
+
+            mask = np.ones(len(starts), dtype=bool)
+            if start is not None:
+                mask &= times >= np.datetime64(start, "ms")
+            if end is not None:
+                mask &= times < np.datetime64(end, "ms")
+            if hours is not None:
+                hour = (times - times.astype("datetime64[D]")).astype("timedelta64[ms]").astype(np.int64) / 3.6e6
+                first, last = hours
+                mask &= (hour >= first) & (hour < last) if first <= last else (hour >= first) | (hour < last)
+            if keep_only:
+                mask &= np.asarray(self.column(shard, "keep")[rows]).astype(bool)
+            if not mask.any():
+                continue
+
+            index = np.flatnonzero(mask) + entry["row"]
+            for name in ("features", "file_id", "segment", "label", "keep"):
+                parts[name].append(np.asarray(self.column(shard, name)[index]))
+            parts["start"].append(starts[mask])
+            parts["times"].append(times[mask])
+
+        n_features = self.manifest["n_features"] or 0
+        empty = {
+            "features": np.zeros((0, n_features), dtype=np.float32),
+            "times": np.zeros(0, dtype="datetime64[ms]"),
+        }
+        arrays = {
+            name: np.concatenate(values) if values else empty.get(name, np.zeros(0, dtype=COLUMNS.get(name)))
+            for name, values in parts.items()
+        }
+        return StoreFrames(
+            arrays["features"],
+            arrays["file_id"],
+            arrays["start"],
+            arrays["segment"],
+            arrays["label"],
+            arrays["keep"].astype(bool),
+            arrays["times"],
+        )
@@ -0,0 +1,382 @@
+"""
+メモリに載らない長時間録音のためのストリーミング前処理。
+
+soundfile でブロックごとに読み込み、Butterworth ハイパスを SOS 形式で
+状態を引き継ぎながら適用する。filtfilt と同じゼロ位相にするため、逆方向の
+フィルタはインパルス応答が減衰しきる長さ（margin）だけ先読みしてから確定させる。
+区間検出はホップ単位の二乗和を、特徴量抽出はフレーム長ぶんの持ち越しバッファを
+使うので、ピークメモリは録音の長さによらずブロックサイズ程度に収まる。
+区間検出が ActivityDetector（activity="adaptive"）なら、run() は区間が確定したそばから
+特徴量を計算するので、読み込み・フィルタ・区間検出・特徴量抽出が 1 パスで終わる。
+解析周波数（analysis_sr）を指定すると、読み込んだブロックをフィルタの前に間引く。
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import scipy.signal as signal
+import soundfile as sf
+
+from .features import FrameFeatures, MfccExtractor, frame_starts
+from .resample import analysis_rate, iter_resampled, resampled_length
+from .segments import ActivityDetector, HopEnergy, filter_short, frame_power, nonsilent_intervals
+
+
+# 1 回に読み込むサンプル数の既定値
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+# 区間検出の方法: adaptive は ActivityDetector（近くの大きな音が基準）、
+# global は librosa.effects.split と同じ（録音全体の最大値が基準）
+ACTIVITY_MODES = ("adaptive", "global")
+
+# 1 パス目の結果: sr, 全サンプル数, 鳴き声区間, 書き出したフィルタ済み信号（なければ None）
+ScanResult = namedtuple("ScanResult", ["sr", "n_samples", "segments", "filtered"])
+
+
+def write_signal(path, blocks):
+    """
+    float32 のブロックを順に path へ書き、読み取り専用の memmap で開き直す。
+    一時ファイルに書いてから置き換えるので、書きかけのファイルは残らない。
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            for block in blocks:
+                np.asarray(block, dtype=np.float32).tofile(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r")
+
+
+def iter_blocks(path, block_size=DEFAULT_BLOCK_SIZE):
+    """ファイルを float32 のモノラルブロックとして順に返す（librosa.load と同じ平均ミックス）"""
+    with sf.SoundFile(path) as f:
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            if block.shape[1] == 1:
+                yield block[:, 0]
+            else:
+                yield block.mean(axis=1, dtype=np.float32)
+
+
+def signal_info(path, target_sr=None):
+    """(解析周波数, 解析周波数でのサンプル数)"""
+    info = sf.info(path)
+    sr = analysis_rate(info.samplerate, target_sr)
+    return sr, resampled_length(info.frames, info.samplerate, sr)
+
+
+def settle_length(sos, sr, tolerance=1e-7):
+    """インパルス応答が tolerance（相対値）まで減衰するサンプル数"""
+    impulse = np.zeros(max(int(sr), 1))
+    impulse[0] = 1.0
+    response = np.abs(signal.sosfilt(sos, impulse))
+    above = np.flatnonzero(response > tolerance * response.max())
+    return int(above[-1]) + 1 if len(above) else 1
+
+
+class StreamingHighpass:
+    """
+    ブロック単位のゼロ位相ハイパスフィルタ。
+    process() に入力ブロックを渡すと、確定した出力を float32 で返す
+    （出力は先読みぶん margin サンプル遅れる）。最後に flush() を呼ぶ。
+    """
+
+    def __init__(self, cutoff, sr, order=4, margin=None):
+        self.sos = signal.butter(order, cutoff / (sr / 2), btype="high", output="sos")
+        if margin is None:
+            margin = max(1024, 2 * settle_length(self.sos, sr))
+        self.margin = margin
+
+        self._zi = None
+        self._pending = np.zeros(0)
+
+    def process(self, block):
+        """入力ブロックを受け取り、確定した出力を返す"""
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # 順方向: 状態を引き継いで連続した 1 本の信号として扱う
+        if self._zi is None:
+            self._zi = signal.sosfilt_zi(self.sos) * block[0]
+        forward, self._zi = signal.sosfilt(self.sos, block, zi=self._zi)
+        self._pending = np.concatenate([self._pending, forward])
+
+        n_ready = len(self._pending) - self.margin
+        if n_ready <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # 逆方向: margin 先まで含めて逆向きにかけ、確定部分だけを出力する
+        backward = signal.sosfilt(self.sos, self._pending[::-1])[::-1]
+        out = backward[:n_ready].astype(np.float32)
+        self._pending = self._pending[n_ready:]
+        return out
+
+    def flush(self):
+        """残りの出力を返す（ファイル末尾は定常状態で初期化して逆方向をかける）"""
+        if len(self._pending) == 0:
+            return np.zeros(0, dtype=np.float32)
+        reversed_pending = self._pending[::-1]
+        zi = signal.sosfilt_zi(self.sos) * reversed_pending[0]
+        backward, _ = signal.sosfilt(self.sos, reversed_pending, zi=zi)
+        self._pending = np.zeros(0)
+        return backward[::-1].astype(np.float32)
+
+
+def iter_filtered(path, cutoff, block_size=DEFAULT_BLOCK_SIZE, target_sr=None):
+    """
+    (sr, ブロックのイテレータ) を返す。各ブロックはハイパス済みの float32。
+    target_sr が録音の周波数より低ければ、その周波数に間引いてからフィルタをかける
+    """
+    native_sr = sf.info(path).samplerate
+    sr = analysis_rate(native_sr, target_sr)
+    highpass = StreamingHighpass(cutoff, sr)
+
+    def blocks():
+        for block in iter_resampled(iter_blocks(path, block_size), native_sr, sr):
+            out = highpass.process(block)
+            if len(out):
+                yield out
+        out = highpass.flush()
+        if len(out):
+            yield out
+
+    return sr, blocks()
+
+
+class StreamingFrontEnd:
+    """
+    読み込み → ハイパス → 区間検出 → フレーム分割 → MFCC をブロック単位で行う。
+
+    scan() で 1 パス目（フィルタと区間検出）、features() で 2 パス目
+    （再読み込みしながら特徴量抽出）を行う。scan() に spill_path を渡すと
+    フィルタ済み信号を float32 の memmap として書き出す（再生や書き出し用）。
+    """
+
+    def __init__(
+        self,
+        cutoff=3000,
+        top_db=45,
+        frame_length_sec=0.25,
+        hop_length_sec=0.25,
+        n_mfcc=20,
+        min_duration=0.1,
+        block_size=DEFAULT_BLOCK_SIZE,
+        activity="adaptive",
+        analysis_sr=None,
+    ):
+        if activity not in ACTIVITY_MODES:
+            raise ValueError(f"activity は {', '.join(ACTIVITY_MODES)} のいずれかです: {activity}")
+        self.cutoff = cutoff
+        self.top_db = top_db
+        self.frame_length_sec = frame_length_sec
+        self.hop_length_sec = hop_length_sec
+        self.n_mfcc = n_mfcc
+        self.min_duration = min_duration
+        self.block_size = block_size
+        self.activity = activity
+        # 解析周波数（None なら録音の周波数のまま）
+        self.analysis_sr = analysis_sr
+
+    def filtered_blocks(self, path):
+        """(sr, ハイパス済みブロックのイテレータ)"""
+        return iter_filtered(path, self.cutoff, self.block_size, target_sr=self.analysis_sr)
+
+    def detector(self, sr):
+        """同じパラメーターのストリーミング区間検出"""
+        return ActivityDetector(sr, top_db=self.top_db, min_duration=self.min_duration)
+
+    def _open_spill(self, spill_path, n_samples):
+        if spill_path is None:
+            return None
+        return np.memmap(spill_path, dtype=np.float32, mode="w+", shape=(max(n_samples, 1),))
+
+    def scan(self, path, spill_path=None, on_progress=None):
+        """
+        1 パス目: フィルタをかけながらホップ二乗和を集め、鳴き声区間を求める。
+        on_progress(済みサンプル数, 全サンプル数) はブロックごとに呼ばれる。
+        """
+        _, n_total = signal_info(path, self.analysis_sr)
+        spill = self._open_spill(spill_path, n_total)
+
+        sr, blocks = self.filtered_blocks(path)
+        energy = HopEnergy()
+        detector = self.detector(sr) if self.activity == "adaptive" else None
+        segments = []
+        position = 0
+        for block in blocks:
+            if detector is not None:
+                segments.extend(detector.update(block))
+            else:
+                energy.update(block)
+            if spill is not None:
+                spill[position : position + len(block)] = block
+            position += len(block)
+            if on_progress is not None:
+                on_progress(position, n_total)
+
+        n_samples = position
+        if detector is not None:
+            segments.extend(detector.finish())
+        else:
+            power = frame_power(energy.finish(), n_samples)
+            intervals = nonsilent_intervals(power, n_samples, self.top_db)
+            segments = filter_short(intervals, sr, self.min_duration)
+
+        if spill is not None:
+            spill.flush()
+            spill = spill[:n_samples]
+        return ScanResult(sr, n_samples, segments, spill)
+
+    def features(self, path, scan, on_progress=None):
+        """
+        2 パス目: フィルタ済みブロックを流しながら、揃ったフレームから特徴量を計算する。
+        on_progress(済みフレーム数, 全フレーム数) はブロック（memmap ならバッチ）ごとに呼ばれる。
+        """
+        sr = scan.sr
+        frame_length = int(sr * self.frame_length_sec)
+        hop_length = int(sr * self.hop_length_sec)
+        extractor = MfccExtractor(sr, n_mfcc=self.n_mfcc)
+
+        starts, segment_ids = frame_starts(scan.segments, frame_length, hop_length)
+        if scan.filtered is not None:
+            return extractor.extract_at(scan.filtered, starts, segment_ids, frame_length, on_progress=on_progress)
+
+        results = []
+        next_frame = 0
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = 0
+
+        _, blocks = self.filtered_blocks(path)
+        for block in blocks:
+            buffer = np.concatenate([buffer, block])
+            buffer_end = buffer_start + len(buffer)
+
+            # このバッファ内に収まるフレームをまとめて処理
+            last = np.searchsorted(starts, buffer_end - frame_length, side="right")
+            if last > next_frame:
+                results.append(
+                    extractor.extract_at(
+                        buffer,
+                        starts[next_frame:last],
+                        segment_ids[next_frame:last],
+                        frame_length,
+                        offset=buffer_start,
+                    )
+                )
+                next_frame = last
+
+            # 次のフレームに必要な部分だけを持ち越す
+            keep_from = buffer_end
+            if next_frame < len(starts):
+                keep_from = min(max(starts[next_frame], buffer_start), buffer_end)
+            buffer = buffer[keep_from - buffer_start :]
+            buffer_start = keep_from
+            if on_progress is not None:
+                on_progress(next_frame, len(starts))
+
+            if next_frame >= len(starts):
+                break
+
+        if not results:
+            return extractor.extract_at(None, starts[:0], segment_ids[:0], frame_length)
+        return FrameFeatures(
+            np.concatenate([r.features for r in results]),
+            np.concatenate([r.starts for r in results]),
+            np.concatenate([r.segment_ids for r in results]),
+        )
+
+    def run(self, path, spill_path=None, on_progress=None):
+        """
+        scan() と features() の結果 (ScanResult, FrameFeatures) を返す。
+        activity="adaptive" なら 1 パスで、区間が確定したそばから（続いている長い区間は
+        判定済みの部分から）特徴量を計算し、ファイルを読み直さない。
+        on_progress(済みサンプル数, 全サンプル数) はブロックごとに呼ばれる。
+        """
+        if self.activity != "adaptive":
+            scan = self.scan(path, spill_path, on_progress=on_progress)
+            return scan, self.features(path, scan)
+
+        _, n_total = signal_info(path, self.analysis_sr)
+        spill = self._open_spill(spill_path, n_total)
+        sr, blocks = self.filtered_blocks(path)
+        detector = self.detector(sr)
+        frame_length = int(sr * self.frame_length_sec)
+        hop_length = int(sr * self.hop_length_sec)
+        extractor = MfccExtractor(sr, n_mfcc=self.n_mfcc)
+
+        segments = []
+        results = []
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = 0
+        # 続いている区間の (開始サンプル, 計算済みの結果, 計算済みのフレーム数)
+        partial = None
+
+        def extract_run(start, end, first):
+            """区間 [start, end) に収まるフレームのうち first 番目以降の特徴量と、収まるフレーム数"""
+            count = (end - start - frame_length) // hop_length + 1 if end - start >= frame_length else 0
+            if count <= first:
+                return [], first
+            starts = start + hop_length * np.arange(first, count, dtype=np.int64)
+            ids = np.zeros(len(starts), dtype=np.int64)
+            return [extractor.extract_at(buffer, starts, ids, frame_length, offset=buffer_start)], count
+
+        def accept(intervals):
+            nonlocal partial
+            for start, end in intervals:
+                done, first = [], 0
+                if partial is not None and partial[0] == start:
+                    _, done, first = partial
+                    partial = None
+                rest, _ = extract_run(start, end, first)
+                segment_id = len(segments)
+                segments.append((start, end))
+                for result in done + rest:
+                    results.append(result._replace(segment_ids=np.full(len(result.starts), segment_id, dtype=np.int64)))
+
+        position = 0
+        for block in blocks:
+            if spill is not None:
+                spill[position : position + len(block)] = block
+            position += len(block)
+            buffer = np.concatenate([buffer, block])
+            accept(detector.update(block))
+
+            run = detector.open_run
+            if partial is not None and (run is None or run[0] != partial[0]):
+                # 続いていた区間は短すぎるかしきい値に届かず捨てられた
+                partial = None
+            if run is not None:
+                if partial is None:
+                    partial = (run[0], [], 0)
+                done, first = extract_run(run[0], run[1], partial[2])
+                partial = (run[0], partial[1] + done, first)
+
+            # 次に計算するフレームより前は捨てる
+            keep_from = detector.decided
+            if partial is not None:
+                keep_from = min(keep_from, partial[0] + partial[2] * hop_length)
+            keep_from = min(max(keep_from, buffer_start), buffer_start + len(buffer))
+            buffer = buffer[keep_from - buffer_start :]
+            buffer_start = keep_from
+            if on_progress is not None:
+                on_progress(position, n_total)
+        accept(detector.finish())
+
+        if spill is not None:
+            spill.flush()
+            spill = spill[:position]
+        scan = ScanResult(sr, position, segments, spill)
+        if not results:
+            return scan, extractor.extract_at(None, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), frame_length)
+        return scan, FrameFeatures(
+            np.concatenate([r.features for r in results]),
+            np.concatenate([r.starts for r in results]),
+            np.concatenate([r.segment_ids for r in results]),
+        )
@@ -0,0 +1,71 @@
+"""
+GUI の起動後の準備運転。
+
+scipy・scikit-learn・librosa・umap は読み込むだけで数秒かかり、UMAP は初回の学習で
+さらに numba の JIT コンパイルに十数秒かかる。GUI はこれらを使うときまで読み込まずに
+ウィンドウをすぐ表示し、そのあとバックグラウンドのスレッドで warm_up() を実行して、
+ファイルを選んでいる間に読み込みとコンパイルを済ませておく。
+
+コンパイル結果は enable_numba_cache() で指定したフォルダに保存され、
+cache=True の関数（pynndescent の距離関数など）は次回の起動からコンパイルせずに読み込まれる。
+"""
+
+import importlib
+import os
+import time
+
+from .cache import default_cache_dir
+
+# 準備運転で読み込むモジュール（処理で使う順）
+WARMUP_MODULES = (
+    "scipy.signal",
+    "librosa",
+    "sklearn.cluster",
+    "birdcall.pipeline",
+    "birdcall.plots",
+    "birdcall.ksweep",
+    "umap",
+)
+
+# 準備運転の UMAP のフレーム数。UMAP は 4096 フレームを超えると近傍探索に
+# NNDescent を使うので、そちらの関数もコンパイルされる数にする
+WARMUP_UMAP_FRAMES = 5000
+
+
+def enable_numba_cache(cache_dir=None):
+    """
+    numba のコンパイル結果をディスクに保存する（既定はキャッシュフォルダの numba/）。
+    numba を読み込む前に呼ぶ。環境変数 NUMBA_CACHE_DIR が設定済みならそれを使う
+    """
+    cache_dir = cache_dir or os.path.join(default_cache_dir(), "numba")
+    return os.environ.setdefault("NUMBA_CACHE_DIR", cache_dir)
+
+
+def fit_small_umap(n_frames=WARMUP_UMAP_FRAMES, n_features=40, random_state=0):
+    """乱数のデータで UMAP を学習し、fit_transform が使う関数をコンパイルさせる"""
+    import numpy as np
+    from umap import UMAP
+
+    # パイプラインと同じ float32・random_state 指定（同じ型の関数がコンパイルされる）
+    data = np.random.default_rng(random_state).normal(size=(n_frames, n_features)).astype(np.float32)
+    UMAP(n_components=2, random_state=random_state).fit_transform(data)
+
+
+def warm_up(modules=WARMUP_MODULES, umap=True, on_step=None):
+    """
+    modules を読み込み、umap=True なら UMAP の JIT コンパイルまで済ませる。
+    段階ごとの (名前, 秒) のリストを返す。on_step(名前, 秒) は段階が終わるごとに呼ばれる
+    """
+    steps = [(f"import {name}", lambda name=name: importlib.import_module(name)) for name in modules]
+    if umap:
+        steps.append(("UMAP の JIT コンパイル", fit_small_umap))
+
+    timings = []
+    for name, func in steps:
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        timings.append((name, seconds))
+        if on_step is not None:
+            on_step(name, seconds)
+    return timings
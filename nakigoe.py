@@ -1,18 +1,34 @@
 import os
+import time
+
+# 起動時間の計測（モジュールの読み込み・ウィンドウの表示までの時間を表示する）
+STARTUP_BEGIN = time.perf_counter()
+
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import tkinter.font as tkfont
 import threading
 
-import librosa
-import librosa.display
-import matplotlib.pyplot as plt
 import numpy as np
-import sounddevice as sd
 import soundfile as sf
-from sklearn.cluster import KMeans
-from umap import UMAP
-import scipy.signal as signal
+
+# librosa・matplotlib・scikit-learn・umap と、それを使う処理部品（plots・ksweep・pipeline・stream）は
+# 読み込むだけで数秒かかるので、ここでは読み込まない。ウィンドウを表示したあとの準備運転で
+# 読み込んでおき、各メソッドでは使う場所で import する
+from birdcall.cache import FeatureCache, default_cache_dir
+from birdcall.export import FrameExporter, index_path
+from birdcall.frametable import FrameTable, parse_time_range
+from birdcall.jobs import JobScheduler, format_progress
+from birdcall.playback import PlaybackEngine
+from birdcall.session import is_session, load_session, save_session
+from birdcall.similar import SimilarityIndex
+from birdcall.store import FeatureStore
+from birdcall.warmup import enable_numba_cache, warm_up
+
+# numba のコンパイル結果をキャッシュフォルダに保存する（numba を読み込む前に設定する）
+enable_numba_cache()
+
+IMPORT_SECONDS = time.perf_counter() - STARTUP_BEGIN
 
 
 # ===== 統合GUI クラス定義 =====
@@ -22,9 +38,12 @@ class BirdcallAnalysisGUI:
         self.file_path = None
         self.y = None
         self.sr = None
-        self.frame_times = []
+        # self.y の元の録音とかけたハイパスの周波数（元の周波数で書き出すときに読み直す。なければ None）
+        self.signal_source = None
+        # フレームごとの開始サンプル・区間番号・クラスタ番号・残すフラグ・UMAP の座標（FrameTable）
+        self.frames = None
         self.mfcc_array = None
-        self.labels = None
+        self.feature_params = None
         self.frame_length = 0
         self.segments = []
         
@@ -33,12 +52,76 @@ class BirdcallAnalysisGUI:
         self.param_hop_length = 0.25
         self.param_cutoff = 3000
         self.param_top_db = 45
-        
-        # フレームを除外するかのフラグ（True=残す, False=除外）
-        self.keep_flags = []
+
+        # 解析のサンプリング周波数（None なら録音の周波数のまま）。高い周波数の録音は読み込み時に間引く
+        self.param_analysis_sr = None
+        self.analysis_sr_choices = ["元のまま", "48000", "32000", "24000"]
+        self.param_n_clusters = 4
+
+        # UMAP マップを保存して次回以降はそのマップに配置する（録音どうしで座標を比べられる）
+        self.param_reuse_umap = False
+
+        # フィルタ済み信号をファイルに書いて memmap で持つ（長い録音でもメモリに全体を載せない）
+        self.param_memmap_signal = False
+        self.umap_model_path = os.path.join(default_cache_dir(), "umap_model.pkl")
+
+        # この長さ（秒）以上の録音はブロック単位のストリーミング処理で読み込む
+        self.streaming_min_duration = 30 * 60
+
+        # 特徴量抽出のプロセス数（None なら CPU 数。フレームが少ない録音は 1 コアで計算する）
+        self.extract_workers = None
+
+        # 処理段階のメモ（スライダー変更時は影響を受ける段階だけ再計算する）
+        self.stages = None
+
+        # 段階ごとの実行時間・メモリの記録（出力フォルダの run_report.json に書く）。
+        # 環境変数 BIRDCALL_PROFILE に cprofile / tracemalloc を指定すると詳しい内訳も書き出す
+        self.run_report = None
+        self.profile = os.environ.get("BIRDCALL_PROFILE") or None
+
+        # 特徴量キャッシュ（作れない環境ではキャッシュなしで動かす）
+        try:
+            self.feature_cache = FeatureCache()
+        except OSError as e:
+            print(f"特徴量キャッシュを使用できません: {e}")
+            self.feature_cache = None
+
+        # 特徴量ストア（処理した録音のフレームをためて、録音・日時で絞り込んで読めるようにする）
+        try:
+            self.feature_store = FeatureStore()
+        except OSError as e:
+            print(f"特徴量ストアを使用できません: {e}")
+            self.feature_store = None
+        # 処理中の録音のストア上のファイル番号
+        self.store_file_id = None
+
+        # 似た鳴き声の検索（ストアのフレームの近傍探索インデックス。作り直さないよう保存しておく）
+        self.similar_index = None
+        self.similar_index_path = os.path.join(default_cache_dir(), "similar_index.pkl")
+        self.similar_k = 50
+
         self.current_index = 0
         self.is_playing = False
         self.auto_play_mode = False
+
+        # 再生（開いたままの出力ストリームで、フレームを途切れずに続けて再生する）
+        self.playback = PlaybackEngine()
+        self.param_play_speed = 1.0
+        # 全再生で聞くクラスタ（None ならすべて）
+        self.param_play_cluster = None
+
+        # 一括保存の中止フラグ（書き出し中だけ threading.Event）
+        self.export_cancel = None
+
+        # 重い処理（処理開始・k の評価・UMAP）は 1 つのワーカースレッドで順に実行する。
+        # 結果と進捗は root.after でメインスレッドに戻す
+        self.scheduler = None
+        self.active_jobs = 0
+
+        # 準備運転（重いモジュールの読み込みと UMAP の JIT コンパイル）のスレッドと、
+        # 起動・準備運転の時間（実行レポートにも書く）
+        self.warmup_thread = None
+        self.startup_timings = {"import_sec": IMPORT_SECONDS}
         
         # 処理状態
         self.processing_done = False
@@ -106,6 +189,35 @@ class BirdcallAnalysisGUI:
             width=15
         )
         self.process_btn.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_btn = ttk.Button(
+            file_frame,
+            text="中止",
+            command=self.cancel_jobs,
+            state=tk.DISABLED,
+            width=8
+        )
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+
+        # セッションの保存・復元（確認の途中で閉じても、読み込み・特徴量の計算なしで続きから再開する）
+        session_frame = ttk.Frame(self.root)
+        session_frame.pack(fill=tk.X, padx=10)
+
+        ttk.Button(
+            session_frame,
+            text="📂 セッションを開く",
+            command=self.open_session,
+            width=18
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.save_session_btn = ttk.Button(
+            session_frame,
+            text="💾 セッションを保存",
+            command=self.save_session,
+            state=tk.DISABLED,
+            width=18
+        )
+        self.save_session_btn.pack(side=tk.LEFT, padx=5)
         
         # ===== パラメーター調整エリア =====
         param_frame = ttk.LabelFrame(self.root, text="2. パラメーター調整", padding="10")
@@ -191,6 +303,23 @@ class BirdcallAnalysisGUI:
 
         # 説明（簡潔）
         ttk.Label(cutoff_frame, text="説明: この周波数以上を残す。低周波ノイズ除去に有効。", foreground="gray").pack(side=tk.LEFT, padx=8)
+
+        # 解析のサンプリング周波数
+        analysis_sr_frame = ttk.Frame(param_frame)
+        analysis_sr_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(analysis_sr_frame, text="解析の周波数:").pack(side=tk.LEFT, padx=5)
+        self.analysis_sr_combo = ttk.Combobox(
+            analysis_sr_frame,
+            values=self.analysis_sr_choices,
+            state="readonly",
+            width=10
+        )
+        self.analysis_sr_combo.set(self.analysis_sr_choices[0])
+        self.analysis_sr_combo.bind("<<ComboboxSelected>>", self.update_analysis_sr)
+        self.analysis_sr_combo.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(analysis_sr_frame, text="説明: 192kHz・96kHz の録音をこの周波数に間引いて処理・再生（一括保存は元の周波数も選べる）。", foreground="gray").pack(side=tk.LEFT, padx=8)
         
         # エネルギー閾値スライダー
         top_db_frame = ttk.Frame(param_frame)
@@ -218,6 +347,69 @@ class BirdcallAnalysisGUI:
 
         # 説明（簡潔）
         ttk.Label(top_db_frame, text="説明: 鳴き声区間抽出の閾値（dB）。大きいほど厳しく抽出。", foreground="gray").pack(side=tk.LEFT, padx=8)
+
+        # クラスタ数スライダー
+        n_clusters_frame = ttk.Frame(param_frame)
+        n_clusters_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(n_clusters_frame, text="クラスタ数 k:").pack(side=tk.LEFT, padx=5)
+        self.n_clusters_value_label = ttk.Label(
+            n_clusters_frame,
+            text=f"{self.param_n_clusters}",
+            width=10
+        )
+        self.n_clusters_value_label.pack(side=tk.LEFT, padx=5)
+
+        self.n_clusters_slider = tk.Scale(
+            n_clusters_frame,
+            from_=2,
+            to=10,
+            resolution=1,
+            orient=tk.HORIZONTAL,
+            length=250,
+            command=self.update_n_clusters
+        )
+        self.n_clusters_slider.set(self.param_n_clusters)
+        self.n_clusters_slider.pack(side=tk.LEFT, padx=5)
+
+        self.k_sweep_btn = ttk.Button(
+            n_clusters_frame,
+            text="k を自動選択",
+            command=self.start_k_sweep,
+            state=tk.DISABLED,
+            width=15
+        )
+        self.k_sweep_btn.pack(side=tk.LEFT, padx=5)
+
+        # 説明（簡潔）
+        ttk.Label(n_clusters_frame, text="説明: 処理後に k=2〜10 を並列で評価し、推奨の k で分類し直す。", foreground="gray").pack(side=tk.LEFT, padx=8)
+
+        # UMAP マップの保存・再利用
+        umap_model_frame = ttk.Frame(param_frame)
+        umap_model_frame.pack(fill=tk.X, pady=5)
+
+        self.reuse_umap_var = tk.BooleanVar(value=self.param_reuse_umap)
+        ttk.Checkbutton(
+            umap_model_frame,
+            text="UMAPマップを保存して再利用",
+            variable=self.reuse_umap_var,
+            command=self.update_reuse_umap
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(umap_model_frame, text="説明: 2回目以降は学習せず保存済みのマップに配置（録音どうしで比較可）。", foreground="gray").pack(side=tk.LEFT, padx=8)
+
+        memmap_frame = ttk.Frame(param_frame)
+        memmap_frame.pack(fill=tk.X, pady=5)
+
+        self.memmap_signal_var = tk.BooleanVar(value=self.param_memmap_signal)
+        ttk.Checkbutton(
+            memmap_frame,
+            text="信号をディスクに置く（省メモリ）",
+            variable=self.memmap_signal_var,
+            command=self.update_memmap_signal
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(memmap_frame, text="説明: 再生・保存は必要な部分だけファイルから読む（次の「処理開始」から反映）。", foreground="gray").pack(side=tk.LEFT, padx=8)
         
         # ===== フレーム情報表示エリア =====
         info_frame = ttk.LabelFrame(self.root, text="3. フレーム情報", padding="10")
@@ -295,6 +487,15 @@ class BirdcallAnalysisGUI:
             state=tk.DISABLED
         )
         self.next_btn.grid(row=0, column=1, padx=5)
+
+        self.similar_btn = ttk.Button(
+            nav_frame,
+            text="🔍 似た鳴き声",
+            command=self.find_similar,
+            width=15,
+            state=tk.DISABLED
+        )
+        self.similar_btn.grid(row=0, column=2, padx=5)
         
         # 再生・除外・保存ボタン
         self.play_btn = ttk.Button(
@@ -351,13 +552,64 @@ class BirdcallAnalysisGUI:
             state=tk.DISABLED
         )
         self.stop_btn.grid(row=2, column=2, padx=5, pady=5)
+
+        # まとめて除外（表示中のフレームのクラスタ・時間の範囲）
+        bulk_frame = ttk.Frame(button_frame)
+        bulk_frame.grid(row=3, column=0, columnspan=3, pady=5)
+
+        self.exclude_cluster_btn = ttk.Button(
+            bulk_frame,
+            text="✗ このクラスタを除外",
+            command=self.exclude_current_cluster,
+            state=tk.DISABLED
+        )
+        self.exclude_cluster_btn.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(bulk_frame, text="時間の範囲:").pack(side=tk.LEFT, padx=5)
+        self.exclude_range_var = tk.StringVar(value="")
+        ttk.Entry(bulk_frame, textvariable=self.exclude_range_var, width=14).pack(side=tk.LEFT, padx=5)
+        self.exclude_range_btn = ttk.Button(
+            bulk_frame,
+            text="✗ 範囲を除外",
+            command=self.exclude_time_range,
+            state=tk.DISABLED
+        )
+        self.exclude_range_btn.pack(side=tk.LEFT, padx=5)
+
+        # 再生速度・全再生するクラスタ
+        playback_frame = ttk.Frame(button_frame)
+        playback_frame.grid(row=4, column=0, columnspan=3, pady=5)
+
+        ttk.Label(playback_frame, text="再生速度:").pack(side=tk.LEFT, padx=5)
+        self.play_speed_slider = tk.Scale(
+            playback_frame,
+            from_=1.0,
+            to=4.0,
+            resolution=0.5,
+            orient=tk.HORIZONTAL,
+            length=150,
+            command=self.update_play_speed
+        )
+        self.play_speed_slider.set(self.param_play_speed)
+        self.play_speed_slider.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(playback_frame, text="全再生するクラスタ:").pack(side=tk.LEFT, padx=5)
+        self.play_cluster_combo = ttk.Combobox(
+            playback_frame,
+            values=["すべて"],
+            state="readonly",
+            width=8
+        )
+        self.play_cluster_combo.set("すべて")
+        self.play_cluster_combo.bind("<<ComboboxSelected>>", self.update_play_cluster)
+        self.play_cluster_combo.pack(side=tk.LEFT, padx=5)
         
         # 使い方の説明
         help_text = (
             "使い方：\n"
             "1. WAVファイルを選択して「処理開始」\n"
             "2. 各フレームを「前へ」「次へ」で確認\n"
-            "3. 不要なフレームは「除外」\n"
+            "3. 不要なフレームは「除外」（クラスタ・時間の範囲でまとめても除外できる）\n"
             "4. 「完了」でUMAP可視化へ"
         )
         help_label = tk.Label(
@@ -371,6 +623,9 @@ class BirdcallAnalysisGUI:
         
         # 初期表示を更新
         self.apply_font_size()
+
+        # ウィンドウを表示してから準備運転を始める
+        self.root.after(100, self.start_warmup)
         
     def get_output_dir(self):
         """
@@ -394,7 +649,26 @@ class BirdcallAnalysisGUI:
             )
             raise
 
-        return output_dir    
+        return output_dir
+
+    def build_pipeline(self):
+        """現在のスライダー値で処理パイプラインを作る"""
+        from birdcall.pipeline import BirdcallPipeline
+
+        return BirdcallPipeline(
+            cutoff=self.param_cutoff,
+            top_db=self.param_top_db,
+            analysis_sr=self.param_analysis_sr,
+            frame_length_sec=self.param_frame_length,
+            hop_length_sec=self.param_hop_length,
+            n_mfcc=20,
+            n_clusters=self.param_n_clusters,
+            streaming_min_duration=self.streaming_min_duration,
+            cache=self.feature_cache,
+            umap_model=self.umap_model_path if self.param_reuse_umap else None,
+            memmap_signal=self.param_memmap_signal,
+            extract_workers=self.extract_workers,
+        )
 
     
     def select_file(self):
@@ -420,124 +694,483 @@ class BirdcallAnalysisGUI:
         self.process_btn.config(state=tk.DISABLED)
         self.info_label.config(text="処理中...")
         
-        # 別スレッドで処理を実行
-        thread = threading.Thread(target=self.process_audio, daemon=True)
-        thread.start()
-    
-    def process_audio(self):
-        """音声処理のメイン処理"""
+        # ワーカースレッドで処理を実行（段階ごとの進捗を表示し、「中止」で止められる）
+        self.submit_job(
+            self.process_audio,
+            on_done=self.finish_processing,
+            on_error=self.processing_failed,
+            on_cancel=self.processing_cancelled,
+        )
+
+    # ===== 準備運転 =====
+    def start_numba_threads(self):
+        """
+        UMAP が使う numba のスレッドプールをメインスレッドで起動しておく
+        （ワーカースレッドで初めて起動すると、TBB では終了時に止まることがある）
+        """
+        import numba
+
+        numba.get_num_threads()
+
+    def start_warmup(self):
+        """重いモジュールの読み込みと UMAP の JIT コンパイルをバックグラウンドで済ませておく（メインスレッド）"""
+        if self.warmup_thread is not None:
+            return
+        self.startup_timings["window_sec"] = time.perf_counter() - STARTUP_BEGIN
+        print(
+            f"起動: モジュールの読み込み {IMPORT_SECONDS:.2f} 秒 / "
+            f"ウィンドウの表示まで {self.startup_timings['window_sec']:.2f} 秒"
+        )
+
+        # pyplot とバックエンド（TkAgg）は Tk と同じメインスレッドで読み込む。
+        # get_backend() が自動選択のバックエンドを決めて読み込むので、最初の図の表示が速くなる
+        import matplotlib.pyplot as plt
+
+        plt.get_backend()
+
+        self.start_numba_threads()
+        warmup = self.startup_timings.setdefault("warmup", {})
+
+        def on_step(name, seconds):
+            warmup[name] = round(seconds, 3)
+
+        def run():
+            start = time.perf_counter()
+            try:
+                warm_up(on_step=on_step)
+            except Exception as e:
+                # 準備運転に失敗しても、処理のときに読み込み・コンパイルし直すだけ
+                print(f"準備運転エラー: {e}")
+                return
+            total = time.perf_counter() - start
+            print(f"準備運転 {total:.2f} 秒（" + " / ".join(f"{name} {sec:.2f} 秒" for name, sec in warmup.items()) + "）")
+
+        self.warmup_thread = threading.Thread(target=run, name="warmup", daemon=True)
+        self.warmup_thread.start()
+
+    def wait_for_warmup(self, job):
+        """準備運転が終わるまで待つ（UMAP・近傍探索を準備運転と同時に動かさない。ワーカースレッド）"""
+        if self.warmup_thread is None or not self.warmup_thread.is_alive():
+            return
+        job.stage("準備運転（JIT コンパイル）の完了待ち")
+        while self.warmup_thread.is_alive():
+            job.check()
+            self.warmup_thread.join(0.1)
+
+    # ===== バックグラウンド処理 =====
+    def submit_job(self, func, on_done=None, on_error=None, on_cancel=None):
+        """func(job) をワーカースレッドのキューに入れる"""
+        if self.scheduler is None:
+            self.start_numba_threads()
+            self.scheduler = JobScheduler(lambda callback: self.root.after(0, callback))
+
+        def run(job):
+            try:
+                return func(job)
+            finally:
+                # 段階グラフの進捗の通知先は、このジョブの間だけ
+                if self.stages is not None:
+                    self.stages.context.pop("job", None)
+
+        def finished(handler):
+            def callback(*args):
+                self.active_jobs -= 1
+                if self.active_jobs == 0:
+                    self.cancel_btn.config(state=tk.DISABLED)
+                if handler is not None:
+                    handler(*args)
+            return callback
+
+        self.active_jobs += 1
+        self.cancel_btn.config(state=tk.NORMAL)
+        return self.scheduler.submit(
+            run,
+            on_progress=self.show_progress,
+            on_done=finished(on_done),
+            on_error=finished(on_error),
+            on_cancel=finished(on_cancel),
+        )
+
+    def show_progress(self, progress):
+        """段階名・進み具合・残り時間の見込みを表示"""
+        self.progress_label.config(text=format_progress(progress))
+
+    def cancel_jobs(self):
+        """実行中と待っている処理を中止する（チャンクの区切りで止まる）"""
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+            self.progress_label.config(text="中止しています...")
+
+    def process_audio(self, job):
+        """音声処理のメイン処理（ワーカースレッド）。結果は finish_processing で画面に反映する"""
+        # 出力ディレクトリの作成（WAVと同じフォルダ配下）
+        output_dir = self.get_output_dir()
+
+        pipeline = self.build_pipeline()
+
+        # ===== 段階グラフ =====
+        # 同じファイルなら前回の段階グラフを使い回し、変更したパラメーターの
+        # 影響を受ける段階（例: top_db なら区間抽出から先）だけを再計算する。
+        # ディスクのキャッシュにある段階はそこから読み込む
+        if self.stages is None or self.stages.params["path"] != os.path.abspath(self.file_path):
+            spill_path = None
+            if pipeline.cache is None:
+                # 長時間録音のフィルタ済み信号は出力フォルダの memmap に書き出す
+                spill_path = os.path.join(output_dir, "filtered_signal.f32")
+            self.y = None
+            self.stages = pipeline.build_stages(self.file_path, spill_path=spill_path)
+            # 再生・表示にフィルタ済み信号の標本を使う
+            self.stages.context["need_signal"] = True
+            self.stages.context["pyramid_dir"] = os.path.join(output_dir, "spectrogram_pyramid")
+        else:
+            pipeline.apply_params(self.stages)
+        stages = self.stages
+        stages.context["job"] = job
+        self.run_report = pipeline.new_report(self.file_path, profile=self.profile)
+        self.run_report.info["startup"] = self.startup_timings
+        stages.context["report"] = self.run_report
+        stages.computed.clear()
+        stages.context["cache_hits"].clear()
+        previous = stages.peek("filtered")
+        if pipeline.memmap_signal and previous is not None and not isinstance(previous.y, np.memmap):
+            # メモリ上の信号をファイルに移す
+            stages.invalidate("filtered")
+        if not stages.is_valid("filtered"):
+            # 古いフィルタ済み信号（memmap）を手放してから作り直す
+            self.y = None
+            stages.invalidate("filtered")
+
+        # ===== 音声読み込み・ハイパスフィルタ =====
+        filtered = stages.get("filtered")
+        y, sr = filtered.y, filtered.sr
+        streaming = stages.params["streaming"]
+        print(f"\n録音時間: {len(y) / sr:.2f} 秒" + ("（ストリーミング処理）" if streaming else ""))
+        native_sr = sf.info(self.file_path).samplerate
+        if sr != native_sr:
+            print(f"解析のサンプリング周波数: {sr} Hz（元の録音は {native_sr} Hz）")
+        if "filtered" in stages.computed:
+            print(f"ハイパスフィルタ適用完了（{pipeline.cutoff}Hz以上を抽出）")
+
+        # ===== 鳴き声のある区間だけを抽出 =====
+        segments = stages.get("segments")
+        print(f"抽出された鳴き声区間: {len(segments)}")
+
+        # ===== スペクトログラム =====
+        # 全体の STFT を一度に作らず、多解像度のピラミッドを作っておく（描画はメインスレッド）。
+        # フィルタ済み信号が前回と同じなら保存済みの図をそのまま使う
+        pyramid = None
+        if not stages.is_valid("spectrogram"):
+            pyramid = stages.get("spectrogram")
+
+        # ===== 鳴き声区間をフレーム分割した MFCC 特徴量 =====
+        frame_length, _ = pipeline.frame_samples(sr)
+        frame_features = stages.get("frames")
+
+        mfcc_array = frame_features.features
+        print(f"抽出フレーム数: {len(mfcc_array)}")
+        print(f"特徴量 shape: {mfcc_array.shape}")
+
+        # ===== クラスタリング =====
+        labels = stages.get("labels")
+
+        recomputed = [name for name in stages.computed if name not in stages.context["cache_hits"]]
+        print(f"再計算した段階: {', '.join(recomputed) if recomputed else 'なし'}")
+        if stages.context["cache_hits"]:
+            print(f"キャッシュから読み込んだ段階: {', '.join(sorted(stages.context['cache_hits']))}")
+        self.run_report.info["cache_hits"] = sorted(stages.context["cache_hits"])
+        self.save_run_report(output_dir)
+
+        # ===== 特徴量ストアに追加 =====
+        n_samples = len(y) if y is not None else pipeline.signal_length(self.file_path)
+        self.add_to_store(pipeline.feature_params(streaming), frame_features, labels, sr, n_samples)
+
+        return {
+            "output_dir": output_dir,
+            "y": y,
+            "sr": sr,
+            "segments": segments,
+            "frames": FrameTable(frame_features.starts, frame_features.segment_ids, labels, sr),
+            "mfcc_array": mfcc_array,
+            "feature_params": pipeline.feature_params(streaming),
+            "frame_length": frame_length,
+            "pyramid": pyramid,
+        }
+
+    def add_to_store(self, params, frame_features, labels, sr, n_samples):
+        """処理した録音のフレームを特徴量ストアに追加する（同じ設定なら番号・フラグを書き換える）"""
+        self.store_file_id = None
+        if self.feature_store is None:
+            return
         try:
-            # 出力ディレクトリの作成（WAVと同じフォルダ配下）
-            output_dir = self.get_output_dir()
-            
-            # ===== 音声読み込み =====
-            y_original, sr = librosa.load(self.file_path, sr=None)
-            print(f"\n録音時間: {len(y_original) / sr:.2f} 秒")
-            
-            # ===== 高周波だけを残すハイパスフィルタ =====
-            cutoff = self.param_cutoff
-            b, a = signal.butter(4, cutoff / (sr / 2), btype="high")
-            y = signal.filtfilt(b, a, y_original)
-            print(f"ハイパスフィルタ適用完了（{cutoff}Hz以上を抽出）")
-            
-            # ===== 鳴き声のある区間だけを抽出 =====
-            top_db = self.param_top_db
-            intervals = librosa.effects.split(y, top_db=top_db)
-            
-            segments = []
-            for start, end in intervals:
-                duration = (end - start) / sr
-                if duration >= 0.1:  # 0.1秒以上の音だけ採用
-                    segments.append((start, end))
-            
-            print(f"抽出された鳴き声区間: {len(segments)}")
-            self.segments = segments
-            
-            # ===== スペクトログラム表示 =====
-            plt.figure(figsize=(12, 4))
-            D = librosa.amplitude_to_db(
-                np.abs(librosa.stft(y, n_fft=2048, hop_length=512)), ref=np.max
+            self.store_file_id = self.feature_store.ingest(
+                self.file_path,
+                frame_features.features,
+                frame_features.starts,
+                frame_features.segment_ids,
+                labels,
+                sr,
+                n_samples,
+                params=params,
             )
-            librosa.display.specshow(D, sr=sr, x_axis="time", y_axis="hz")
-            plt.colorbar(format="%+2.0f dB")
-            plt.title("Spectrogram (Full Audio)")
-            plt.tight_layout()
-            
+        except (OSError, ValueError) as e:
+            print(f"特徴量ストアに追加できません: {e}")
+
+    def update_store(self, labels=None, keep=None):
+        """特徴量ストアのクラスタ番号・残すフラグを書き換える"""
+        if self.feature_store is None or self.store_file_id is None:
+            return
+        try:
+            self.feature_store.update(self.store_file_id, labels=labels, keep=keep)
+        except OSError as e:
+            print(f"特徴量ストアを更新できません: {e}")
+
+    def save_run_report(self, output_dir):
+        """段階ごとの計測結果を表示して run_report.json に書く（以後の段階も同じレポートに追記する）"""
+        from birdcall.pipeline import REPORT_NAME
+
+        print(self.run_report.format())
+        report_path = os.path.join(output_dir, REPORT_NAME)
+        self.run_report.save(report_path)
+        print(f"実行レポートを保存しました: {report_path}")
+
+    def finish_processing(self, result):
+        """処理結果を保存し、スペクトログラムを表示（メインスレッド）"""
+        # データを保存
+        self.y = result["y"]
+        self.sr = result["sr"]
+        self.signal_source = (self.file_path, self.param_cutoff)
+        self.segments = result["segments"]
+        # フレームの区間番号は self.segments の添字
+        self.frames = result["frames"]
+        self.mfcc_array = result["mfcc_array"]
+        self.feature_params = result["feature_params"]
+        self.frame_length = result["frame_length"]
+        self.current_index = 0
+        self.processing_done = True
+
+        self.enable_filtering_ui()
+
+        # ===== スペクトログラム表示 =====
+        # 全体表示は粗いレベル、拡大すると表示範囲の細かいレベルだけを読み込む
+        pyramid = result["pyramid"]
+        if pyramid is not None:
+            import matplotlib.pyplot as plt
+
+            from birdcall import plots
+
+            fig = plt.figure(figsize=(12, 4))
+            ax, img = plots.draw_pyramid_spectrogram(fig, pyramid)
+
             # 画像を保存
-            spectrogram_path = os.path.join(output_dir, "spectrogram_full_audio.png")
-            plt.savefig(spectrogram_path, dpi=150, bbox_inches="tight")
+            spectrogram_path = os.path.join(result["output_dir"], "spectrogram_full_audio.png")
+            plots.save_figure(fig, spectrogram_path)
             print(f"フルオーディオのスペクトログラムを保存しました: {spectrogram_path}")
+            plots.follow_zoom(ax, img, pyramid)
             plt.show()
-            
-            # ===== 鳴き声区間だけをフレーム分割 =====
-            frame_length_sec = self.param_frame_length
-            hop_length_sec = self.param_hop_length
-            frame_length = int(sr * frame_length_sec)
-            hop_length = int(sr * hop_length_sec)
-            
-            mfcc_list = []
-            frame_times = []
-            
-            for start, end in segments:
-                segment = y[start:end]
-
-                for i in range(0, len(segment), hop_length):
-                    frame = segment[i : i + frame_length]
-                    if len(frame) < frame_length:
-                        break
-
-                    # 無音判定
-                    if np.max(np.abs(frame)) < 0.01:
-                        continue
-
-                    # 元の録音時間に戻す
-                    frame_times.append((start + i) / sr)
-
-                    mfcc = librosa.feature.mfcc(y=frame, sr=sr, n_mfcc=20)
-                    mfcc_mean = np.mean(mfcc, axis=1)
-                    mfcc_std = np.std(mfcc, axis=1)
-                    feature = np.concatenate([mfcc_mean, mfcc_std])
-                    mfcc_list.append(feature)
-
-            mfcc_array = np.array(mfcc_list)
-            print(f"抽出フレーム数: {len(mfcc_array)}")
-            print(f"特徴量 shape: {mfcc_array.shape}")
-            
-            # ===== クラスタリング =====
-            k = 4
-            kmeans = KMeans(n_clusters=k, random_state=0)
-            labels = kmeans.fit_predict(mfcc_array)
-            
-            # データを保存
-            self.y = y
-            self.sr = sr
-            self.frame_times = frame_times
-            self.mfcc_array = mfcc_array
-            self.labels = labels
-            self.frame_length = frame_length
-            self.keep_flags = [True] * len(frame_times)
-            self.current_index = 0
-            self.processing_done = True
-            
-            # GUIを更新（メインスレッドで実行）
-            self.root.after(0, self.enable_filtering_ui)
-            
-        except Exception as e:
-            print(f"処理エラー: {e}")
-            self.root.after(0, lambda: messagebox.showerror("処理エラー", f"処理中にエラーが発生しました：\n{e}"))
-            self.root.after(0, lambda: self.process_btn.config(state=tk.NORMAL))
+
+    # ===== セッションの保存・復元 =====
+    def save_session(self):
+        """確認中の状態（信号・特徴量・クラスタ・除外・UMAP・確認位置）をセッションのフォルダに保存"""
+        if not self.processing_done:
+            messagebox.showwarning("警告", "処理が完了していません")
+            return
+
+        name = os.path.splitext(os.path.basename(self.file_path))[0]
+        path = filedialog.asksaveasfilename(
+            title="セッションの保存先を指定してください",
+            initialdir=self.get_output_dir(),
+            initialfile=f"{name}.session",
+        )
+        if not path:
+            return
+
+        # 別の WAV を再生ソースにしているときは、フィルタ済み信号と両方を保存する
+        filtered = self.stages.peek("filtered") if self.stages is not None else None
+        if filtered is None or filtered.y is self.y:
+            signal, playback = self.y, None
+        else:
+            signal, playback = filtered.y, (self.y, self.sr)
+
+        # 画面で書き換わる列（除外・UMAP の座標）は今の状態を写して渡す
+        frames = FrameTable(
+            self.frames.starts,
+            self.frames.segment_ids,
+            self.frames.labels,
+            self.frames.sr,
+            keep=self.frames.keep.copy(),
+            points=self.frames.points.copy(),
+        )
+        info = {
+            "file_path": os.path.abspath(self.file_path),
+            "params": {
+                "frame_length": self.param_frame_length,
+                "hop_length": self.param_hop_length,
+                "cutoff": self.param_cutoff,
+                "analysis_sr": self.param_analysis_sr,
+                "top_db": self.param_top_db,
+                "n_clusters": self.param_n_clusters,
+                "reuse_umap": self.param_reuse_umap,
+                "memmap_signal": self.param_memmap_signal,
+            },
+            "feature_params": self.feature_params,
+            "frame_length": self.frame_length,
+            "current_index": self.current_index,
+        }
+
+        def run(job):
+            job.stage("セッションの保存")
+            save_session(
+                path,
+                signal,
+                frames.sr,
+                self.segments,
+                frames,
+                self.mfcc_array,
+                info,
+                playback=playback,
+                on_progress=job.progress,
+            )
+
+        def done(_):
+            print(f"セッションを保存しました: {path}")
+            self.progress_label.config(text="セッションを保存しました")
+
+        def failed(e):
+            print(f"セッションの保存エラー: {e}")
+            messagebox.showerror("エラー", f"セッションを保存できませんでした：\n{e}")
+
+        self.submit_job(
+            run,
+            on_done=done,
+            on_error=failed,
+            on_cancel=lambda: self.progress_label.config(text="セッションの保存を中止しました"),
+        )
+
+    def open_session(self):
+        """保存したセッションを開いて、続きから確認する"""
+        path = filedialog.askdirectory(title="セッションのフォルダ（.session）を選択してください")
+        if not path:
+            return
+        if not is_session(path):
+            messagebox.showerror("エラー", f"セッションのフォルダではありません：\n{path}")
+            return
+
+        def failed(e):
+            print(f"セッションの読み込みエラー: {e}")
+            messagebox.showerror("エラー", f"セッションを開けませんでした：\n{e}")
+
+        self.submit_job(lambda job: load_session(path), on_done=self.restore_session, on_error=failed)
+
+    def restore_session(self, session):
+        """開いたセッションを画面に反映する（メインスレッド）"""
+        if self.auto_play_mode:
+            self.stop_auto_play()
+        info = session.info
+
+        # パラメーターを保存時の値に戻す
+        params = info["params"]
+        for slider, update, value in (
+            (self.frame_length_slider, self.update_frame_length, params["frame_length"]),
+            (self.hop_length_slider, self.update_hop_length, params["hop_length"]),
+            (self.cutoff_slider, self.update_cutoff, params["cutoff"]),
+            (self.top_db_slider, self.update_top_db, params["top_db"]),
+            (self.n_clusters_slider, self.update_n_clusters, params["n_clusters"]),
+        ):
+            slider.set(value)
+            update(value)
+        self.reuse_umap_var.set(params["reuse_umap"])
+        self.param_reuse_umap = params["reuse_umap"]
+        self.memmap_signal_var.set(params["memmap_signal"])
+        self.param_memmap_signal = params["memmap_signal"]
+        self.set_analysis_sr(params.get("analysis_sr"))
+
+        self.file_path = info["file_path"]
+        self.file_path_var.set(os.path.basename(self.file_path))
+        self.y, self.sr = session.playback or (session.signal, session.sr)
+        self.signal_source = None if session.playback else (self.file_path, params["cutoff"])
+        self.segments = session.segments
+        self.frames = session.frames
+        self.mfcc_array = session.features.features
+        self.feature_params = info["feature_params"]
+        self.frame_length = info["frame_length"]
+        self.current_index = min(info["current_index"], len(self.frames))
+        self.stages = self.session_stages(session)
+
+        # 特徴量ストアに追加済みなら、除外・クラスタの変更をそこに書き戻す
+        self.store_file_id = None
+        if self.feature_store is not None:
+            entry = self.feature_store.find(self.file_path, self.feature_params)
+            if entry is not None and entry["frames"] == len(self.frames):
+                self.store_file_id = entry["id"]
+
+        self.processing_done = True
+        print(
+            f"セッションを開きました: {os.path.basename(self.file_path)}"
+            f"（{len(self.frames)} フレーム、除外済み {self.frames.n_excluded}）"
+        )
+        self.enable_filtering_ui()
+
+    def session_stages(self, session):
+        """セッションの値を計算済みとして登録した段階グラフ（パラメーターを変えた段階だけ再計算する）"""
+        from birdcall.pipeline import FilteredSignal
+
+        pipeline = self.build_pipeline()
+        output_dir = self.get_output_dir()
+        spill_path = None
+        if pipeline.cache is None:
+            spill_path = os.path.join(output_dir, "filtered_signal.f32")
+        stages = pipeline.build_stages(self.file_path, spill_path=spill_path)
+        stages.context["need_signal"] = True
+        stages.context["pyramid_dir"] = os.path.join(output_dir, "spectrogram_pyramid")
+
+        stages.seed("filtered", FilteredSignal(session.signal, session.sr))
+        stages.seed("segments", session.segments)
+        stages.seed("frames", session.features)
+        stages.seed("labels", session.frames.labels)
+        # UMAP の座標は、そのとき残していたフレームの埋め込みとして戻す
+        embedded = np.isfinite(session.frames.points[:, 0])
+        if embedded.any():
+            stages.set(keep=np.packbits(embedded).tobytes())
+            stages.seed("embedding", np.asarray(session.frames.points[embedded]))
+
+        self.run_report = pipeline.new_report(self.file_path, profile=self.profile)
+        self.run_report.info["startup"] = self.startup_timings
+        stages.context["report"] = self.run_report
+        return stages
+
+    def processing_failed(self, e):
+        """処理エラーを表示"""
+        print(f"処理エラー: {e}")
+        self.progress_label.config(text="")
+        messagebox.showerror("処理エラー", f"処理中にエラーが発生しました：\n{e}")
+        self.process_btn.config(state=tk.NORMAL)
+
+    def processing_cancelled(self):
+        """中止した処理の後始末（計算済みの段階は次回そのまま使われる）"""
+        print("処理を中止しました")
+        self.progress_label.config(text="処理を中止しました")
+        self.info_label.config(text="ファイルを選択して処理を開始してください")
+        self.process_btn.config(state=tk.NORMAL)
+        if self.processing_done:
+            self.update_info()
     
     def enable_filtering_ui(self):
         """フィルタリングUIを有効化"""
         self.audio_path_var.set(f"{os.path.basename(self.file_path)}")
         self.select_wav_btn.config(state=tk.NORMAL)
+        self.k_sweep_btn.config(state=tk.NORMAL)
+        self.update_play_cluster_choices()
         self.prev_btn.config(state=tk.NORMAL)
         self.next_btn.config(state=tk.NORMAL)
         self.play_btn.config(state=tk.NORMAL)
         self.exclude_btn.config(state=tk.NORMAL)
+        self.exclude_cluster_btn.config(state=tk.NORMAL)
+        self.exclude_range_btn.config(state=tk.NORMAL)
+        self.similar_btn.config(state=tk.NORMAL)
         self.save_btn.config(state=tk.NORMAL)
         self.auto_play_btn.config(state=tk.NORMAL)
         self.finish_btn.config(state=tk.NORMAL)
+        self.save_session_btn.config(state=tk.NORMAL)
         self.process_btn.config(state=tk.NORMAL)  # 再処理可能にする
         self.update_info()
     
@@ -549,13 +1182,29 @@ class BirdcallAnalysisGUI:
         )
         if not file_path:
             return
+
+        import librosa
+
+        from birdcall.resample import analysis_rate, iter_resampled, resample
+        from birdcall.stream import iter_blocks, write_signal
         
         try:
-            y_new, sr_new = librosa.load(file_path, sr=None)
+            # 解析の周波数より高い録音は、処理した信号と同じく間引いて再生する
+            native_sr = sf.info(file_path).samplerate
+            sr_new = analysis_rate(native_sr, self.param_analysis_sr)
+            if self.param_memmap_signal:
+                # ブロックごとに読んでファイルに書き、memmap で開く（全体をメモリに載せない）
+                self.y = None
+                playback_path = os.path.join(self.get_output_dir(), "playback_signal.f32")
+                y_new = write_signal(playback_path, iter_resampled(iter_blocks(file_path), native_sr, sr_new))
+            else:
+                y_new, _ = librosa.load(file_path, sr=None)
+                y_new = resample(y_new, native_sr, sr_new)
             self.y = y_new
             self.sr = sr_new
+            self.signal_source = (file_path, None)
             self.frame_length = int(self.param_frame_length * self.sr)
-            duration = librosa.get_duration(y=self.y, sr=self.sr)
+            duration = len(self.y) / self.sr
             display_text = f"{os.path.basename(file_path)} ({duration:.2f}s, {self.sr}Hz)"
             self.audio_path_var.set(display_text)
             messagebox.showinfo("読み込み完了", f"WAVファイルを読み込みました：\n{display_text}")
@@ -604,41 +1253,146 @@ class BirdcallAnalysisGUI:
         self.param_cutoff = int(value)
         self.cutoff_value_label.config(text=f"{self.param_cutoff} Hz")
     
+    def update_analysis_sr(self, event=None):
+        """解析のサンプリング周波数を更新（次の「処理開始」から反映）"""
+        value = self.analysis_sr_combo.get()
+        self.param_analysis_sr = None if value == self.analysis_sr_choices[0] else int(value)
+
+    def set_analysis_sr(self, analysis_sr):
+        """解析のサンプリング周波数を画面と設定に反映する"""
+        self.analysis_sr_combo.set(self.analysis_sr_choices[0] if analysis_sr is None else str(analysis_sr))
+        self.param_analysis_sr = analysis_sr
+
     def update_top_db(self, value):
         """エネルギー閾値パラメーターを更新"""
         self.param_top_db = int(value)
         self.top_db_value_label.config(text=f"{self.param_top_db}")
+
+    def update_n_clusters(self, value):
+        """クラスタ数パラメーターを更新（次の「処理開始」ではクラスタリングだけ再計算）"""
+        self.param_n_clusters = int(value)
+        self.n_clusters_value_label.config(text=f"{self.param_n_clusters}")
+
+    def start_k_sweep(self):
+        """抽出済みの特徴量でクラスタ数 k の候補を評価する"""
+        if not self.processing_done or self.mfcc_array is None:
+            messagebox.showwarning("警告", "処理が完了していません")
+            return
+
+        self.k_sweep_btn.config(state=tk.DISABLED)
+        self.progress_label.config(text="クラスタ数を評価中...")
+        self.submit_job(
+            self.run_k_sweep,
+            on_done=self.finish_k_sweep,
+            on_error=self.k_sweep_failed,
+            on_cancel=lambda: self.k_sweep_btn.config(state=tk.NORMAL),
+        )
+
+    def run_k_sweep(self, job):
+        """k=2〜10 を別プロセスで並列に評価し、推奨の k で分類し直す（ワーカースレッド）"""
+        from birdcall.ksweep import DEFAULT_K_VALUES, format_scores, suggest_k, sweep_k
+
+        print("\nクラスタ数 k を評価しています...")
+        k_values = [k for k in DEFAULT_K_VALUES if k < len(self.mfcc_array)]
+        done = []
+
+        def on_done(score):
+            print(f"  k={score.k}: シルエット {score.silhouette:.4f}")
+            done.append(score.k)
+            job.progress(len(done), len(k_values))
+
+        job.stage("クラスタ数の評価")
+        scores = sweep_k(self.mfcc_array, k_values, on_done=on_done)
+        k = suggest_k(scores)
+        print(format_scores(scores, k))
+        if k is None:
+            raise ValueError("評価できる k がありませんでした")
+        print(f"推奨のクラスタ数: k = {k}")
+
+        # 特徴量はそのままで、クラスタリングだけを計算し直す
+        self.stages.context["job"] = job
+        self.stages.set(n_clusters=k)
+        labels = self.stages.get("labels")
+        self.update_store(labels=labels)
+        return k, labels
+
+    def finish_k_sweep(self, result):
+        """推奨の k をスライダーに反映"""
+        k, labels = result
+        self.frames.set_labels(labels)
+        self.n_clusters_slider.set(k)
+        self.param_n_clusters = k
+        self.n_clusters_value_label.config(text=f"{k}")
+        self.k_sweep_btn.config(state=tk.NORMAL)
+        self.update_play_cluster_choices()
+        self.update_info()
+
+    def k_sweep_failed(self, e):
+        """クラスタ数の評価エラーを表示"""
+        print(f"クラスタ数の評価エラー: {e}")
+        messagebox.showerror("エラー", f"クラスタ数の評価中にエラーが発生しました：\n{e}")
+        self.k_sweep_btn.config(state=tk.NORMAL)
+
+    def update_play_speed(self, value):
+        """再生速度を更新（次に再生するフレームから反映）"""
+        self.param_play_speed = float(value)
+
+    def update_play_cluster(self, event=None):
+        """全再生するクラスタを更新"""
+        value = self.play_cluster_combo.get()
+        self.param_play_cluster = None if value == "すべて" else int(value)
+
+    def update_play_cluster_choices(self):
+        """クラスタの選択肢を現在のクラスタ番号に合わせる"""
+        clusters = [str(c) for c in self.frames.clusters] if self.frames is not None else []
+        self.play_cluster_combo.config(values=["すべて"] + clusters)
+        if self.play_cluster_combo.get() not in clusters:
+            self.play_cluster_combo.set("すべて")
+        self.update_play_cluster()
+
+    def update_memmap_signal(self):
+        """フィルタ済み信号を memmap で持つかの設定を更新"""
+        self.param_memmap_signal = bool(self.memmap_signal_var.get())
+
+    def update_reuse_umap(self):
+        """UMAP マップの保存・再利用の設定を更新（処理済みなら「完了」時から反映）"""
+        self.param_reuse_umap = bool(self.reuse_umap_var.get())
+        if self.stages is not None:
+            self.stages.set(umap_model=self.umap_model_path if self.param_reuse_umap else None)
     
     def update_info(self):
         """現在のフレーム情報を更新"""
         if not self.processing_done:
             return
         
-        if self.current_index >= len(self.frame_times):
+        if self.current_index >= len(self.frames):
             self.info_label.config(
                 text="すべてのフレームを確認しました。\n「完了」をクリックしてください。"
             )
             self.play_btn.config(state=tk.DISABLED)
             self.exclude_btn.config(state=tk.DISABLED)
+            self.exclude_cluster_btn.config(state=tk.DISABLED)
+            self.similar_btn.config(state=tk.DISABLED)
             self.prev_btn.config(state=tk.DISABLED)
             self.next_btn.config(state=tk.DISABLED)
             self.auto_play_btn.config(state=tk.DISABLED)
             return
         
-        frame_time = self.frame_times[self.current_index]
-        cluster = self.labels[self.current_index]
-        status = "保持" if self.keep_flags[self.current_index] else "除外済み"
-        excluded_count = sum(1 for f in self.keep_flags if not f)
+        frame_time = self.frames.time(self.current_index)
+        cluster = self.frames.labels[self.current_index]
+        status = "保持" if self.frames.keep[self.current_index] else "除外済み"
+        cluster_kept, cluster_total = self.frames.cluster_counts(cluster)
         
         info_text = (
-            f"フレーム {self.current_index + 1} / {len(self.frame_times)}\n"
+            f"フレーム {self.current_index + 1} / {len(self.frames)}\n"
             f"時間: {frame_time:.2f} 秒\n"
-            f"クラスタ: {cluster}\n"
+            f"クラスタ: {cluster}（保持 {cluster_kept} / {cluster_total}）\n"
             f"状態: {status}"
         )
         self.info_label.config(text=info_text)
         
-        progress_text = f"除外済み: {excluded_count} / {len(self.frame_times)}"
+        # 除外数は除外のたびに数えてあるので、フレームが多くても数え直さない
+        progress_text = f"除外済み: {self.frames.n_excluded} / {len(self.frames)}"
         self.progress_label.config(text=progress_text)
         
         # 前へボタンの有効/無効を制御
@@ -648,42 +1402,54 @@ class BirdcallAnalysisGUI:
             self.prev_btn.config(state=tk.NORMAL)
         
         # 次へボタンの有効/無効を制御
-        if self.current_index >= len(self.frame_times) - 1:
+        if self.current_index >= len(self.frames) - 1:
             self.next_btn.config(state=tk.DISABLED)
         else:
             self.next_btn.config(state=tk.NORMAL)
     
     def play_current(self):
         """現在のフレームを再生"""
-        if not self.processing_done or self.current_index >= len(self.frame_times):
+        if not self.processing_done or self.current_index >= len(self.frames):
             return
         
-        if self.is_playing:
-            return
+        # 再生中でもすぐに差し替える（ストリームは開いたままなので待ち時間がない）
+        def on_end():
+            self.is_playing = False
+            self.root.after(0, self.update_info)
         
-        def play_audio():
+        try:
             self.is_playing = True
-            self.play_btn.config(state=tk.DISABLED)
-            self.prev_btn.config(state=tk.DISABLED)
-            self.next_btn.config(state=tk.DISABLED)
-            
-            try:
-                frame_time = self.frame_times[self.current_index]
-                start_sample = int(frame_time * self.sr)
-                end_sample = min(start_sample + self.frame_length, len(self.y))
-                frame_audio = self.y[start_sample:end_sample]
-                
-                sd.play(frame_audio, self.sr)
-                sd.wait()
-            except Exception as e:
-                print(f"再生エラー: {e}")
-            finally:
-                self.is_playing = False
-                self.root.after(0, lambda: self.play_btn.config(state=tk.NORMAL))
-                self.root.after(0, self.update_info)
+            self.playback.play(
+                self.y,
+                self.sr,
+                [self.frame_range(self.current_index)],
+                speed=self.param_play_speed,
+                on_end=on_end,
+            )
+        except Exception as e:
+            self.is_playing = False
+            print(f"再生エラー: {e}")
+
+    def frame_range(self, i):
+        """フレーム i の (番号, 開始サンプル, 終了サンプル)"""
+        start_sample = int(self.frames.time(i) * self.sr)
+        end_sample = min(start_sample + self.frame_length, len(self.y))
+        return i, start_sample, end_sample
+
+    def frame_ranges(self, indices):
+        """フレームの番号の配列に対する frame_range の並び（まとめて計算する）"""
+        starts = (self.frames.times[indices] * self.sr).astype(np.int64)
+        ends = np.minimum(starts + self.frame_length, len(self.y))
+        return list(zip(indices.tolist(), starts.tolist(), ends.tolist()))
+    
+    def play_frame(self, i):
+        """フレーム i に移動して再生"""
+        if not self.processing_done or i >= len(self.frames):
+            return
         
-        thread = threading.Thread(target=play_audio, daemon=True)
-        thread.start()
+        self.current_index = i
+        self.update_info()
+        self.play_current()
     
     def play_prev(self):
         """前のフレームに移動して再生"""
@@ -696,7 +1462,7 @@ class BirdcallAnalysisGUI:
     
     def play_next(self):
         """次のフレームに移動して再生"""
-        if self.current_index >= len(self.frame_times) - 1:
+        if self.current_index >= len(self.frames) - 1:
             return
         
         self.current_index += 1
@@ -705,17 +1471,193 @@ class BirdcallAnalysisGUI:
     
     def exclude_current(self):
         """現在のフレームを除外"""
-        if not self.processing_done or self.current_index >= len(self.frame_times):
+        if not self.processing_done or self.current_index >= len(self.frames):
             return
         
-        self.keep_flags[self.current_index] = False
+        self.frames.exclude(self.current_index)
+        self.update_info()
+
+    def exclude_current_cluster(self):
+        """現在のフレームのクラスタをすべて除外"""
+        if not self.processing_done or self.current_index >= len(self.frames):
+            return
+
+        cluster = self.frames.labels[self.current_index]
+        count = self.frames.exclude_cluster(cluster)
+        print(f"クラスタ {cluster} の {count} フレームを除外しました")
+        self.update_info()
+
+    def exclude_time_range(self):
+        """入力した時間の範囲（例: 03:10-03:40）に始まるフレームをすべて除外"""
+        if not self.processing_done:
+            return
+
+        try:
+            start, end = parse_time_range(self.exclude_range_var.get())
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
+            return
+        count = self.frames.exclude_time(start, end)
+        print(f"{start:.2f}〜{end:.2f} 秒の {count} フレームを除外しました")
         self.update_info()
+
+    # ===== 似た鳴き声の検索 =====
+    def find_similar(self):
+        """現在のフレームに似たフレームを探し、近い順につなげて再生する"""
+        if not self.processing_done or self.current_index >= len(self.frames):
+            return
+
+        i = self.current_index
+        if self.similar_index is not None and self.similar_index_fresh(self.similar_index):
+            self.show_similar(self.similar_index, i)
+            return
+
+        # インデックスの読み込み・作成はワーカースレッドで行う（検索そのものは数ミリ秒）
+        self.similar_btn.config(state=tk.DISABLED)
+
+        def failed(e):
+            print(f"類似検索エラー: {e}")
+            messagebox.showerror("エラー", f"似た鳴き声の検索中にエラーが発生しました：\n{e}")
+            self.similar_btn.config(state=tk.NORMAL)
+
+        self.submit_job(
+            self.load_similar_index,
+            on_done=lambda index: self.show_similar(index, i),
+            on_error=failed,
+            on_cancel=lambda: self.similar_btn.config(state=tk.NORMAL),
+        )
+
+    def similar_index_fresh(self, index):
+        """インデックスが今の特徴量の設定・ストアの内容で作ったものか"""
+        if not index.compatible(self.feature_params, self.mfcc_array.shape[1]):
+            return False
+        path = os.path.abspath(self.file_path)
+        if self.feature_store is not None and self.store_file_id is not None:
+            return index.store_frames == self.feature_store.n_frames and index.paths.get(self.store_file_id) == path
+        # ストアを使えないときは、この録音のフレームだけで作ったもの
+        return index.store_frames is None and index.paths.get(-1) == path and index.n_frames == len(self.mfcc_array)
+
+    def load_similar_index(self, job):
+        """保存済みのインデックスを読むか、ストア（なければこの録音）のフレームで作る（ワーカースレッド）"""
+        self.wait_for_warmup(job)
+        job.stage("類似検索の準備")
+        if self.feature_store is None or self.store_file_id is None:
+            n = len(self.mfcc_array)
+            return SimilarityIndex(
+                self.mfcc_array,
+                params=self.feature_params,
+                meta={"file_id": np.full(n, -1), "start": self.frames.starts},
+                paths={-1: os.path.abspath(self.file_path)},
+            )
+
+        try:
+            index = SimilarityIndex.load(self.similar_index_path)
+        except Exception as e:
+            print(f"保存した類似検索のインデックスを読み込めません: {e}")
+            index = None
+        if index is not None and self.similar_index_fresh(index):
+            print(f"類似検索のインデックスを読み込みました: {self.similar_index_path}")
+            return index
+
+        job.stage("類似検索のインデックス作成")
+        index = SimilarityIndex.from_store(self.feature_store, self.feature_params)
+        print(f"類似検索のインデックスを作成しました: {index.n_frames} フレーム / {len(index.paths)} 録音")
+        try:
+            index.save(self.similar_index_path)
+        except OSError as e:
+            print(f"類似検索のインデックスを保存できません: {e}")
+        return index
+
+    def show_similar(self, index, i):
+        """フレーム i に似たフレームを表示し、近い順に再生する（メインスレッド）"""
+        self.similar_index = index
+        self.similar_btn.config(state=tk.NORMAL)
+        file_id = -1 if index.store_frames is None else self.store_file_id
+        row = index.find_row(file_id, self.frames.starts[i])
+        neighbors = index.query(self.mfcc_array[i], k=self.similar_k, exclude=None if row is None else [row])
+
+        print(f"\nフレーム {i + 1}（{self.frames.time(i):.2f} 秒）に似たフレーム:")
+        from birdcall.resample import analysis_rate
+
+        current = os.path.abspath(self.file_path)
+        # 再生用に別の WAV を選んでいても、この録音の開始サンプルは解析の周波数で数えている
+        srs = {current: self.frames.sr}
+        # ほかの録音の開始サンプルも、同じ解析の周波数（録音の方が低ければ録音の周波数）で数えている
+        analysis_sr = (self.feature_params or {}).get("analysis_sr")
+        hits = []
+        for rank, (r, distance) in enumerate(zip(neighbors.rows, neighbors.distances)):
+            path = index.paths[int(index.meta["file_id"][r])]
+            start = int(index.meta["start"][r])
+            if path not in srs:
+                try:
+                    srs[path] = analysis_rate(sf.info(path).samplerate, analysis_sr)
+                except RuntimeError:
+                    srs[path] = None
+            hits.append((path, start, srs[path]))
+            when = f"{start / srs[path]:.2f} 秒" if srs[path] else f"{start} サンプル"
+            print(f"  {rank + 1:3d}. 距離 {distance:6.3f}  {os.path.basename(path)}  {when}")
+
+        y, sr, frames = self.similar_clips(hits)
+        if not frames:
+            self.progress_label.config(text="再生できる似たフレームがありません")
+            return
+
+        def on_frame(n):
+            path, start, sr = hits[n]
+            text = f"似たフレーム {n + 1} / {len(hits)}: {os.path.basename(path)} {start / sr:.2f} 秒"
+            self.root.after(0, lambda: self.progress_label.config(text=text))
+
+        try:
+            self.playback.play(y, sr, frames, speed=self.param_play_speed, on_frame=on_frame)
+        except Exception as e:
+            print(f"再生エラー: {e}")
+
+    def similar_clips(self, hits):
+        """
+        (録音のパス, 開始サンプル, サンプリング周波数) の並びの音声をつなげた信号とその周波数、
+        再生する (番号, 開始, 終了) の並び。この録音のフレームはフィルタ済み信号から
+        （再生用に別の WAV を選んでいても）、ほかの録音は WAV から直接読んで同じハイパスをかける
+        （解析の周波数が違う録音は飛ばし、間引いた録音は読んでから間引く）
+        """
+        from birdcall.resample import read_clip
+
+        current = os.path.abspath(self.file_path)
+        # 解析した録音の値（段階グラフは処理かセッションの読み込みで作られている）
+        filtered = self.stages.peek("filtered")
+        filtered_y = filtered.y if filtered is not None else None
+        sr_analysis = self.frames.sr
+        cutoff = self.stages.params["cutoff"]
+        frame_length = int(self.stages.params["frame_length_sec"] * sr_analysis)
+        clips = []
+        frames = []
+        offset = 0
+        for n, (path, start, sr) in enumerate(hits):
+            if sr != sr_analysis:
+                continue
+            try:
+                if path == current and filtered_y is not None:
+                    clip = np.asarray(filtered_y[start:start + frame_length], dtype=np.float32)
+                else:
+                    clip = read_clip(path, start, frame_length, sr, cutoff=cutoff)
+            except (OSError, RuntimeError) as e:
+                print(f"読み込めません: {path}: {e}")
+                continue
+            clips.append(clip)
+            frames.append((n, offset, offset + len(clip)))
+            offset += len(clip)
+        y = np.concatenate(clips) if clips else np.zeros(0, dtype=np.float32)
+        return y, sr_analysis, frames
     
     def save_all_frames(self):
-        """除外していないすべてのフレームを一括保存"""
-        frames_to_save = [i for i, keep in enumerate(self.keep_flags) if keep]
+        """除外していないすべてのフレームを一括保存（書き出し中に押すと中止）"""
+        if self.export_cancel is not None:
+            self.export_cancel.set()
+            self.progress_label.config(text="保存を中止しています...")
+            return
+
+        frames_to_save = self.frames.kept_rows()
         
-        if not frames_to_save:
+        if not len(frames_to_save):
             messagebox.showwarning("警告", "保存するフレームがありません。すべて除外されています。")
             return
         
@@ -726,30 +1668,104 @@ class BirdcallAnalysisGUI:
         
         if not save_dir:
             return
-        
+
+        # フレームが多いと小さなファイルが大量にできるので、1 ファイルにまとめることもできる
+        container = messagebox.askyesnocancel(
+            "保存形式",
+            f"{len(frames_to_save)} 個のフレームを 1 つの音声ファイルにまとめて保存しますか？\n\n"
+            "はい: frames.wav と位置・クラスタの索引 frames_index.npy\n"
+            "いいえ: フレームごとの WAV ファイル"
+        )
+        if container is None:
+            return
+
+        # 解析の周波数に間引いた録音は、元の周波数の録音から読み直して保存することもできる
+        original = False
+        if self.signal_source is not None:
+            native_sr = sf.info(self.signal_source[0]).samplerate
+            if native_sr != self.sr:
+                original = messagebox.askyesnocancel(
+                    "サンプリング周波数",
+                    f"元の録音のサンプリング周波数（{native_sr} Hz）で保存しますか？\n\n"
+                    f"はい: {native_sr} Hz（元の録音から読み直す）\n"
+                    f"いいえ: 解析の周波数 {self.sr} Hz"
+                )
+                if original is None:
+                    return
+
+        self.export_cancel = threading.Event()
+        self.save_btn.config(text="■ 保存を中止")
+        thread = threading.Thread(
+            target=self.run_export,
+            args=(save_dir, frames_to_save, container, original),
+            daemon=True
+        )
+        thread.start()
+
+    def run_export(self, save_dir, frames_to_save, container, original=False):
+        """
+        別スレッドでフレームを書き出す（進捗は root.after で画面に反映）。
+        original=True なら元の録音を元のサンプリング周波数で読み、同じハイパスをかけて書く
+        """
+        y, sr, frame_length = self.y, self.sr, self.frame_length
+        if original:
+            from birdcall.resample import OriginalRateSignal
+
+            y = OriginalRateSignal(*self.signal_source)
+            sr = y.sr
+            frame_length = int(self.param_frame_length * sr)
+        frame_ids = np.asarray(frames_to_save)
+        starts = (self.frames.times[frame_ids] * sr).astype(np.int64)
+        labels = self.frames.labels[frame_ids]
+        last_report = [0]
+
+        def on_progress(done, total):
+            # 画面の更新は 1% ごと程度に間引く
+            if done - last_report[0] >= max(1, total // 100) or done == total:
+                last_report[0] = done
+                self.root.after(0, lambda: self.progress_label.config(text=f"保存中: {done} / {total}"))
+
+        exporter = FrameExporter(
+            y,
+            sr,
+            frame_length,
+            on_progress=on_progress,
+            cancel=self.export_cancel,
+        )
         try:
+            if container:
+                out_path = os.path.join(save_dir, "frames.wav")
+                saved_count = exporter.write_container(out_path, frame_ids, starts, labels)
+                print(f"保存: {out_path}")
+                print(f"索引: {index_path(out_path)}")
+            else:
+                saved_count = exporter.write_files(save_dir, frame_ids, starts, labels)
+            error = None
+        except Exception as e:
             saved_count = 0
-            for i in frames_to_save:
-                frame_time = self.frame_times[i]
-                start_sample = int(frame_time * self.sr)
-                end_sample = min(start_sample + self.frame_length, len(self.y))
-                frame_audio = self.y[start_sample:end_sample]
-                
-                file_name = f"frame_{i}_{self.labels[i]}.wav"
-                file_path = os.path.join(save_dir, file_name)
-                
-                sf.write(file_path, frame_audio, self.sr)
-                saved_count += 1
-                print(f"保存: {file_path}")
-            
+            error = str(e)
+            print(f"保存エラー: {e}")
+
+        cancelled = self.export_cancel.is_set()
+        self.root.after(0, self.finish_export, save_dir, saved_count, len(frames_to_save), cancelled, error)
+
+    def finish_export(self, save_dir, saved_count, total, cancelled, error):
+        """書き出しの結果を表示してボタンを戻す"""
+        self.export_cancel = None
+        self.save_btn.config(text="💾 一括保存")
+        self.update_info()
+
+        if error is not None:
+            messagebox.showerror("エラー", f"保存に失敗しました：\n{error}")
+        elif cancelled:
+            messagebox.showinfo("保存中止", f"{saved_count} / {total} 個のフレームを保存したところで中止しました：\n{save_dir}")
+            print(f"\n保存を中止しました（{saved_count} / {total} 個）")
+        else:
             messagebox.showinfo(
                 "保存完了", 
                 f"{saved_count} 個のフレームを保存しました：\n{save_dir}"
             )
             print(f"\n合計 {saved_count} 個のフレームを保存しました")
-        except Exception as e:
-            messagebox.showerror("エラー", f"保存に失敗しました：\n{e}")
-            print(f"保存エラー: {e}")
     
     def start_auto_play(self):
         """全フレームを自動再生"""
@@ -758,40 +1774,52 @@ class BirdcallAnalysisGUI:
         self.stop_btn.config(state=tk.NORMAL)
         self.play_btn.config(state=tk.DISABLED)
         self.exclude_btn.config(state=tk.DISABLED)
+        self.exclude_cluster_btn.config(state=tk.DISABLED)
+        self.similar_btn.config(state=tk.DISABLED)
         self.prev_btn.config(state=tk.DISABLED)
         self.next_btn.config(state=tk.DISABLED)
         self.save_btn.config(state=tk.DISABLED)
         
-        def auto_play():
-            try:
-                while self.auto_play_mode and self.current_index < len(self.frame_times):
-                    frame_time = self.frame_times[self.current_index]
-                    start_sample = int(frame_time * self.sr)
-                    end_sample = min(start_sample + self.frame_length, len(self.y))
-                    frame_audio = self.y[start_sample:end_sample]
-                    
-                    self.root.after(0, self.update_info)
-                    
-                    sd.play(frame_audio, self.sr)
-                    sd.wait()
-                    
-                    self.current_index += 1
-            except Exception as e:
-                print(f"自動再生エラー: {e}")
-            finally:
+        # 現在のフレームから最後まで（クラスタを選んでいればそのクラスタだけ）を
+        # つなげて再生し、鳴っているフレームに current_index を合わせる
+        indices = self.frames.rows(self.current_index, cluster=self.param_play_cluster)
+        if not len(indices):
+            self.stop_auto_play()
+            return
+
+        def on_frame(i):
+            if self.auto_play_mode:
+                self.current_index = i
+                self.root.after(0, self.update_info)
+
+        def on_end():
+            if self.auto_play_mode:
+                self.current_index = int(indices[-1]) + 1
                 self.root.after(0, self.stop_auto_play)
-        
-        thread = threading.Thread(target=auto_play, daemon=True)
-        thread.start()
+
+        try:
+            self.playback.play(
+                self.y,
+                self.sr,
+                self.frame_ranges(indices),
+                speed=self.param_play_speed,
+                on_frame=on_frame,
+                on_end=on_end,
+            )
+        except Exception as e:
+            print(f"自動再生エラー: {e}")
+            self.stop_auto_play()
     
     def stop_auto_play(self):
         """自動再生を停止"""
         self.auto_play_mode = False
-        sd.stop()
+        self.playback.stop()
         self.auto_play_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.play_btn.config(state=tk.NORMAL)
         self.exclude_btn.config(state=tk.NORMAL)
+        self.exclude_cluster_btn.config(state=tk.NORMAL)
+        self.similar_btn.config(state=tk.NORMAL)
         self.save_btn.config(state=tk.NORMAL)
         self.prev_btn.config(state=tk.NORMAL)
         self.next_btn.config(state=tk.NORMAL)
@@ -804,37 +1832,77 @@ class BirdcallAnalysisGUI:
             return
         
         # フィルタリング結果を適用
-        filtered_indices = [i for i in range(len(self.keep_flags)) if self.keep_flags[i]]
-        frame_times = [self.frame_times[i] for i in filtered_indices]
-        mfcc_array = self.mfcc_array[filtered_indices]
-        labels = self.labels[filtered_indices]
-        
-        print(f"フィルタリング完了: {len(filtered_indices)} / {len(self.keep_flags)} フレームを保持")
-        
+        keep_mask = self.frames.keep.copy()
+        filtered_indices = np.flatnonzero(keep_mask)
+        print(f"フィルタリング完了: {len(filtered_indices)} / {len(self.frames)} フレームを保持")
+
+        # UMAP はワーカースレッドで計算する（除外フレームが前回と同じなら埋め込みを再利用）
+        self.finish_btn.config(state=tk.DISABLED)
+        keep = np.packbits(keep_mask).tobytes()
+
+        def embed(job):
+            self.wait_for_warmup(job)
+            self.stages.context["job"] = job
+            self.stages.set(keep=keep)
+            points = self.stages.get("embedding")
+            self.save_run_report(self.get_output_dir())
+            self.update_store(keep=keep_mask)
+            return points
+
+        def failed(e):
+            print(f"UMAP エラー: {e}")
+            messagebox.showerror("エラー", f"UMAP の計算中にエラーが発生しました：\n{e}")
+            self.finish_btn.config(state=tk.NORMAL)
+
+        self.submit_job(
+            embed,
+            on_done=lambda points: self.show_results(filtered_indices, points),
+            on_error=failed,
+            on_cancel=lambda: self.finish_btn.config(state=tk.NORMAL),
+        )
+
+    def show_results(self, filtered_indices, points):
+        """UMAP 可視化とクラスタごとの代表鳴き声を保存・表示"""
+        import librosa
+        import librosa.display
+        import matplotlib.pyplot as plt
+
+        from birdcall import plots
+
+        self.finish_btn.config(state=tk.NORMAL)
+        self.progress_label.config(text="")
+        self.frames.points[:] = np.nan
+        self.frames.points[filtered_indices] = points
+        frame_times = self.frames.times[filtered_indices]
+        labels = self.frames.labels[filtered_indices]
+        segment_ids = self.frames.segment_ids[filtered_indices]
+
         # 出力ディレクトリ（WAVと同じフォルダ配下）
         output_dir = self.get_output_dir()
         
-        # UMAP 可視化
-        umap = UMAP(n_components=2, random_state=0)
-        points = umap.fit_transform(mfcc_array)
-        
-        plt.figure(figsize=(8, 6))
-        plt.scatter(points[:, 0], points[:, 1], c=labels, cmap="tab10")
-        plt.title("Bird Call Clustering (UMAP)")
-        plt.xlabel("UMAP Dimension 1")
-        plt.ylabel("UMAP Dimension 2")
+        fig = plt.figure(figsize=(8, 6))
+        ax = plots.draw_umap(fig, points, labels)
         
         umap_path = os.path.join(output_dir, "cluster_visualization_umap.png")
-        plt.savefig(umap_path, dpi=150, bbox_inches="tight")
+        plots.save_figure(fig, umap_path)
         print(f"UMAP可視化を保存しました: {umap_path}")
+        # 点をクリックすると、そのフレームに移動して再生する
+        plots.pick_nearest(ax, points, lambda i: self.play_frame(int(filtered_indices[i])))
         plt.show()
         
         # クラスタごとの代表鳴き声を保存
         num_samples = 10
-        k = len(set(labels))
+        # クラスタ番号は飛び飛びのことがある（「このクラスタを除外」で除いたクラスタは現れない）
+        order = np.argsort(labels, kind="stable")
+        clusters, first = np.unique(labels[order], return_index=True)
+        k = len(clusters)
+
+        # クラスタごとのフレーム番号（安定ソート 1 回で分け、各クラスタ内は時間順のまま）
+        bounds = np.append(first, len(order))
+        cluster_frames = {c: order[bounds[i] : bounds[i + 1]] for i, c in enumerate(clusters)}
         
-        for c in range(k):
-            idx_list = [i for i in range(len(labels)) if labels[i] == c]
+        for c in clusters:
+            idx_list = cluster_frames[c]
         
             if len(idx_list) == 0:
                 print(f"クラスタ {c} にはフレームがありません")
@@ -849,29 +1917,27 @@ class BirdcallAnalysisGUI:
                 if count >= num_samples:
                     break
                 
-                frame_time = frame_times[idx]
+                # フレームの区間は抽出時に記録した番号から直接引く
+                seg_i = int(segment_ids[idx])
+                if seg_i in used_segments:
+                    continue
+                
+                used_segments.add(seg_i)
+                count += 1
+                
+                start, end = self.segments[seg_i]
+                segment_audio = self.y[start:end]
+                out_path = f"{output_dir}/cluster_{c}_seg{seg_i}.wav"
+                sf.write(out_path, segment_audio, self.sr)
                 
-                for seg_i, (start, end) in enumerate(self.segments):
-                    if start / self.sr <= frame_time <= end / self.sr:
-                        if seg_i in used_segments:
-                            break
-                        
-                        used_segments.add(seg_i)
-                        count += 1
-                        
-                        segment_audio = self.y[start:end]
-                        out_path = f"{output_dir}/cluster_{c}_seg{seg_i}.wav"
-                        sf.write(out_path, segment_audio, self.sr)
-                        
-                        print(f"  → 区間 {seg_i} を保存: {out_path}")
-                        break
+                print(f"  → 区間 {seg_i} を保存: {out_path}")
         
         # クラスタごとのスペクトログラム表示
         plt.figure(figsize=(20, 10))
         plot_index = 1
         
-        for c in range(k):
-            idx_list = [i for i in range(len(labels)) if labels[i] == c]
+        for c in clusters:
+            idx_list = cluster_frames[c]
             if len(idx_list) == 0:
                 continue
             
@@ -897,16 +1963,17 @@ class BirdcallAnalysisGUI:
         plt.show()
         
         # クラスタごとの時間帯を表示
-        for c in range(k):
+        for c in clusters:
             print(f"\nクラスタ {c}:")
-            times = [frame_times[i] for i in range(len(labels)) if labels[i] == c]
-            print(times[:100])
+            times = frame_times[cluster_frames[c]]
+            print(times[:100].tolist())
         
         messagebox.showinfo("完了", "すべての処理が完了しました！")
     
     def run(self):
         """GUIを表示して実行"""
         self.root.mainloop()
+        self.playback.close()
 
 
 # ===== メイン処理 =====
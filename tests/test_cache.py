@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from birdcall import pipeline as pipeline_module
+from birdcall.cache import FeatureCache
+from birdcall.pipeline import BirdcallPipeline
+
+SR = 16000
+
+
+@pytest.fixture
+def recording(tmp_path):
+    rng = np.random.default_rng(0)
+    t = np.arange(3 * SR) / SR
+    y = 0.3 * np.sin(2 * np.pi * 5000 * t) * (np.floor(t * 2) % 2 == 0) + 0.001 * rng.standard_normal(len(t))
+    path = str(tmp_path / "rec.wav")
+    sf.write(path, y.astype(np.float32), SR)
+    return path
+
+
+def test_large_signal_does_not_evict_features(tmp_path, recording):
+    # 信号は上限より大きい（長時間録音）が、特徴量は上限に収まる
+    cache = FeatureCache(str(tmp_path / "cache"), max_bytes=1 << 20, max_signal_bytes=1024)
+    pipeline = BirdcallPipeline(streaming_min_duration=0, cache=cache)
+    pipeline.process(recording)
+
+    names = os.listdir(cache.cache_dir)
+    assert any(name.endswith(".npz") for name in names)
+    assert any(name.endswith(".f32") for name in names)
+
+
+def test_cached_features_without_signal_skip_scan(tmp_path, recording, monkeypatch):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    first = BirdcallPipeline(streaming_min_duration=0, cache=cache).process(recording)
+    for _, _, path in cache.entries((".f32",)):
+        os.remove(path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("録音を読み直した")
+
+    monkeypatch.setattr(pipeline_module.StreamingFrontEnd, "scan", fail)
+    monkeypatch.setattr(pipeline_module.StreamingFrontEnd, "run", fail)
+    second = BirdcallPipeline(streaming_min_duration=0, cache=cache).process(recording)
+
+    assert second.y is None
+    assert second.sr == first.sr
+    assert second.segments == first.segments
+    np.testing.assert_array_equal(second.frames.features, first.frames.features)
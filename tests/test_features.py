@@ -0,0 +1,54 @@
+import warnings
+
+import librosa
+import numpy as np
+import pytest
+
+from birdcall.features import MfccExtractor
+
+SR = 48000
+
+
+def chirps(duration=3.0, sr=SR, seed=0):
+    """0.25 秒おきに鳴るチャープと弱い雑音の信号（無音のフレームを含む）"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    tone = 0.3 * np.sin(2 * np.pi * (3000 + 800 * np.sin(2 * np.pi * 2 * t)) * t)
+    gate = np.floor(t * 4) % 2 == 0
+    return (tone * gate + 0.001 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def librosa_features(y, segments, frame_length, hop_length, sr=SR):
+    """フレームごとに librosa.feature.mfcc を呼ぶ従来の計算（無音のフレームは除く）"""
+    features = []
+    starts = []
+    for start, end in segments:
+        for i in range(start, end - frame_length + 1, hop_length):
+            frame = y[i : i + frame_length]
+            if np.max(np.abs(frame)) < 0.01:
+                continue
+            with warnings.catch_warnings():
+                # n_fft より短いフレームの警告
+                warnings.simplefilter("ignore", UserWarning)
+                mfcc = librosa.feature.mfcc(y=frame, sr=sr, n_mfcc=20)
+            features.append(np.concatenate([mfcc.mean(axis=1), mfcc.std(axis=1)]))
+            starts.append(i)
+    return np.array(features), np.array(starts)
+
+
+# 0.02 秒・0.01 秒のフレームは n_fft（2048）より短い
+@pytest.mark.parametrize("frame_sec", [0.25, 0.05, 0.02, 0.01])
+def test_extract_matches_librosa(frame_sec):
+    y = chirps()
+    segments = [(0, SR), (int(1.3 * SR), int(2.9 * SR))]
+    frame_length = int(frame_sec * SR)
+    hop_length = frame_length // 2
+    # バッチを小さくして複数のバッチにまたがらせる
+    extractor = MfccExtractor(SR, max_windows=64)
+
+    result = extractor.extract(y, segments, frame_length, hop_length)
+    expected, starts = librosa_features(y, segments, frame_length, hop_length)
+
+    np.testing.assert_array_equal(result.starts, starts)
+    # float32 で計算するので、値（数百程度）に対して 1e-3 の差は許す
+    np.testing.assert_allclose(result.features, expected, rtol=1e-5, atol=1e-3)
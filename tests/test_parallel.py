@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from birdcall import parallel
+from birdcall import pipeline as pipeline_module
+from birdcall.features import MfccExtractor
+from birdcall.parallel import extract_parallel
+from birdcall.pipeline import BirdcallPipeline
+from birdcall.stream import write_signal
+
+SR = 16000
+
+
+def bursts(duration=10.0, sr=SR, seed=0):
+    """0.5 秒おきに鳴るチャープと弱い雑音の信号と、チャープの区間"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    tone = 0.3 * np.sin(2 * np.pi * (4000 + 1000 * np.sin(2 * np.pi * 3 * t)) * t)
+    gate = np.floor(t * 2) % 2 == 0
+    y = (tone * gate + 0.001 * rng.standard_normal(len(t))).astype(np.float32)
+    edges = np.flatnonzero(np.diff(gate.astype(np.int8)))
+    bounds = np.concatenate([[0], edges + 1, [len(t)]])
+    segments = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if gate[a]]
+    return y, segments
+
+
+@pytest.fixture
+def few_frames(monkeypatch):
+    """小さな信号でもプロセスプールを使わせる"""
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_FRAMES", 0)
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_extract_parallel_matches_serial(tmp_path, few_frames, memmap):
+    y, segments = bursts()
+    if memmap:
+        y = write_signal(str(tmp_path / "filtered.f32"), [y])
+    # バッチを小さくして作業単位を複数にする
+    extractor = MfccExtractor(SR, max_windows=64)
+    frame_length = hop_length = int(0.05 * SR)
+
+    serial = extractor.extract(y, segments, frame_length, hop_length)
+    result = extract_parallel(extractor, y, segments, frame_length, hop_length, workers=2)
+
+    assert len(parallel.work_units(len(serial.starts), extractor.batch_size(frame_length), 2)) > 1
+    np.testing.assert_array_equal(result.features, serial.features)
+    np.testing.assert_array_equal(result.starts, serial.starts)
+    np.testing.assert_array_equal(result.segment_ids, serial.segment_ids)
+
+
+@pytest.mark.parametrize("memmap_signal", [False, True])
+def test_process_passes_workers_to_extract(tmp_path, monkeypatch, memmap_signal):
+    y, _ = bursts(duration=3.0)
+    path = str(tmp_path / "rec.wav")
+    sf.write(path, y, SR, subtype="FLOAT")
+
+    seen = []
+
+    def spy(extractor, y, segments, frame_length, hop_length, workers=None, on_progress=None):
+        seen.append((workers, isinstance(y, np.memmap)))
+        return extractor.extract(y, segments, frame_length, hop_length)
+
+    monkeypatch.setattr(pipeline_module, "extract_parallel", spy)
+    pipeline = BirdcallPipeline(
+        streaming_min_duration=float("inf"), extract_workers=2, memmap_signal=memmap_signal
+    )
+    pipeline.process(path, spill_path=str(tmp_path / "filtered.f32"))
+
+    assert seen == [(2, memmap_signal)]
@@ -0,0 +1,30 @@
+import numpy as np
+from matplotlib.backend_bases import MouseEvent
+
+from birdcall import plots
+
+
+def click(ax, x, y):
+    """データ座標 (x, y) を左クリックする"""
+    ax.figure.canvas.draw()
+    px, py = ax.transData.transform((x, y))
+    event = MouseEvent("button_press_event", ax.figure.canvas, px, py, button=1)
+    ax.figure.canvas.callbacks.process("button_press_event", event)
+
+
+def test_pick_nearest_uses_screen_distance_after_zoom():
+    fig = plots.new_figure((4, 4))
+    ax = fig.add_subplot(1, 1, 1)
+    # 0: 全体の範囲で揃えると最も近いが、x 方向に拡大すると画面上では遠い点
+    # 1: 画面上で数画素の点
+    points = np.array([[50.5, 50.0], [50.0, 52.0], [0.0, 0.0], [100.0, 100.0]])
+    ax.scatter(points[:, 0], points[:, 1])
+    ax.set_xlim(49, 51)
+    ax.set_ylim(0, 100)
+    picked = []
+    plots.pick_nearest(ax, points, picked.append)
+
+    click(ax, 50.0, 50.0)
+    click(ax, 50.0, 80.0)
+
+    assert picked == [1]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import scipy.signal as signal
+import soundfile as sf
+
+from birdcall.resample import (
+    StreamingResampler,
+    iter_resampled,
+    read_clip,
+    resample,
+    resample_ratio,
+    resampled_length,
+)
+
+RATES = [(192000, 48000), (96000, 48000), (44100, 32000), (48000, 44100)]
+
+
+def noise(n_samples, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, n_samples).astype(np.float32)
+
+
+def uneven_blocks(y, seed=0):
+    """長さがばらばらのブロック（1 サンプルやフィルタより短いブロックを含む）"""
+    rng = np.random.default_rng(seed)
+    sizes = [1, 7, 0, 1000, 3]
+    start = 0
+    while start < len(y):
+        size = sizes.pop(0) if sizes else int(rng.integers(1, 20000))
+        yield y[start : start + size]
+        start += size
+
+
+@pytest.mark.parametrize("sr, target_sr", RATES)
+@pytest.mark.parametrize("n_samples", [1, 513, 123457])
+def test_streaming_matches_resample_poly(sr, target_sr, n_samples):
+    y = noise(n_samples)
+    up, down = resample_ratio(sr, target_sr)
+    expected = signal.resample_poly(y.astype(np.float64), up, down)
+
+    resampler = StreamingResampler(sr, target_sr)
+    out = np.concatenate([resampler.process(block) for block in uneven_blocks(y)] + [resampler.flush()])
+
+    assert len(out) == len(expected) == resampled_length(n_samples, sr, target_sr)
+    np.testing.assert_allclose(out, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("sr, target_sr", RATES)
+def test_iter_resampled_matches_resample_poly(sr, target_sr):
+    y = noise(sr // 2 + 17, seed=1)
+    up, down = resample_ratio(sr, target_sr)
+    expected = signal.resample_poly(y.astype(np.float64), up, down)
+
+    out = np.concatenate(list(iter_resampled(uneven_blocks(y, seed=1), sr, target_sr)))
+
+    assert len(out) == len(expected)
+    np.testing.assert_allclose(out, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("sr, target_sr", [(48000, 48000), (96000, 48000)])
+def test_read_clip_applies_highpass(tmp_path, sr, target_sr):
+    y = noise(sr, seed=2)
+    path = str(tmp_path / "rec.wav")
+    sf.write(path, y, sr, subtype="FLOAT")
+    sos = signal.butter(4, 3000 / (target_sr / 2), btype="high", output="sos")
+    expected = signal.sosfiltfilt(sos, resample(y, sr, target_sr).astype(np.float64))
+
+    for start in [0, 12345, target_sr - 2400]:
+        clip = read_clip(path, start, 2400, target_sr, cutoff=3000)
+        np.testing.assert_allclose(clip, expected[start : start + 2400], atol=1e-4)
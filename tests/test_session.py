@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+from birdcall.frametable import FrameTable
+from birdcall.session import MANIFEST_NAME, load_session, save_session
+
+SR = 16000
+
+
+def save(directory, seed):
+    rng = np.random.default_rng(seed)
+    n = 5
+    frames = FrameTable(np.arange(n) * 100, np.zeros(n, dtype=np.int32), rng.integers(0, 3, n), SR)
+    features = rng.standard_normal((n, 4)).astype(np.float32)
+    signal = rng.standard_normal(1000).astype(np.float32)
+    save_session(directory, signal, SR, [(0, 1000)], frames, features, {"seed": seed})
+    return signal, features
+
+
+def test_resave_into_open_session(tmp_path):
+    directory = str(tmp_path / "rec.session")
+    save(directory, 0)
+    opened = load_session(directory)
+
+    # 開いたまま（memmap）同じフォルダに保存し直す
+    signal, features = save(directory, 1)
+
+    reopened = load_session(directory)
+    assert reopened.info == {"seed": 1}
+    np.testing.assert_array_equal(reopened.signal, signal)
+    np.testing.assert_array_equal(reopened.features.features, features)
+    # 開いていたセッションの中身は変わらない
+    assert opened.info == {"seed": 0}
+    assert np.asarray(opened.signal).shape == (1000,)
+
+    # 前の保存のフォルダは消え、新しい配列のフォルダとマニフェストだけが残る
+    del opened
+    save(directory, 2)
+    remaining = [name for name in os.listdir(directory) if name != MANIFEST_NAME]
+    assert len(remaining) == 1 and remaining[0].startswith("data_")
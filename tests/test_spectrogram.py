@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import soundfile as sf
+
+from birdcall.pipeline import BirdcallPipeline
+from birdcall.spectrogram import MANIFEST_NAME
+
+SR = 16000
+
+
+def test_pyramid_dir_is_not_shared_between_recordings(tmp_path):
+    # 固定長の録音機では、同じフォルダの録音は長さも周波数も同じになる
+    t = np.arange(2 * SR) / SR
+    paths = []
+    for i, freq in enumerate([4000, 6000]):
+        path = str(tmp_path / f"rec{i}.wav")
+        sf.write(path, (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32), SR)
+        paths.append(path)
+
+    pyramid_dir = str(tmp_path / "spectrogram_pyramid")
+    pyramids = []
+    for path in paths:
+        stages = BirdcallPipeline(streaming_min_duration=float("inf")).build_stages(path)
+        stages.context["pyramid_dir"] = pyramid_dir
+        pyramids.append(stages.get("spectrogram"))
+
+    first, second = pyramids
+    assert first.out_dir != second.out_dir
+    assert first.digest != second.digest
+    peak_bins = [np.argmax(p.window()[0].mean(axis=1)) for p in pyramids]
+    assert peak_bins[0] != peak_bins[1]
+
+    # 同じ録音なら作り直さずに使う
+    manifest = os.path.join(first.out_dir, MANIFEST_NAME)
+    os.utime(manifest, ns=(0, 0))
+    stages = BirdcallPipeline(streaming_min_duration=float("inf")).build_stages(paths[0])
+    stages.context["pyramid_dir"] = pyramid_dir
+    assert stages.get("spectrogram").out_dir == first.out_dir
+    assert os.stat(manifest).st_mtime_ns == 0
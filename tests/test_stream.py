@@ -0,0 +1,91 @@
+import librosa
+import numpy as np
+import pytest
+import scipy.signal as signal
+import soundfile as sf
+
+from birdcall.features import MfccExtractor
+from birdcall.stream import StreamingFrontEnd, StreamingHighpass
+
+SR = 16000
+CUTOFF = 3000
+TOP_DB = 45
+MIN_DURATION = 0.1
+# ブロックの境界（4567 の倍数）が鳴き声の途中にくる（例: 63938 は 3 つ目の鳴き声の中）
+BLOCK_SIZE = 4567
+CALLS = [(0.7, 1.3), (2.05, 2.6), (4.0, 5.5), (7.2, 7.5), (8.9, 9.4)]
+
+
+@pytest.fixture(scope="module")
+def recording(tmp_path_factory):
+    """チャープの鳴き声と、ハイパスで除く低い音・弱い雑音の録音"""
+    rng = np.random.default_rng(0)
+    t = np.arange(10 * SR) / SR
+    gate = np.zeros(len(t), dtype=bool)
+    for a, b in CALLS:
+        gate[int(a * SR) : int(b * SR)] = True
+    chirp = 0.3 * np.sin(2 * np.pi * (4000 + 500 * np.sin(2 * np.pi * 3 * t)) * t)
+    y = chirp * gate + 0.2 * np.sin(2 * np.pi * 200 * t) + 0.001 * rng.standard_normal(len(t))
+    y = y.astype(np.float32)
+    path = str(tmp_path_factory.mktemp("stream") / "rec.wav")
+    sf.write(path, y, SR, subtype="FLOAT")
+    return path, y
+
+
+def batch_filtered(y):
+    sos = signal.butter(4, CUTOFF / (SR / 2), btype="high", output="sos")
+    return signal.sosfiltfilt(sos, y.astype(np.float64))
+
+
+def batch_segments(filtered):
+    intervals = librosa.effects.split(filtered.astype(np.float32), top_db=TOP_DB)
+    return [(int(a), int(b)) for a, b in intervals if (b - a) / SR >= MIN_DURATION]
+
+
+def test_block_boundary_inside_call():
+    boundaries = np.arange(BLOCK_SIZE, 10 * SR, BLOCK_SIZE)
+    assert any(int(start * SR) < b < int(end * SR) for start, end in CALLS for b in boundaries)
+
+
+def test_streaming_highpass_matches_sosfiltfilt(recording):
+    _, y = recording
+    highpass = StreamingHighpass(CUTOFF, SR)
+    out = [highpass.process(y[i : i + BLOCK_SIZE]) for i in range(0, len(y), BLOCK_SIZE)]
+    out = np.concatenate(out + [highpass.flush()])
+
+    assert len(out) == len(y)
+    # 録音の両端は初期値の決め方（sosfilt_zi と奇対称の延長）が違うので、先読みの長さだけ除いて比べる
+    inner = slice(highpass.margin, len(y) - highpass.margin)
+    np.testing.assert_allclose(out[inner], batch_filtered(y)[inner], atol=1e-5)
+
+
+@pytest.mark.parametrize("activity", ["global", "adaptive"])
+def test_front_end_segments_match_librosa_split(recording, activity):
+    path, y = recording
+    expected = batch_segments(batch_filtered(y))
+    frontend = StreamingFrontEnd(
+        cutoff=CUTOFF, top_db=TOP_DB, min_duration=MIN_DURATION, block_size=BLOCK_SIZE, activity=activity
+    )
+    segments = frontend.scan(path).segments
+
+    assert len(segments) == len(expected) == len(CALLS)
+    # 区間の端は区間検出のホップ（512 サンプル）以内で一致する
+    np.testing.assert_allclose(np.array(segments), np.array(expected), atol=512)
+
+
+@pytest.mark.parametrize("activity", ["global", "adaptive"])
+def test_front_end_features_match_batch(recording, activity):
+    path, y = recording
+    frontend = StreamingFrontEnd(
+        cutoff=CUTOFF, top_db=TOP_DB, min_duration=MIN_DURATION, block_size=BLOCK_SIZE, activity=activity
+    )
+    scan, frames = frontend.run(path)
+
+    filtered = batch_filtered(y).astype(np.float32)
+    frame_length = int(SR * frontend.frame_length_sec)
+    hop_length = int(SR * frontend.hop_length_sec)
+    expected = MfccExtractor(SR).extract(filtered, scan.segments, frame_length, hop_length)
+
+    np.testing.assert_array_equal(frames.starts, expected.starts)
+    np.testing.assert_array_equal(frames.segment_ids, expected.segment_ids)
+    np.testing.assert_allclose(frames.features, expected.features, atol=1e-4)